@@ -0,0 +1,295 @@
+"""AI阅读助手的 JSON 接口：不启动界面，直接调用 core 中的功能
+
+命令行：参数写成 key=value（值可以是 JSON），结果以 JSON 输出到标准输出
+
+    python api.py search q=推理成本 limit=5
+    python api.py article id=42
+    python api.py chat id=42 question="这篇文章的核心观点是什么？"
+    python api.py save text=@article.md source_url=https://example.com/a on_duplicate=link
+
+HTTP：python api.py serve --port 7862，之后 GET 或 POST /api/<操作名>，
+GET 的参数放在查询字符串中，POST 的参数为 JSON 对象。出错时返回 {"error": ...} 和对应的状态码。
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+import core
+from ingest import read_url_list
+
+# 文本类参数：命令行中原样作为字符串，不按 JSON 解析（否则 q=2024 会变成整数）
+STRING_PARAMS = {"q", "text", "url", "title", "custom_title", "source_url", "question", "filter", "path", "on_duplicate"}
+
+# HTTP 接口的监听地址和端口
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "7862"))
+
+
+class ApiError(Exception):
+    """请求无法完成；status 为对应的 HTTP 状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _article_info(article):
+    return {key: article[key] for key in ("id", "title", "path", "created_at", "source_url")}
+
+
+def _require(params, name):
+    value = params.get(name)
+    if value is None or value == "":
+        raise ApiError(f"缺少参数 {name}")
+    return value
+
+
+def _get_article(params):
+    try:
+        article_id = int(_require(params, "id"))
+    except (TypeError, ValueError):
+        raise ApiError(f"无效的文章 id: {params.get('id')}")
+    article = core.get_library().get_by_id(article_id)
+    if article is None:
+        raise ApiError(f"文章不存在: {article_id}", status=404)
+    return article
+
+
+def _session_for(params):
+    """按参数把文章载入一个新会话：id（已保存的文章）、url（现场提取）或 text（直接给出正文）"""
+    session = core.State()
+    if params.get("id") is not None:
+        error = core.load_saved(_get_article(params), session)
+    elif params.get("url"):
+        error = core.load_url(params["url"], session)
+    elif params.get("text"):
+        session.article_text = params["text"]
+        session.article_title = params.get("title") or core.extract_title(params["text"])
+        error = None
+    else:
+        raise ApiError("需要参数 id、url 或 text 之一")
+    if error:
+        raise ApiError(error, status=502 if params.get("url") else 500)
+    return session
+
+
+def op_health(params):
+    return {"status": "ok", "articles": len(core.get_library()), "precompute": core.get_precompute_scheduler().stats()}
+
+
+def op_articles(params):
+    page_size = int(params.get("page_size") or core.LIBRARY_PAGE_SIZE)
+    articles, page, total = core.get_library().page(int(params.get("page") or 0), page_size, params.get("filter") or "")
+    return {"page": page, "page_size": page_size, "total": total, "articles": [_article_info(a) for a in articles]}
+
+
+def op_article(params):
+    article = _get_article(params)
+    text, _, _ = core.load_saved_article(article["path"])
+    if text is None:
+        raise ApiError("加载文章失败", status=500)
+    return dict(_article_info(article), text=text)
+
+
+def op_search(params):
+    # HTTP 的 JSON 请求体中 q 也可能是数字
+    return {"results": core.search_articles(str(_require(params, "q")), limit=int(params.get("limit") or 20))}
+
+
+def op_related(params):
+    session = _session_for(params)
+    related = core.get_related_articles(session, top_k=int(params.get("top_k") or core.RELATED_TOP_K))
+    return {"related": [dict(_article_info(a), similarity=similarity) for a, similarity in related]}
+
+
+def op_extract(params):
+    session = _session_for({"url": _require(params, "url")})
+    return {"title": session.article_title, "file_name": session.current_file, "text": session.article_text}
+
+
+def op_analyze(params):
+    session = _session_for(params)
+    # 已保存且后台预计算过的文章直接使用结果
+    artifacts = core.get_article_artifacts(_get_article(params)) if params.get("id") is not None else None
+    if artifacts is not None:
+        points = artifacts["points"]
+    else:
+        points, error = core.analyze_article_points(session.article_text)
+        if error:
+            raise ApiError(error, status=502)
+    summary, note = core.apply_article_points(session, points)
+    return {"title": session.article_title, "points": points, "summary": summary, "note": note}
+
+
+def op_chat(params):
+    session = _session_for(params)
+    comparison_ids = params.get("comparison_ids") or []
+    session.comparison_ids = [int(article_id) for article_id in comparison_ids]
+    history = [list(turn) for turn in params.get("history") or []]
+    answer = core.chatbot(session, _require(params, "question"), history, core.get_comparison_paths(session))
+    return {"answer": answer}
+
+
+def op_save(params):
+    on_duplicate = params.get("on_duplicate") or "ask"
+    if on_duplicate not in ("ask", "link", "replace", "keep"):
+        raise ApiError(f"无效的 on_duplicate: {on_duplicate}")
+    text = _require(params, "text")
+    result = core.save_with_dedup(
+        text, params.get("title") or core.extract_title(text), params.get("custom_title"), params.get("source_url"),
+        on_duplicate,
+    )
+    if result["status"] == "error":
+        raise ApiError(result["error"], status=500)
+    duplicate = result["duplicate"]
+    return {
+        "status": result["status"],
+        "path": result["path"],
+        "duplicate": dict(_article_info(duplicate), similarity=result["similarity"]) if duplicate else None,
+    }
+
+
+def op_ingest(params):
+    urls = params.get("urls") or []
+    # 列表或多行文本都按批量收录的规则去重、规范化
+    urls = read_url_list(urls if isinstance(urls, str) else "\n".join(urls))
+    if not urls:
+        raise ApiError("缺少参数 urls")
+    messages = []
+    stats = core.run_batch_ingest(
+        urls, int(params.get("fetch_concurrency") or 4), int(params.get("llm_concurrency") or 2),
+        progress=messages.append, on_duplicate=params.get("on_duplicate") or "link",
+    )
+    return {"stats": stats, "log": messages}
+
+
+OPERATIONS = {
+    "health": op_health,
+    "articles": op_articles,
+    "article": op_article,
+    "search": op_search,
+    "related": op_related,
+    "extract": op_extract,
+    "analyze": op_analyze,
+    "chat": op_chat,
+    "save": op_save,
+    "ingest": op_ingest,
+}
+
+
+def call(operation, params):
+    """执行一个操作，返回 (HTTP 状态码, 结果对象)"""
+    handler = OPERATIONS.get(operation)
+    if handler is None:
+        return 404, {"error": f"未知的操作: {operation}", "operations": sorted(OPERATIONS)}
+    try:
+        return 200, handler(params)
+    except ApiError as e:
+        return e.status, {"error": str(e)}
+    except Exception as e:
+        return 500, {"error": f"{type(e).__name__}: {str(e)}"}
+
+
+def serve(host=API_HOST, port=API_PORT):
+    """启动 HTTP 接口并阻塞运行"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class ApiHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, params):
+            parts = urlsplit(self.path)
+            if not parts.path.startswith("/api/"):
+                self._send(404, {"error": "not found"})
+                return
+            self._send(*call(parts.path[len("/api/"):], params))
+
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            self._dispatch({key: values[-1] for key, values in query.items()})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                params = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send(400, {"error": "请求体不是有效的 JSON"})
+                return
+            if not isinstance(params, dict):
+                self._send(400, {"error": "请求体应为 JSON 对象"})
+                return
+            self._dispatch(params)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    # 服务启动后在后台补算查重签名和推荐向量，并预计算最近文章的要点
+    threading.Thread(target=core.start_index_reconcile, daemon=True).start()
+    core.start_precompute()
+    print(f"JSON 接口已启动: http://{host}:{port}/api/<操作名>（{', '.join(sorted(OPERATIONS))}）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_params(items):
+    """把命令行的 key=value 解析为参数字典；@文件名 表示读取文件内容，
+    STRING_PARAMS 中的参数保留为字符串，其余参数的值能按 JSON 解析时取解析结果"""
+    params = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ApiError(f"参数应写成 key=value: {item}")
+        if value.startswith("@"):
+            with open(value[1:], "r", encoding="utf-8") as f:
+                params[key] = f.read()
+            continue
+        if key in STRING_PARAMS:
+            params[key] = value
+            continue
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI阅读助手 JSON 接口")
+    parser.add_argument("operation", help=f"操作名（{', '.join(sorted(OPERATIONS))}），或 serve 启动 HTTP 接口")
+    parser.add_argument("params", nargs="*", help="key=value 形式的参数")
+    parser.add_argument("--host", default=API_HOST, help="serve 时的监听地址")
+    parser.add_argument("--port", type=int, default=API_PORT, help="serve 时的端口")
+    args = parser.parse_args()
+
+    if args.operation == "serve":
+        serve(args.host, args.port)
+        return 0
+    try:
+        params = parse_params(args.params)
+    except (ApiError, OSError) as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False))
+        return 2
+    if args.operation in ("related", "save", "ingest"):
+        # 一次性的命令需要完整的查重签名和推荐向量
+        core.wait_for_index_reconcile()
+    status, payload = call(args.operation, params)
+    print(json.dumps(payload, ensure_ascii=False, indent=2))
+    return 0 if status == 200 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
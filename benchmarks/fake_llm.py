@@ -0,0 +1,40 @@
+import time
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    """确定性的假 LLM，接口与 ResilientLLM 相同（invoke / stream）
+
+    latency 为首个分块前的等待时间（秒），chunk_latency 为后续每个分块的间隔，
+    回复内容固定，便于不同版本之间对比耗时。
+    """
+
+    RESPONSE = (
+        "1. 推理成本的快速下降让更多 AI 应用变得可行。\n"
+        "2. 检索增强生成缓解了幻觉问题，但增加了工程复杂度。\n"
+        "3. 延迟往往比吞吐更直接地影响用户体验。"
+    )
+
+    def __init__(self, latency=0.05, chunk_latency=0.002, chunk_chars=8, model_name="fake-llm"):
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunk_chars = chunk_chars
+        self.model_name = model_name
+        self.calls = 0
+
+    def invoke(self, messages, timeout=None):
+        self.calls += 1
+        time.sleep(self.latency + self.chunk_latency * (len(self.RESPONSE) // self.chunk_chars))
+        return FakeMessage(self.RESPONSE)
+
+    def stream(self, messages, timeout=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        for i in range(0, len(self.RESPONSE), self.chunk_chars):
+            if i:
+                time.sleep(self.chunk_latency)
+            yield FakeMessage(self.RESPONSE[i:i + self.chunk_chars])
@@ -0,0 +1,139 @@
+"""本地的假 OpenAI 兼容接口：/chat/completions 按模型配置延迟、慢请求比例和失败比例
+
+    python benchmarks/fake_openai_server.py --port 8901 --slow-rate 0.1 --slow-latency 5
+
+启动后把 LLM_API_BASE 指向 http://127.0.0.1:8901/v1，即可在不访问方舟 API 的情况下
+观察截止时间、对冲请求和备用模型的效果。
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_llm import FakeLLM
+
+
+class ModelBehavior:
+    """一个模型的行为：latency 为首个分块前的延迟，slow_rate 的请求改为等待 slow_latency，fail_rate 的请求返回 503
+
+    慢请求按比例均匀分布（如 0.02 即每 50 个请求中的一个），便于不同配置之间对比；失败按随机数决定。
+    """
+
+    def __init__(self, latency=0.05, slow_rate=0.0, slow_latency=5.0, fail_rate=0.0, chunk_latency=0.002):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.fail_rate = fail_rate
+        self.chunk_latency = chunk_latency
+
+
+def _chunk(model, content, finish_reason=None):
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def start_fake_openai_server(behaviors=None, default=None, host="127.0.0.1", port=0, seed=0, chunk_chars=8):
+    """在后台线程中启动假接口，返回 (接口地址, server)；server.requests 记录每个模型收到的请求数
+
+    behaviors 为 {模型名: ModelBehavior}，未列出的模型使用 default。
+    """
+    behaviors = behaviors or {}
+    default = default or ModelBehavior()
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    requests = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            model = body.get("model", "")
+            behavior = behaviors.get(model, default)
+            with rng_lock:
+                count = requests[model] = requests.get(model, 0) + 1
+                failed = rng.random() < behavior.fail_rate
+                slow = int(count * behavior.slow_rate) > int((count - 1) * behavior.slow_rate)
+            time.sleep(behavior.slow_latency if slow else behavior.latency)
+            if failed:
+                self._send_json(503, {"error": {"message": "upstream unavailable", "type": "server_error"}})
+                return
+            text = FakeLLM.RESPONSE
+            try:
+                if not body.get("stream"):
+                    time.sleep(behavior.chunk_latency * (len(text) // chunk_chars))
+                    self._send_json(200, {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i in range(0, len(text), chunk_chars):
+                    if i:
+                        time.sleep(behavior.chunk_latency)
+                    self.wfile.write(f"data: {json.dumps(_chunk(model, text[i:i + chunk_chars]))}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(f"data: {json.dumps(_chunk(model, None, 'stop'))}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端取消了请求（例如对冲请求中落败的一方）
+                self.close_connection = True
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.requests = requests
+    threading.Thread(target=server.serve_forever, name="fake-openai-server", daemon=True).start()
+    return f"http://{host}:{server.server_address[1]}/v1", server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地的假 OpenAI 兼容接口")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.05, help="首个分块前的延迟（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="变慢的请求比例")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="慢请求首个分块前的延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回 503 的请求比例")
+    args = parser.parse_args()
+    base_url, server = start_fake_openai_server(
+        default=ModelBehavior(args.latency, args.slow_rate, args.slow_latency, args.fail_rate), port=args.port,
+    )
+    print(f"假 OpenAI 接口已启动: {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(directory=FIXTURES_DIR, host="127.0.0.1", port=0):
+    """在后台线程中提供录制好的网页，返回 (基础URL, server)；用完后调用 server.shutdown()"""
+    server = ThreadingHTTPServer((host, port), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return f"http://{host}:{server.server_address[1]}", server
+
+
+def list_fixtures(directory=FIXTURES_DIR):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".html"))
@@ -0,0 +1,124 @@
+"""Flomo 发件箱的离线检查：用本地的假 Flomo 接口代替 flomoapp.com，验证重试、放弃和统计
+
+    python benchmarks/outbox_check.py
+
+依次检查三种情况，任何一项不符合预期时以非零状态退出：
+1. 接口先返回 5xx，发件箱按退避重试，直到成功发送
+2. 接口返回 4xx，笔记不再重试，直接标记为失败
+3. stats() 中待发送、已发送、失败的数量，以及投递耗时指标中各结果的次数与实际投递一致
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+# 缩短退避、放开限流，几秒内跑完；需要在导入 outbox 之前设置
+os.environ["FLOMO_BACKOFF_BASE"] = "0.05"
+os.environ["FLOMO_RPM"] = "6000"
+
+
+def start_fake_flomo_server(scripts=None, host="127.0.0.1", port=0):
+    """在后台线程中启动假 Flomo 接口，返回 (接口地址, server)
+
+    scripts 为 {笔记内容: [状态码, ...]}，同一条笔记的第 n 次请求返回第 n 个状态码（用完后重复最后一个），
+    未列出的笔记返回 200；server.requests 记录每条笔记收到的请求数。
+    """
+    scripts = scripts or {}
+    requests = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            content = body.get("content", "")
+            with lock:
+                count = requests[content] = requests.get(content, 0) + 1
+            statuses = scripts.get(content) or [200]
+            status = statuses[min(count, len(statuses)) - 1]
+            payload = {"code": 0, "message": "已记录"} if status == 200 else {"code": -1, "message": f"HTTP {status}"}
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.requests = requests
+    threading.Thread(target=server.serve_forever, name="fake-flomo-server", daemon=True).start()
+    return f"http://{host}:{server.server_address[1]}/iwh/fake/", server
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def main():
+    from outbox import FlomoOutbox, DELIVERY_SECONDS
+
+    scripts = {"retry": [503, 502, 200], "reject": [400]}
+    api_url, server = start_fake_flomo_server(scripts)
+    failures = []
+
+    def check(name, ok, detail):
+        print(f"{'通过' if ok else '失败'}  {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = FlomoOutbox(api_url=api_url, db_path=os.path.join(tmp, "outbox.sqlite"), max_attempts=5)
+        ids = {content: outbox.enqueue(content) for content in ("retry", "reject", "ok")}
+        outbox.start()
+        settled = wait_until(lambda: outbox.stats()["pending"] == 0)
+        rows = {
+            item_id: (status, attempts, last_error)
+            for item_id, status, attempts, last_error in outbox._conn.execute(
+                "SELECT id, status, attempts, last_error FROM outbox"
+            )
+        }
+        stats = outbox.stats()
+        outbox.close()
+
+    check("队列清空", settled, f"stats={stats}")
+
+    status, attempts, _ = rows[ids["retry"]]
+    check(
+        "5xx 重试", status == "sent" and attempts == 3 and server.requests.get("retry") == 3,
+        f"状态 {status}，尝试 {attempts} 次，接口收到 {server.requests.get('retry')} 次请求",
+    )
+
+    status, attempts, last_error = rows[ids["reject"]]
+    check(
+        "4xx 标记失败", status == "failed" and attempts == 1 and server.requests.get("reject") == 1,
+        f"状态 {status}，尝试 {attempts} 次，错误「{last_error}」",
+    )
+
+    deliveries = {key[0]: count for key, (count, _) in DELIVERY_SECONDS.snapshot().items()}
+    expected = {"sent": 2, "retry": 2, "rejected": 1}
+    check(
+        "统计计数", stats == {"pending": 0, "sent": 2, "failed": 1} and deliveries == expected,
+        f"stats={stats}，投递结果={deliveries}",
+    )
+
+    server.shutdown()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,411 @@
+"""离线基准测试：用假 LLM、本地网页和合成文章库测量主程序热点路径的耗时
+
+    python benchmarks/run.py --sizes 100,1000,10000
+    python benchmarks/run.py --sizes 1000 --compare benchmarks/results/上一次.json
+
+每种文章库规模在独立的子进程和临时工作目录中运行，不会读写真实的 output/ 目录。
+结果写入 JSON 文件，可以用 --compare 与之前的结果对比中位数的变化。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, REPO_DIR)
+
+CHAT_QUESTION = "这篇文章的核心观点是什么？和对比文章有什么不同？"
+# 冷启动导入 core 的耗时预算（毫秒），超出时以非零状态退出
+CORE_IMPORT_BUDGET_MS = float(os.getenv("CORE_IMPORT_BUDGET_MS", "300"))
+IMPORT_SCRIPT = "import sys, time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def summarize(name, size, samples, **extra):
+    """把一组耗时（秒）整理成一条结果记录，时间单位为毫秒"""
+    ordered = sorted(samples)
+    result = {
+        "name": name,
+        "library_size": size,
+        "n": len(samples),
+        "first_ms": samples[0] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+    result.update(extra)
+    return result
+
+
+def measure(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def consume(generator):
+    last = None
+    for last in generator:
+        pass
+    return last
+
+
+def run_worker(args):
+    """在子进程中针对一种文章库规模运行全部基准，结果写入 args.result_file"""
+    from synthetic_library import generate_library, synthetic_article
+    from fake_llm import FakeLLM
+    from fixture_server import start_fixture_server, list_fixtures
+
+    size = args.size
+    workspace = args.workspace
+    results = []
+
+    start = time.perf_counter()
+    generate_library(os.path.join(workspace, "output", "formatted"), size, seed=args.seed)
+    print(f"[bench] 已生成 {size} 篇合成文章（{time.perf_counter() - start:.1f}s）", file=sys.stderr)
+
+    # 本地网页只走静态抓取，不依赖浏览器
+    strategies_path = os.path.join(workspace, "strategies.json")
+    with open(strategies_path, "w", encoding="utf-8") as f:
+        json.dump({"127.0.0.1": "static"}, f)
+    os.environ["EXTRACT_STRATEGIES"] = strategies_path
+    os.environ["RETRIEVAL_EMBEDDING_MODEL"] = ""
+    os.chdir(workspace)
+
+    # 启动：首次取用文章清单和全文检索索引时与磁盘对账
+    start = time.perf_counter()
+    import core
+    core.get_library()
+    core.get_search_index()
+    results.append(summarize("startup", size, [time.perf_counter() - start]))
+    # 等待后台的查重签名、推荐向量对账完成，避免它与后面的测量争用 CPU
+    start = time.perf_counter()
+    core.start_index_reconcile()
+    core.wait_for_index_reconcile()
+    results.append(summarize("index_reconcile", size, [time.perf_counter() - start]))
+    # 界面事件处理函数在 main 中，导入时构建 Gradio 界面
+    import main
+
+    # 假 LLM 同样经过截止时间和对冲层，与真实调用的路径一致
+    from llm_client import HedgedLLM
+    fake_llm = FakeLLM(latency=args.llm_latency, chunk_latency=args.chunk_latency)
+    hedged_fake_llm = HedgedLLM([fake_llm])
+    core.get_llm = lambda: (hedged_fake_llm, None)
+    rng = random.Random(args.seed)
+    repeat = args.repeat
+
+    results.append(summarize("get_saved_articles", size, measure(core.get_saved_articles, [()] * (repeat * 10))))
+
+    # 文章库分页：翻页和按标题筛选，只取一页的元数据
+    pages = [rng.randrange(max(1, size // core.LIBRARY_PAGE_SIZE)) for _ in range(repeat * 10)]
+    results.append(summarize(
+        "get_library_page", size, measure(core.get_library_page, [(page,) for page in pages]),
+    ))
+    results.append(summarize(
+        "get_library_page_filtered", size,
+        measure(core.get_library_page, [(0, ["模型", "电动车", "开源"][i % 3]) for i in range(repeat * 10)]),
+    ))
+
+    # 打开文章（按文章 id）：首次打开需要（假）LLM 分析要点，再次打开命中要点缓存
+    articles = core.get_saved_articles()
+    article_ids = [articles[rng.randrange(size)]["id"] for _ in range(repeat)]
+    results.append(summarize(
+        "handle_file_selection", size,
+        measure(lambda article_id: consume(main.handle_file_selection(article_id, core.State())), [(i,) for i in article_ids]),
+        llm_calls=fake_llm.calls,
+    ))
+    results.append(summarize(
+        "handle_file_selection_cached", size,
+        measure(lambda article_id: consume(main.handle_file_selection(article_id, core.State())), [(i,) for i in article_ids]),
+    ))
+
+    # 后台预计算：为另一组文章排队并等待完成，之后打开这些文章不再调用 LLM
+    scheduler = core.get_precompute_scheduler()
+    warm_articles = [articles[rng.randrange(size)] for _ in range(repeat)]
+    for article in warm_articles:
+        scheduler.enqueue(article["path"], article["content_hash"])
+    start = time.perf_counter()
+    scheduler.start()
+    scheduler.wait_idle()
+    results.append(summarize("precompute_article", size, [(time.perf_counter() - start) / len(warm_articles)]))
+    scheduler.stop()
+    calls_before = fake_llm.calls
+    results.append(summarize(
+        "handle_file_selection_warmed", size,
+        measure(lambda article_id: consume(main.handle_file_selection(article_id, core.State())), [(a["id"],) for a in warm_articles]),
+        llm_calls=fake_llm.calls - calls_before,
+    ))
+
+    # 提取文章：本地网页经常驻提取进程抓取，Node 依赖不可用时记为跳过
+    base_url, server = start_fixture_server()
+    try:
+        urls = [f"{base_url}/{name}" for name in list_fixtures()]
+        probe = consume(main.process_url(urls[0], core.State()))
+        if probe[0].startswith("错误"):
+            results.append({"name": "process_url", "library_size": size, "skipped": probe[0]})
+        else:
+            results.append(summarize(
+                "process_url", size,
+                measure(lambda url: consume(main.process_url(url, core.State())), [(url,) for url in urls * 2]),
+            ))
+    finally:
+        server.shutdown()
+
+    # 聊天：主文章 + 两篇对比文章 + 若干轮历史
+    session = core.State()
+    consume(main.handle_file_selection(article_ids[0], session))
+    comparison_paths = [core.get_library().get_by_id(article_id)["path"] for article_id in article_ids[1:3]]
+    history = [[f"第{i}个问题：{CHAT_QUESTION}", fake_llm.RESPONSE] for i in range(8)]
+    results.append(summarize(
+        "related_articles", size, measure(core.get_related_articles, [(session,)] * (repeat * 10)),
+    ))
+    results.append(summarize(
+        "build_chat_messages", size,
+        measure(core.build_chat_messages, [(session, CHAT_QUESTION, history, comparison_paths)] * (repeat * 2)),
+    ))
+    results.append(summarize(
+        "chatbot", size,
+        measure(core.chatbot, [(session, CHAT_QUESTION, history, comparison_paths)] * repeat),
+    ))
+
+    queries = ["推理成本", "电动车 电池", "开源 模型", "长期主义", "供应链 半导体"]
+    results.append(summarize(
+        "search_articles", size,
+        measure(core.search_articles, [(queries[i % len(queries)],) for i in range(repeat * 2)]),
+    ))
+
+    save_rng = random.Random(args.seed + 1)
+    new_articles = [synthetic_article(save_rng) for _ in range(repeat)]
+    results.append(summarize(
+        "save_article_to_formatted", size,
+        measure(core.save_article_to_formatted, [(text, title) for title, text in new_articles]),
+    ))
+
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False)
+
+
+def run_llm_worker(args):
+    """通过本地的假 OpenAI 兼容接口测量截止时间、对冲请求和备用模型对尾延迟的影响"""
+    from fake_openai_server import start_fake_openai_server, ModelBehavior
+    from llm_client import get_shared_llm, HedgedLLM, HEDGE_MIN_SAMPLES
+    from metrics import LLM_HEDGE_SAVED_SECONDS
+
+    # 主模型偶尔有慢副本（首个分块前多等 slow_latency 秒），flaky 模型有一部分请求直接失败；
+    # 慢请求要明显长于对冲延迟的下限 LLM_HEDGE_MIN_DELAY，才能看出对冲的效果
+    slow_latency = max(3.0, args.llm_latency * 60)
+    base_url, server = start_fake_openai_server({
+        "primary": ModelBehavior(args.llm_latency, slow_rate=0.02, slow_latency=slow_latency, chunk_latency=args.chunk_latency),
+        "flaky": ModelBehavior(args.llm_latency, fail_rate=0.3, chunk_latency=args.chunk_latency),
+        "backup": ModelBehavior(args.llm_latency * 1.5, chunk_latency=args.chunk_latency),
+    }, seed=args.seed)
+    messages = [{"role": "user", "content": CHAT_QUESTION}]
+    calls = args.repeat * 10
+    results = []
+
+    def run(name, llm):
+        roles = {}
+
+        def call():
+            info = {}
+            consume(llm.stream(messages, label=name, call_info=info))
+            roles[info["role"]] = roles.get(info["role"], 0) + 1
+
+        samples = measure(call, [()] * calls)
+        if "hedge" in roles:
+            # 被对冲的主请求在拿到首个分块时才结束并记录节省的时间
+            time.sleep(slow_latency)
+        saved = LLM_HEDGE_SAVED_SECONDS.snapshot().get((name,), (0, 0.0))
+        results.append(summarize(name, 0, samples, answered_by=roles, hedge_saved_s=round(saved[1], 3)))
+
+    try:
+        primary = get_shared_llm("fake", "primary", base_url)
+        run("llm_unhedged", HedgedLLM([primary], hedge_delay="off"))
+        hedged = HedgedLLM([primary], hedge_delay="auto")
+        # 先积累足够的耗时样本（按调用类别统计），对冲延迟才会取 p95
+        for _ in range(HEDGE_MIN_SAMPLES):
+            consume(hedged.stream(messages, label="llm_hedged"))
+        run("llm_hedged", hedged)
+        run("llm_fallback", HedgedLLM([get_shared_llm("fake", "flaky", base_url), get_shared_llm("fake", "backup", base_url)]))
+    finally:
+        server.shutdown()
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False)
+
+
+def measure_import(module, repeat, workspace):
+    """在全新的解释器中导入模块，返回每次的耗时（秒）；不包括解释器自身的启动时间"""
+    samples = []
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT.format(module=module)],
+            cwd=workspace, env=env, capture_output=True, text=True, check=True,
+        )
+        samples.append(float(completed.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    baseline_index = {(r["name"], r["library_size"]): r for r in (baseline or {}).get("results", [])}
+    header = f"{'benchmark':<30}{'size':>8}{'median ms':>12}{'p95 ms':>12}{'first ms':>12}"
+    if baseline:
+        header += f"{'baseline':>12}{'change':>10}"
+    print(header)
+    regressions = []
+    for result in results:
+        if "skipped" in result:
+            print(f"{result['name']:<30}{result['library_size']:>8}  跳过：{result['skipped']}")
+            continue
+        line = (
+            f"{result['name']:<30}{result['library_size']:>8}{result['median_ms']:>12.2f}"
+            f"{result['p95_ms']:>12.2f}{result['first_ms']:>12.2f}"
+        )
+        previous = baseline_index.get((result["name"], result["library_size"]))
+        if previous and "median_ms" in previous and previous["median_ms"] > 0:
+            change = result["median_ms"] / previous["median_ms"] - 1
+            line += f"{previous['median_ms']:>12.2f}{change:>+10.1%}"
+            regressions.append((result, change))
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI阅读助手离线基准测试")
+    parser.add_argument("--sizes", default="100,1000,10000", help="合成文章库的规模，逗号分隔（100 到 100000）")
+    parser.add_argument("--repeat", type=int, default=10, help="每项基准的重复次数")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="假 LLM 首个分块前的延迟（秒）")
+    parser.add_argument("--chunk-latency", type=float, default=0.002, help="假 LLM 每个分块的间隔（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，相同种子生成相同的文章库和查询")
+    parser.add_argument("--output", help="结果文件路径，默认写入 benchmarks/results/")
+    parser.add_argument("--compare", help="与之前的结果文件对比中位数")
+    parser.add_argument("--max-regression", type=float, help="中位数变慢超过该比例（如 0.2）时以非零状态退出")
+    parser.add_argument("--verbose", action="store_true", help="显示主程序自身的日志输出")
+    parser.add_argument(
+        "--import-budget-ms", type=float, default=CORE_IMPORT_BUDGET_MS,
+        help="冷启动导入 core 的中位数耗时预算（毫秒），超出时以非零状态退出",
+    )
+    # 以下参数供子进程内部使用
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--llm-worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workspace", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return 0
+    if args.llm_worker:
+        run_llm_worker(args)
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ai_reading_bench_") as tmp:
+        # 冷启动：无界面的 core 只导入轻量模块，界面 main 还要导入 Gradio
+        print("[bench] 冷启动导入 ……", file=sys.stderr)
+        results.append(summarize("core_import", 0, measure_import("core", max(3, args.repeat), tmp)))
+        results.append(summarize("ui_import", 0, measure_import("main", 3, tmp)))
+        # LLM 尾延迟：不限流、不重试，只看对冲和备用模型的效果
+        print("[bench] LLM 对冲与备用模型 ……", file=sys.stderr)
+        result_file = os.path.join(tmp, "llm.json")
+        command = [
+            sys.executable, os.path.abspath(__file__), "--llm-worker", "--result-file", result_file,
+            "--repeat", str(args.repeat), "--seed", str(args.seed),
+            "--llm-latency", str(args.llm_latency), "--chunk-latency", str(args.chunk_latency),
+        ]
+        env = dict(os.environ, LLM_RPM="0", LLM_TPM="0", LLM_MAX_RETRIES="0")
+        completed = subprocess.run(command, cwd=BENCH_DIR, env=env, stdout=None if args.verbose else subprocess.DEVNULL)
+        if completed.returncode != 0:
+            print(f"[bench] LLM 基准运行失败（退出码 {completed.returncode}）", file=sys.stderr)
+            return completed.returncode
+        with open(result_file, "r", encoding="utf-8") as f:
+            results.extend(json.load(f))
+        for size in sizes:
+            workspace = os.path.join(tmp, str(size))
+            os.makedirs(workspace)
+            result_file = os.path.join(tmp, f"{size}.json")
+            command = [
+                sys.executable, os.path.abspath(__file__), "--worker",
+                "--size", str(size), "--workspace", workspace, "--result-file", result_file,
+                "--repeat", str(args.repeat), "--seed", str(args.seed),
+                "--llm-latency", str(args.llm_latency), "--chunk-latency", str(args.chunk_latency),
+            ]
+            print(f"[bench] 文章库规模 {size} ……", file=sys.stderr)
+            completed = subprocess.run(command, cwd=BENCH_DIR, stdout=None if args.verbose else subprocess.DEVNULL)
+            if completed.returncode != 0:
+                print(f"[bench] 规模 {size} 的基准运行失败（退出码 {completed.returncode}）", file=sys.stderr)
+                return completed.returncode
+            with open(result_file, "r", encoding="utf-8") as f:
+                results.extend(json.load(f))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": args.repeat,
+            "llm_latency": args.llm_latency,
+            "chunk_latency": args.chunk_latency,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = print_results(results, baseline)
+    print(f"\n结果已写入 {output}")
+
+    core_import = next(r for r in results if r["name"] == "core_import")
+    if core_import["median_ms"] > args.import_budget_ms:
+        print(
+            f"冷启动导入 core 耗时 {core_import['median_ms']:.1f}ms，超出预算 {args.import_budget_ms:.0f}ms",
+            file=sys.stderr,
+        )
+        return 1
+
+    if args.max_regression is not None:
+        slower = [(r, change) for r, change in regressions if change > args.max_regression]
+        for result, change in slower:
+            print(f"变慢：{result['name']}（规模 {result['library_size']}）{change:+.1%}", file=sys.stderr)
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
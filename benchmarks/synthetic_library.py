@@ -0,0 +1,41 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+# 用于拼出合成文章的词表，按出现频率从高到低排列（近似 Zipf 分布）
+VOCABULARY = (
+    "我们 文章 认为 问题 模型 数据 用户 时间 市场 技术 公司 发展 推理 成本 产品 电动车 芯片 算力 "
+    "开源 检索 增强 生成 向量 数据库 自动驾驶 电池 充电 能量 密度 长期主义 反馈 延迟 吞吐 体验 阅读 "
+    "笔记 知识 管理 效率 写作 思考 创业 投资 估值 融资 团队 管理层 组织 文化 教育 城市 人口 消费 "
+    "出海 供应链 制造 半导体 光刻 封装 训练 微调 对齐 评测 基准 幻觉 上下文 窗口 多模态 语音 图像"
+).split()
+_WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+PUNCTUATION = "，，，。；、"
+
+
+def synthetic_article(rng, min_chars=2000, max_chars=20000):
+    """生成一篇合成文章：首行为标题，正文由分段的随机词语组成"""
+    title = "".join(rng.choices(VOCABULARY, _WEIGHTS, k=rng.randint(3, 6)))
+    target = rng.randint(min_chars, max_chars)
+    paragraphs = []
+    length = 0
+    while length < target:
+        words = rng.choices(VOCABULARY, _WEIGHTS, k=rng.randint(20, 60))
+        paragraph = "".join(word + (rng.choice(PUNCTUATION) if rng.random() < 0.2 else "") for word in words) + "。"
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return title, f"{title}\n\n" + "\n\n".join(paragraphs)
+
+
+def generate_library(directory, count, seed=0, min_chars=2000, max_chars=20000):
+    """在 directory 中生成 count 篇合成文章，文件名格式与 save_article 一致，返回生成的文件数"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        title, text = synthetic_article(rng, min_chars, max_chars)
+        timestamp = (start + timedelta(minutes=i)).strftime("%Y%m%d_%H%M%S")
+        safe_title = "".join(c if c.isalnum() or c in " _-" else "_" for c in title)[:50]
+        with open(os.path.join(directory, f"{timestamp}_{safe_title}_{i}.md"), "w", encoding="utf-8") as f:
+            f.write(text)
+    return count
@@ -0,0 +1,169 @@
+import os
+import re
+import threading
+
+# 模型上下文窗口大小（token），按所用的推理接入点配置
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "32768"))
+# 为模型回复预留的token数
+LLM_COMPLETION_RESERVE = int(os.getenv("LLM_COMPLETION_RESERVE", "4096"))
+# 对话历史最多占用的输入预算比例
+HISTORY_BUDGET_SHARE = float(os.getenv("HISTORY_BUDGET_SHARE", "0.25"))
+# 有对比文章时，主文章占文章预算的比例，其余由对比文章平分
+MAIN_ARTICLE_BUDGET_SHARE = float(os.getenv("MAIN_ARTICLE_BUDGET_SHARE", "0.5"))
+# 部署模型自带的分词器：把模型仓库中的 tokenizer.json（如 DeepSeek 的）放在这里时默认使用，计数与服务端一致
+DEFAULT_TOKENIZER_JSON = "tokenizer/tokenizer.json"
+# 分词器：HuggingFace tokenizer.json 的路径，或 tiktoken 编码名（如 cl100k_base，首次使用需联网下载编码表，
+# 与 DeepSeek 的分词结果只是近似）；都不可用时按字符估算，日志和指标中会标明
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER") or (
+    DEFAULT_TOKENIZER_JSON if os.path.exists(DEFAULT_TOKENIZER_JSON) else "cl100k_base"
+)
+
+# 每条消息的格式开销（role 等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+
+
+class TokenCounter:
+    """统计token数：优先使用配置的分词器，都不可用时退回到按字符估算（estimated 为 True）"""
+
+    def __init__(self, tokenizer=LLM_TOKENIZER):
+        self.tokenizer = tokenizer
+        self._encode = None
+        self._decode = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                if self.tokenizer.endswith(".json"):
+                    from tokenizers import Tokenizer
+                    tokenizer = Tokenizer.from_file(self.tokenizer)
+                    self._encode = lambda text: tokenizer.encode(text, add_special_tokens=False).ids
+                    self._decode = tokenizer.decode
+                else:
+                    import tiktoken
+                    encoding = tiktoken.get_encoding(self.tokenizer)
+                    self._encode = lambda text: encoding.encode(text, disallowed_special=())
+                    self._decode = encoding.decode
+            except Exception as e:
+                print(f"警告：加载分词器 {self.tokenizer} 失败，token 数改为按字符估算（日志和指标中标为估算）: {str(e)}")
+
+    @property
+    def estimated(self):
+        """是否在按字符估算（分词器不可用）"""
+        self._load()
+        return self._encode is None
+
+    @staticmethod
+    def _estimate(text):
+        # 中文约每字1个token，其他字符约每4个1个token
+        cjk = len(_CJK_RE.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def count(self, text):
+        if not text:
+            return 0
+        self._load()
+        if self._encode is None:
+            return self._estimate(text)
+        return len(self._encode(text))
+
+    def count_messages(self, messages):
+        total = 2
+        for message in messages:
+            content = message["content"] if isinstance(message, dict) else message.content
+            total += self.count(content) + MESSAGE_OVERHEAD_TOKENS
+        return total
+
+    def truncate(self, text, max_tokens):
+        """把文本截断到不超过 max_tokens 个token"""
+        if max_tokens <= 0:
+            return ""
+        self._load()
+        if self._encode is None:
+            # 按估算比例截断，再逐步收缩直到满足预算
+            end = len(text)
+            while end > 0 and self._estimate(text[:end]) > max_tokens:
+                end = int(end * max_tokens / max(self._estimate(text[:end]), 1)) - 1
+            return text[:max(end, 0)]
+        ids = self._encode(text)
+        if len(ids) <= max_tokens:
+            return text
+        return self._decode(ids[:max_tokens])
+
+
+token_counter = TokenCounter()
+
+
+def distribute(total, demands, weights=None):
+    """按权重把 total 分给各方，需求少于份额的一方多出的部分再分给其他方（注水法）"""
+    weights = list(weights or [1.0] * len(demands))
+    allocation = [0] * len(demands)
+    active = [i for i, demand in enumerate(demands) if demand > 0]
+    remaining = total
+    while active and remaining > 0:
+        weight_sum = sum(weights[i] for i in active) or 1.0
+        satisfied = []
+        for i in active:
+            share = int(remaining * weights[i] / weight_sum)
+            if demands[i] - allocation[i] <= share:
+                satisfied.append(i)
+        if not satisfied:
+            for i in active:
+                allocation[i] += int(remaining * weights[i] / weight_sum)
+            break
+        for i in satisfied:
+            remaining -= demands[i] - allocation[i]
+            allocation[i] = demands[i]
+            active.remove(i)
+    return allocation
+
+
+class ContextBudget:
+    """在系统提示、对话历史、主文章、对比文章和预留的回复之间分配上下文窗口"""
+
+    def __init__(self, context_window=LLM_CONTEXT_WINDOW, completion_reserve=LLM_COMPLETION_RESERVE,
+                 history_share=HISTORY_BUDGET_SHARE, main_share=MAIN_ARTICLE_BUDGET_SHARE, counter=token_counter):
+        self.context_window = context_window
+        self.completion_reserve = completion_reserve
+        self.history_share = history_share
+        self.main_share = main_share
+        self.counter = counter
+
+    @property
+    def max_input_tokens(self):
+        return self.context_window - self.completion_reserve
+
+    def fit_history(self, history, budget):
+        """从最近的一轮往前保留对话历史，直到用完预算；返回 (保留的轮次, 占用的token数)"""
+        kept = []
+        used = 0
+        for h_user, h_assistant in reversed(history):
+            cost = self.counter.count(h_user) + self.counter.count(h_assistant or "") + 2 * MESSAGE_OVERHEAD_TOKENS
+            if used + cost > budget:
+                break
+            kept.append((h_user, h_assistant))
+            used += cost
+        kept.reverse()
+        return kept, used
+
+    def plan(self, fixed_messages, history, article_demands):
+        """fixed_messages 为系统提示、问题等固定部分，article_demands 为各篇文章（主文章在前）希望使用的token数
+
+        返回 (保留的对话历史, 各篇文章分到的token数)
+        """
+        available = self.max_input_tokens - self.counter.count_messages(fixed_messages)
+        history_budget = int(max(available, 0) * self.history_share)
+        kept_history, history_used = self.fit_history(history, history_budget)
+        article_budget = max(available - history_used, 0)
+        if len(article_demands) > 1:
+            comparison_weight = (1 - self.main_share) / (len(article_demands) - 1)
+            weights = [self.main_share] + [comparison_weight] * (len(article_demands) - 1)
+        else:
+            weights = None
+        return kept_history, distribute(article_budget, article_demands, weights)
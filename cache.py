@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_DB = "output/cache.sqlite"
+
+
+def make_cache_key(*parts):
+    """把任意可 JSON 序列化的组成部分（文章文本、提示词、模型名……）哈希成缓存键"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """基于内容寻址的持久化结果缓存
+
+    值以 JSON 形式存放在 SQLite 表中；超过 max_age 秒的条目视为过期，
+    条目数超过 max_entries 时按最近访问时间淘汰。命中/未命中次数可通过 stats() 获取。
+    """
+
+    def __init__(self, namespace, db_path=CACHE_DB, max_entries=5000, max_age=30 * 24 * 3600):
+        self.namespace = namespace
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (namespace, accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.max_age:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND created_at < ?",
+                (self.namespace, now - self.max_age),
+            )
+        if self.max_entries:
+            self._conn.execute(
+                """
+                DELETE FROM cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache WHERE namespace = ?
+                    ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.namespace, self.namespace, self.max_entries),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
@@ -0,0 +1,1099 @@
+"""AI阅读助手的无界面核心：文章提取、要点分析、聊天、保存和文章库
+
+界面（main.py）、JSON 接口（api.py）、批量导入和基准测试都从这里导入，不依赖 Gradio。
+导入本模块只读取配置，不扫描文章库、不启动后台线程：文章清单、各类索引、缓存和发件箱
+都在第一次用到时才创建，NumPy 等较重的依赖也随之延迟导入。
+"""
+import os
+import atexit
+import hashlib
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from dotenv import load_dotenv
+
+# 加载环境变量（需在导入下面的模块之前，它们在导入时读取配置）
+load_dotenv()
+
+from llm_client import get_hedged_llm, parse_fallback_models, LLM_API_BASE
+from cache import ResultCache, make_cache_key
+from retrieval import RetrievalIndex, split_chunks
+from budget import ContextBudget, token_counter
+from ingest import BatchIngestor
+from metrics import (
+    registry, profiler, track_stage, record_error, record_llm_call, record_extract_timings, stage_summary,
+    llm_answer_summary,
+)
+
+# 获取模型名称（火山方舟的推理接入点ID）
+def get_model_name():
+    model_name = os.getenv("deepseek0324")
+    if not model_name:
+        model_name = "deepseek0324"  # 使用默认模型名称
+    return model_name
+
+# 获取使用火山方舟API的LLM（进程内共享，复用连接池，带重试、退避和限流；
+# 每次调用有截止时间，慢请求会被对冲，失败时按 LLM_FALLBACK_MODELS 依次改用备用模型）
+def get_llm():
+    """获取使用火山方舟API的LLM"""
+    try:
+        # 检查API密钥
+        api_key = os.getenv("ARK_API_KEY")
+        if not api_key:
+            return None, "错误：未找到 ARK_API_KEY 环境变量，请检查 .env 文件"
+        
+        # 检查模型名称环境变量
+        model_name = get_model_name()
+        
+        return get_hedged_llm(
+            # 从.env文件加载的环境变量中获取API Key
+            api_key,
+            # 火山方舟的推理接入点ID在前，备用模型按配置顺序在后
+            [(model_name, LLM_API_BASE)] + parse_fallback_models(),
+            temperature=0
+        ), None
+    except Exception as e:
+        return None, f"创建 LLM 实例时出错：{str(e)}"
+
+# 按需创建的共享资源：第一次调用时创建（线程安全），之后返回同一个实例
+def lazy_resource(factory):
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    get.created = lambda: bool(instance)
+    return get
+
+# 按链接缓存抓取结果：有效期内直接返回，过期后发条件请求校验，同一链接的并发请求只提取一次
+@lazy_resource
+def get_fetch_cache():
+    from extractor import extraction_worker
+    from fetch_cache import FetchCache
+    return FetchCache(extraction_worker.extract)
+
+# 提取文章内容
+def extract_article(link):
+    with track_stage("extract_article"):
+        start = time.perf_counter()
+        try:
+            # 先查抓取缓存，未命中时交给常驻的 Node 提取进程处理
+            result = get_fetch_cache().extract(link)
+        except Exception as e:
+            record_error("extract_article")
+            return None, f"文章提取失败：{str(e)}"
+        if result.get("timings") is not None:
+            # 记录条件请求、静态抓取、浏览器、保存文件和进程通信各占多少时间
+            record_extract_timings(result["timings"], time.perf_counter() - start)
+        return result["text"], result["file_name"]
+
+# 从文章内容中提取标题
+def extract_title(article_text):
+    # 简单方法：取第一行作为标题
+    lines = article_text.strip().split('\n')
+    if lines:
+        title = lines[0].strip()
+        # 如果标题太长，截断它
+        if len(title) > 50:
+            title = title[:47] + "..."
+        return title
+    return "无标题文章"
+
+# 已保存文章的持久化清单，首次使用时按 mtime 与磁盘对账
+@lazy_resource
+def get_library():
+    from library import ArticleLibrary
+    library = ArticleLibrary(title_fn=extract_title)
+    library.reconcile()
+    return library
+
+# 已保存文章的全文检索索引，按内容哈希与清单对账，只重建有变化的文章
+@lazy_resource
+def get_search_index():
+    from search_index import SearchIndex
+    search_index = SearchIndex()
+    search_index.reconcile(get_library().list_articles())
+    return search_index
+
+# 近似重复检测：MinHash 签名和 LSH 分桶持久化（首次使用时在后台补算缺少的签名）
+@lazy_resource
+def get_duplicate_index():
+    from dedup import DuplicateIndex
+    duplicate_index = DuplicateIndex()
+    start_index_reconcile()
+    return duplicate_index
+
+# 相关文章推荐：整个文章库的哈希 TF-IDF 向量矩阵，保存文章时增量追加
+@lazy_resource
+def get_related_index():
+    from related import RelatedIndex
+    related_index = RelatedIndex()
+    atexit.register(related_index.save)
+    start_index_reconcile()
+    return related_index
+
+# 每篇文章推荐的相关文章数
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", "5"))
+
+# 为新增或变化的文章计算查重签名和推荐向量
+# 删除前用 is_live 向文章库确认，取快照之后才保存的文章不会被当作已删除
+def reconcile_article_indexes(articles):
+    is_live = lambda path: get_library().get_by_path(path) is not None
+    get_duplicate_index().reconcile(articles, is_live)
+    get_related_index().reconcile(articles, is_live)
+
+_index_reconcile = None
+_index_reconcile_running = False
+_index_reconcile_again = False
+_index_reconcile_lock = threading.Lock()
+
+def _run_index_reconcile():
+    global _index_reconcile_running, _index_reconcile_again
+    while True:
+        reconcile_article_indexes(get_library().list_articles())
+        with _index_reconcile_lock:
+            if not _index_reconcile_again:
+                _index_reconcile_running = False
+                return
+            _index_reconcile_again = False
+
+# 在后台线程中对账查重签名和推荐向量，不阻塞启动（重复调用只启动一次）；
+# again 为 True 时（手动刷新文章列表）再对账一轮，正在对账时在本轮结束后补一轮
+def start_index_reconcile(again=False):
+    global _index_reconcile, _index_reconcile_running, _index_reconcile_again
+    with _index_reconcile_lock:
+        if _index_reconcile is None or (again and not _index_reconcile_running):
+            _index_reconcile_running = True
+            _index_reconcile = threading.Thread(target=_run_index_reconcile, name="index-reconcile", daemon=True)
+            _index_reconcile.start()
+        elif again:
+            _index_reconcile_again = True
+        return _index_reconcile
+
+# 等待后台对账完成（命令行、基准测试等需要完整索引时调用）
+def wait_for_index_reconcile(timeout=None):
+    start_index_reconcile().join(timeout)
+
+# 获取已保存的文章列表
+def get_saved_articles():
+    with track_stage("get_saved_articles"):
+        try:
+            # 直接返回清单中常驻内存的排序结果，不再逐个打开文件
+            return get_library().list_articles()
+        except Exception as e:
+            record_error("get_saved_articles")
+            print(f"获取已保存文章列表时出错: {str(e)}")
+            return []
+
+# 文章库每页显示的文章数：界面只下发当前页的标题和 id
+LIBRARY_PAGE_SIZE = int(os.getenv("LIBRARY_PAGE_SIZE", "50"))
+
+# 分页获取文章列表，返回 (本页文章, 实际页码, 页码说明)
+def get_library_page(page=0, title_filter=""):
+    with track_stage("get_library_page"):
+        try:
+            articles, page, total = get_library().page(page, LIBRARY_PAGE_SIZE, title_filter)
+        except Exception as e:
+            record_error("get_library_page")
+            print(f"获取文章列表时出错: {str(e)}")
+            return [], 0, "获取文章列表失败"
+    pages = max(1, -(-total // LIBRARY_PAGE_SIZE))
+    scope = f"符合「{title_filter.strip()}」的" if title_filter and title_filter.strip() else ""
+    return articles, page, f"第 {page + 1} / {pages} 页，{scope}共 {total} 篇"
+
+# 全文检索已保存的文章，返回按相关度排序的 [{"path", "title", "score", "snippet"}, ...]
+def search_articles(query, limit=20):
+    try:
+        return get_search_index().search(query, limit=limit)
+    except Exception as e:
+        print(f"检索文章时出错: {str(e)}")
+        return []
+
+# 加载已保存的文章
+def load_saved_article(file_path):
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        return content, extract_title(content), file_path
+    except Exception as e:
+        print(f"加载文章时出错: {str(e)}")
+        return None, None, None
+
+# 是否启用流式输出（逐 token 返回），设置 LLM_STREAMING=0 可关闭
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") != "0"
+
+# 最近的LLM调用耗时记录（首个token耗时、总耗时），按请求记录
+llm_timings = deque(maxlen=200)
+
+# 提示词的token预算分配（上下文窗口、预留回复长度等按配置）
+context_budget = ContextBudget()
+
+# 流式调用LLM，每收到一段内容就产出一次目前为止的完整文本
+def stream_llm(llm, messages, label="llm"):
+    prompt_tokens = token_counter.count_messages(messages)
+    if prompt_tokens > context_budget.max_input_tokens:
+        print(f"[LLM] 警告：{label} 的提示词共 {prompt_tokens} tokens，超过输入预算 {context_budget.max_input_tokens}")
+    start = time.perf_counter()
+    first_token_at = None
+    content = ""
+    failed = False
+    # 由 HedgedLLM 填写：回答的模型和请求角色（primary / hedge / fallback）
+    call_info = {}
+    try:
+        if LLM_STREAMING:
+            for chunk in llm.stream(messages, label=label, call_info=call_info):
+                if not chunk.content:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                content += chunk.content
+                yield content
+        else:
+            content = llm.invoke(messages, label=label, call_info=call_info).content
+            first_token_at = time.perf_counter()
+            yield content
+    except Exception:
+        failed = True
+        raise
+    finally:
+        end = time.perf_counter()
+        ttft = (first_token_at or end) - start
+        completion_tokens = token_counter.count(content)
+        record_llm_call(label, end - start, ttft, prompt_tokens, completion_tokens, failed=failed, estimated=token_counter.estimated)
+        llm_timings.append({
+            "label": label,
+            "ttft": ttft,
+            "total": end - start,
+            "chars": len(content),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "model": call_info.get("model", ""),
+            "role": call_info.get("role", ""),
+            "time": datetime.now().isoformat(timespec="seconds"),
+        })
+        answered_by = f", 回答模型 {call_info['model']}（{call_info['role']}）" if call_info else ""
+        estimated = "（按字符估算）" if token_counter.estimated else ""
+        print(f"[LLM] {label}: 提示词 {prompt_tokens} tokens{estimated}, 首个token耗时 {ttft:.2f}s, 总耗时 {end - start:.2f}s, 输出 {len(content)} 字符{answered_by}")
+
+# 文章要点缓存：按 文章内容 + 提示词 + 模型名 的哈希寻址，重复打开同一篇文章时不再调用LLM
+@lazy_resource
+def get_points_cache():
+    return ResultCache(
+        "article_points",
+        max_entries=int(os.getenv("POINTS_CACHE_MAX_ENTRIES", "5000")),
+        max_age=float(os.getenv("POINTS_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+    )
+
+# 从LLM的回复中解析要点列表
+def parse_points(points_text):
+    points = []
+    
+    # 简单处理，按行分割并清理
+    for line in points_text.split('\n'):
+        line = line.strip()
+        if line and (line.startswith('- ') or line.startswith('• ') or 
+                    line.startswith('1.') or line.startswith('2.') or 
+                    line.startswith('3.') or line.startswith('4.') or 
+                    line.startswith('5.')):
+            # 移除前缀符号
+            clean_line = line.lstrip('- •').lstrip('1234567890.').strip()
+            if clean_line:
+                points.append(clean_line)
+    
+    # 如果没有正确解析出要点，则使用整个响应
+    if not points:
+        points = [points_text]
+    return points
+
+# 长文章分段并行分析（map-reduce）：超过该字符数的文章先分段概括，再合并出最终要点
+MAP_REDUCE_THRESHOLD = int(os.getenv("MAP_REDUCE_THRESHOLD", "12000"))
+# 每段的目标字符数
+MAP_CHUNK_CHARS = int(os.getenv("MAP_CHUNK_CHARS", "6000"))
+# 分段概括、对比文章预分析时的并发数
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+
+POINTS_SYSTEM_PROMPT = "你是一个擅长分析文章的AI助手。请提取文章的3个主要观点，并以简洁的方式呈现。"
+
+# 概括长文章中的一段（map 阶段），结果同样按内容缓存
+def summarize_article_chunk(llm, chunk, index, total):
+    messages = [
+        {"role": "system", "content": "你是一个擅长分析文章的AI助手。请简洁地概括文章片段的要点。"},
+        {"role": "user", "content": f"以下是一篇长文章的第 {index}/{total} 部分，请用不超过3条短句列出这部分的要点：\n\n{chunk}"}
+    ]
+    cache_key = make_cache_key(get_model_name(), messages)
+    cached = get_points_cache().get(cache_key)
+    if cached is not None:
+        return cached
+    start = time.perf_counter()
+    try:
+        summary = llm.invoke(messages, label="summarize_article_chunk").content
+    except Exception:
+        record_llm_call("summarize_article_chunk", time.perf_counter() - start, time.perf_counter() - start,
+                        token_counter.count_messages(messages), 0, failed=True, estimated=token_counter.estimated)
+        raise
+    elapsed = time.perf_counter() - start
+    record_llm_call(
+        "summarize_article_chunk", elapsed, elapsed, token_counter.count_messages(messages), token_counter.count(summary),
+        estimated=token_counter.estimated,
+    )
+    get_points_cache().set(cache_key, summary)
+    return summary
+
+# 并行概括各段，产出进度文本，最后产出按原文顺序排列的各段摘要列表
+def map_article_chunks(llm, article_text, concurrency=ANALYSIS_CONCURRENCY):
+    chunks = split_chunks(article_text, MAP_CHUNK_CHARS)
+    summaries = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(summarize_article_chunk, llm, chunk, i + 1, len(chunks)): i
+            for i, chunk in enumerate(chunks)
+        }
+        done = 0
+        for future in as_completed(futures):
+            summaries[futures[future]] = future.result()
+            done += 1
+            yield f"文章较长，正在分段分析（已完成 {done}/{len(chunks)} 段）……", None
+    yield "", summaries
+
+# 流式分析文章要点，产出 (目前为止的回复文本, 要点列表, 错误信息)
+# 要点列表只在最后一次产出时才有值；concurrency 为长文章分段分析的并发数
+def stream_article_points(article_text, concurrency=ANALYSIS_CONCURRENCY):
+    with track_stage("analyze_article_points"):
+        try:
+            messages = [
+                {"role": "system", "content": POINTS_SYSTEM_PROMPT},
+                {"role": "user", "content": f"请分析以下文章，提取3-5个主要观点，每个观点用一句话概括：\n\n{article_text}"}
+            ]
+
+            # 先查缓存
+            cache_key = make_cache_key(get_model_name(), messages)
+            cached_points = get_points_cache().get(cache_key)
+            if cached_points is not None:
+                yield "", cached_points, None
+                return
+
+            llm, error = get_llm()
+            if llm is None:
+                record_error("analyze_article_points")
+                yield "", [], error
+                return
+        
+            llm_messages = messages
+            if len(article_text) > MAP_REDUCE_THRESHOLD or token_counter.count_messages(messages) > context_budget.max_input_tokens:
+                # map：并行概括各段；reduce：把各段摘要合并成最终要点
+                summaries = None
+                for progress, summaries in map_article_chunks(llm, article_text, concurrency):
+                    if summaries is None:
+                        yield progress, [], None
+                joined = "\n\n".join(f"第{i+1}部分：\n{summary}" for i, summary in enumerate(summaries))
+                llm_messages = [
+                    {"role": "system", "content": POINTS_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"以下是一篇长文章按顺序分段概括的要点，请综合提炼出整篇文章的3-5个主要观点，每个观点用一句话概括：\n\n{joined}"}
+                ]
+        
+            points_text = ""
+            for points_text in stream_llm(llm, llm_messages, label="analyze_article_points"):
+                yield points_text, [], None
+        
+            # 处理响应，提取要点列表
+            points = parse_points(points_text)
+            get_points_cache().set(cache_key, points)
+            yield points_text, points, None
+        except Exception as e:
+            record_error("analyze_article_points")
+            yield "", [], f"分析文章要点失败：{str(e)}"
+
+# 分析文章要点
+def analyze_article_points(article_text, concurrency=ANALYSIS_CONCURRENCY):
+    points, error = [], None
+    for _, points, error in stream_article_points(article_text, concurrency):
+        pass
+    return points, error
+
+# 会话状态：每个浏览器会话各自持有一份（界面中通过 gr.State 传入各个处理函数，无界面调用时自行创建），多个用户互不干扰
+class State:
+    def __init__(self):
+        self.article_text = ""
+        self.article_title = ""
+        self.current_file = ""
+        self.article_points = []
+        self.link = ""
+        self.note_content = ""
+        self.chat_history = []
+        # 较早对话轮次的滚动摘要，以及摘要覆盖的轮数
+        self.history_memo = ""
+        self.memo_turns = 0
+        self.memo_anchor = ""
+        self.memo_pending = False
+        # 文章库浏览：当前页码和标题筛选条件
+        self.library_page = 0
+        self.library_filter = ""
+        # 对比文章：跨页保留的已选文章 id，以及对比选择器当前页的状态
+        self.comparison_ids = []
+        self.comparison_page = 0
+        self.comparison_filter = ""
+        self.comparison_page_ids = []
+        # 当前文章在文章库中的路径（未保存的文章为空），以及为它推荐的相关文章 id
+        self.article_path = ""
+        self.related_ids = []
+
+# 构建摘要信息
+def build_summary(title, points):
+    summary = f"## 《{title}》\n\n### 主要观点:\n"
+    for i, point in enumerate(points):
+        summary += f"{i+1}. {point}\n"
+    return summary
+
+# 构建默认笔记内容
+def build_default_note(title, points):
+    default_note = f"# {title}\n\n## 要点摘要\n\n"
+    for i, point in enumerate(points):
+        default_note += f"{i+1}. {point}\n"
+    default_note += "\n## 我的笔记\n\n"
+    return default_note
+
+# 提取链接中的文章并载入会话，返回错误信息（成功时为 None）
+def load_url(url, session):
+    session.link = url
+    article_text, file_name = extract_article(url)
+    if article_text is None:
+        return file_name
+    session.article_text = article_text
+    session.article_title = extract_title(article_text)
+    session.current_file = file_name
+    session.article_path = ""
+    get_retrieval_index().index_document(article_text, session.article_title)
+    return None
+
+# 把清单中的一篇文章载入会话（此时才读取正文），返回错误信息（成功时为 None）
+def load_saved(file_info, session):
+    article_text, title, file_path = load_saved_article(file_info["path"])
+    if article_text is None:
+        return "加载文章失败"
+    session.article_text = article_text
+    session.article_title = title
+    session.current_file = os.path.basename(file_path)
+    session.article_path = file_info["path"]
+    session.link = file_info.get("source_url") or ""
+    return None
+
+# 要点分析完成后更新会话：重置对话和对比文章，生成默认笔记，返回 (摘要, 默认笔记)
+def apply_article_points(session, points):
+    session.article_points = points
+    session.chat_history = []
+    reset_history_memo(session)
+    default_note = build_default_note(session.article_title, points)
+    session.note_content = default_note
+    session.comparison_ids = []
+    return build_summary(session.article_title, points), default_note
+
+# 提取链接中的文章并分析要点，返回 (要点, 错误信息)
+def open_url(url, session):
+    error = load_url(url, session)
+    if error:
+        return [], error
+    return _analyze_session_article(session)
+
+# 按 id 打开已保存的文章并分析要点（已预计算的文章直接使用结果，不调用 LLM），返回 (要点, 错误信息)
+def open_article(article_id, session):
+    file_info = get_library().get_by_id(article_id)
+    if file_info is None:
+        return [], f"文章不存在或已被删除: {article_id}"
+    error = load_saved(file_info, session)
+    if error:
+        return [], error
+    artifacts = get_article_artifacts(file_info)
+    if artifacts is not None:
+        apply_article_points(session, artifacts["points"])
+        return artifacts["points"], None
+    return _analyze_session_article(session)
+
+def _analyze_session_article(session):
+    points, error = analyze_article_points(session.article_text)
+    if error:
+        return [], error
+    apply_article_points(session, points)
+    return points, None
+
+# 与当前文章最相似的已保存文章，返回 [(清单条目, 相似度), ...]
+def get_related_articles(session, top_k=RELATED_TOP_K):
+    if not session.article_text:
+        return []
+    with track_stage("related_articles"):
+        try:
+            # 已保存的文章直接用矩阵中的向量，新提取的文章现算一次向量
+            matches = get_related_index().related(session.article_text, top_k, path=session.article_path or None)
+        except Exception as e:
+            record_error("related_articles")
+            print(f"推荐相关文章时出错: {str(e)}")
+            return []
+    related = []
+    for match in matches:
+        article = get_library().get_by_path(match["path"])
+        if article is not None:
+            related.append((article, match["similarity"]))
+    return related
+
+# 已选对比文章的路径（已被删除的文章跳过）
+def get_comparison_paths(session):
+    articles = (get_library().get_by_id(article_id) for article_id in session.comparison_ids)
+    return [article["path"] for article in articles if article is not None]
+
+# 文章分块检索索引：每篇文章只建一次索引，聊天时按问题选取相关片段
+get_retrieval_index = lazy_resource(RetrievalIndex)
+# 每轮聊天最多选取的片段数
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+# 所有文章总长度不超过该字符数时直接发送全文，不做检索
+FULL_TEXT_CHAR_LIMIT = int(os.getenv("FULL_TEXT_CHAR_LIMIT", "8000"))
+
+# 根据问题为每篇文章挑选候选片段，返回与 articles 顺序一致的列表，每项为按相关度排序的 [(分块序号, 文本), ...]
+def rank_article_passages(query, articles):
+    if sum(len(text) for _, text in articles) <= FULL_TEXT_CHAR_LIMIT:
+        return [[(0, text)] for _, text in articles]
+    
+    docs = [get_retrieval_index().get_document(text, title) for title, text in articles]
+    top_k = RETRIEVAL_TOP_K + 2 * (len(docs) - 1)
+    hits = get_retrieval_index().search(query, docs, top_k=top_k, min_per_doc=1 if len(docs) > 1 else 0)
+    if not hits:
+        # 问题与文章没有任何重合的词时，退回到各篇文章的开头片段
+        hits = [(doc, 0, 0.0) for doc in docs if doc.chunks]
+    
+    return [
+        [(chunk_idx, doc.chunks[chunk_idx]) for hit_doc, chunk_idx, _ in hits if hit_doc is doc]
+        for doc in docs
+    ]
+
+# 按相关度依次放入片段直到用完token预算，再按原文顺序拼接
+def pack_passages(ranked, budget):
+    chosen = []
+    used = 0
+    for chunk_idx, text in ranked:
+        cost = token_counter.count(text)
+        if used + cost > budget:
+            if not chosen:
+                # 连最相关的片段都放不下时，截断后放入
+                chosen.append((chunk_idx, token_counter.truncate(text, budget)))
+            break
+        chosen.append((chunk_idx, text))
+        used += cost
+    chosen.sort()
+    return "\n……\n".join(text for _, text in chosen)
+
+# 并行加载并预分析对比文章，按 paths 的顺序返回 [(标题, 内容, 要点), ...]
+# 加载失败时内容为 None，要点位置为错误信息
+def load_comparison_articles(paths):
+    if not paths:
+        return []
+    # 文章之间并行、每篇文章的分段分析再并行，两层的并发数相乘不超过 ANALYSIS_CONCURRENCY
+    workers = min(len(paths), ANALYSIS_CONCURRENCY)
+    chunk_concurrency = max(1, ANALYSIS_CONCURRENCY // workers)
+
+    def load_and_summarize(path):
+        comp_content, comp_title, _ = load_saved_article(path)
+        if not comp_content:
+            return comp_title, None, "加载文章失败"
+        # 要点按内容缓存，只有第一次对比时才会调用LLM
+        comp_points, _ = analyze_article_points(comp_content, concurrency=chunk_concurrency)
+        return comp_title, comp_content, comp_points
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(load_and_summarize, path) for path in paths]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append((None, None, str(e)))
+    return results
+
+# 构建发送给LLM的聊天消息
+def build_chat_messages(session, message, history, comparison_article_paths=None):
+    # 构建基础上下文和系统提示
+    # 文章较长时不再截取开头的固定字符数，而是按问题检索主文章和对比文章中最相关的片段
+    articles = [(session.article_title, session.article_text)]
+    comparison_points = []
+    load_errors = []
+    for i, (path, loaded) in enumerate(zip(comparison_article_paths or [], load_comparison_articles(comparison_article_paths or []))):
+        comp_title, comp_content, comp_points = loaded
+        if comp_content:
+            articles.append((comp_title, comp_content))
+            comparison_points.append(comp_points)
+        else:
+            load_errors.append(f"\n--- 无法加载对比文章 {i+1} ({os.path.basename(path)}): {comp_points} ---\n")
+    
+    # 检索时带上上一轮的问题，便于处理追问
+    query = message
+    if history:
+        query = f"{history[-1][0]}\n{message}"
+    ranked_passages = rank_article_passages(query, articles)
+
+    system_prompt = "你是一个AI伴读助手，帮助用户理解文章。你的回答应该简洁明了，并且在回答后提出一个相关的问题，引导用户继续思考。"
+    if comparison_article_paths:
+        system_prompt = (
+            "你是一位专业的AI研究助手，擅长深度对比和分析多篇文章。\n"
+            "请仔细阅读以下所有提供的文章材料。\n"
+            "针对用户的问题，你需要：\n"
+            "1. 明确指出信息来源于哪篇文章（例如，'根据《文章A》...' 或 '《文章B》则认为...'）。\n"
+            "2. 深入比较这些文章在相关观点上的异同点、各自的侧重点和论证方式。\n"
+            "3. 如果适用，整合不同文章的观点，形成一个更全面的看法。\n"
+            "4. 避免简单罗列，要进行有深度的分析和综合。\n"
+            "5. 在回答后，可以提出一个引导用户进一步思考这些文章间联系或差异的问题。"
+        )
+    
+    # 对比文章的要点和标题等固定内容先计入，剩余预算在对话历史和各篇文章的片段之间分配
+    comparison_headers = []
+    for i, ((comp_title, _), comp_points) in enumerate(zip(articles[1:], comparison_points)):
+        header = f"\n--- 对比文章 {i+1}: 《{comp_title}》 ---\n"
+        if comp_points:
+            header += "主要观点：\n" + "".join(f"{j+1}. {point}\n" for j, point in enumerate(comp_points))
+        comparison_headers.append(header)
+    # 已压缩的较早对话只发送摘要，预算只在最近的轮次之间分配
+    history_memo, recent_history = split_history_for_prompt(session, history)
+    memo_message = f"此前对话的摘要：\n{history_memo}" if history_memo else ""
+    fixed_messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": memo_message},
+        {"role": "user", "content": f"主文章《{session.article_title}》相关内容：" + "".join(comparison_headers) + "".join(load_errors)},
+        {"role": "user", "content": message},
+    ]
+    demands = [sum(token_counter.count(text) for _, text in ranked) for ranked in ranked_passages]
+    kept_history, article_budgets = context_budget.plan(fixed_messages, recent_history, demands)
+    passages = [pack_passages(ranked, budget) for ranked, budget in zip(ranked_passages, article_budgets)]
+
+    current_article_context = f"主文章《{session.article_title}》相关内容：\n{passages[0]}\n\n"
+    if comparison_article_paths:
+        current_article_context += "以下是用于对比分析的其他文章材料：\n"
+        for header, comp_passage in zip(comparison_headers, passages[1:]):
+            current_article_context += f"{header}相关内容：\n{comp_passage}\n"
+        current_article_context += "".join(load_errors)
+        current_article_context += "\n请基于以上所有文章材料进行回答。\n"
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"请分析以下文本：\n{current_article_context}\n\n现在，针对以上内容，回答我的问题。"} # 更明确地指示LLM基于提供的上下文
+    ]
+    
+    # 添加对话摘要和最近的对话历史（超出预算的较早轮次不再发送）
+    if memo_message:
+        messages.append({"role": "user", "content": memo_message})
+        messages.append({"role": "assistant", "content": "好的，我会结合此前的讨论继续回答。"})
+    for h_user, h_assistant in kept_history:
+        messages.append({"role": "user", "content": h_user})
+        if h_assistant:
+            messages.append({"role": "assistant", "content": h_assistant})
+    
+    # 添加当前问题
+    messages.append({"role": "user", "content": message})
+    return messages
+
+# 对话历史压缩：超过阈值后，较早的轮次在回复发送后由后台线程合并进滚动摘要
+HISTORY_COMPACT_THRESHOLD = int(os.getenv("HISTORY_COMPACT_THRESHOLD", "6"))
+# 压缩后原样保留的最近轮数
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "3"))
+
+history_compaction_executor = ThreadPoolExecutor(max_workers=2)
+
+# 重置会话的对话摘要（切换文章、清除对话时调用）
+def reset_history_memo(session):
+    session.history_memo = ""
+    session.memo_turns = 0
+    session.memo_anchor = ""
+    session.memo_pending = False
+
+# 返回 (可用的对话摘要, 摘要之后的对话轮次)；摘要与当前对话不匹配（例如对话已被清除）时不使用摘要
+def split_history_for_prompt(session, history):
+    memo_turns = session.memo_turns
+    if session.history_memo and 0 < memo_turns <= len(history) and history[memo_turns - 1][0] == session.memo_anchor:
+        return session.history_memo, history[memo_turns:]
+    return "", history
+
+# 把若干轮对话合并进已有摘要
+def summarize_history(previous_memo, turns):
+    llm, error = get_llm()
+    if llm is None:
+        raise RuntimeError(error)
+    dialogue = "\n".join(f"用户：{h_user}\n助手：{h_assistant or ''}" for h_user, h_assistant in turns)
+    messages = [
+        {"role": "system", "content": "你是对话记录员，负责把阅读讨论整理成简洁的摘要。"},
+        {"role": "user", "content": (
+            "请把已有摘要和新增对话合并为一份不超过300字的摘要，保留用户关心的问题、已得出的结论和尚未解决的疑问：\n\n"
+            f"已有摘要：\n{previous_memo or '（无）'}\n\n新增对话：\n{dialogue}"
+        )}
+    ]
+    memo = ""
+    for memo in stream_llm(llm, messages, label="history_compaction"):
+        pass
+    return memo
+
+# 在回复发送后检查是否需要压缩对话历史，需要时提交到后台执行，不阻塞本轮回复
+def schedule_history_compaction(session, history):
+    memo, recent = split_history_for_prompt(session, history)
+    if session.memo_pending or len(recent) <= HISTORY_COMPACT_THRESHOLD:
+        return
+    fold_count = len(recent) - HISTORY_KEEP_TURNS
+    turns = [tuple(turn) for turn in recent[:fold_count]]
+    new_memo_turns = len(history) - len(recent) + fold_count
+    anchor = history[new_memo_turns - 1][0]
+    session.memo_pending = True
+
+    def compact():
+        try:
+            new_memo = summarize_history(memo, turns)
+            if new_memo:
+                session.history_memo = new_memo
+                session.memo_turns = new_memo_turns
+                session.memo_anchor = anchor
+        except Exception as e:
+            print(f"压缩对话历史失败: {str(e)}")
+        finally:
+            session.memo_pending = False
+
+    history_compaction_executor.submit(compact)
+
+# 流式聊天：每收到新的token就产出一次目前为止的回复
+def chatbot_stream(session, message, history, comparison_article_paths=None):
+    if not session.article_text:
+        yield "请先加载或提取主文章内容。您可以在'文章来源'部分提供URL或选择已保存的文章。"
+        return
+    
+    with track_stage("chatbot"):
+        llm, error = get_llm()
+        if llm is None:
+            record_error("chatbot")
+            yield error
+            return
+
+        with track_stage("chat_prompt_build"):
+            messages = build_chat_messages(session, message, history, comparison_article_paths)
+        
+        try:
+            # 调用LLM
+            for partial_text in stream_llm(llm, messages, label="chatbot"):
+                yield partial_text
+        except Exception as e:
+            record_error("chatbot")
+            yield f"生成回复时出错：{str(e)}"
+
+# 聊天机器人处理函数
+def chatbot(session, message, history, comparison_article_paths=None):
+    response_text = ""
+    for response_text in chatbot_stream(session, message, history, comparison_article_paths):
+        pass
+    return response_text
+
+# 保存文章到 formatted 文件夹，返回 (文件路径, 错误信息)
+def save_article(article_content, base_article_title, user_custom_title=None, source_url=None, replace_path=None):
+    if not article_content:
+        return None, "文章内容为空，未保存"
+    
+    effective_title = base_article_title
+    content_to_save = article_content
+
+    if user_custom_title and user_custom_title.strip():
+        effective_title = user_custom_title.strip()
+        content_to_save = f"{effective_title}\n\n{article_content}"
+    
+    if not effective_title: # Fallback if all titles are empty
+        effective_title = "无标题文章"
+
+    try:
+        output_dir = "output/formatted"
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        if replace_path:
+            # 替换重复的已有文章：覆盖原文件，清单中的文章 id 保持不变
+            filename = replace_path
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # 清理标题以用作文件名，并限制长度
+            safe_title = "".join(c if c.isalnum() or c in " _-" else "_" for c in effective_title)[:50]
+            filename = f"{output_dir}/{timestamp}_{safe_title}.md"
+            # 批量导入时同一秒内可能保存同名文章，避免互相覆盖
+            suffix = 1
+            while os.path.exists(filename):
+                suffix += 1
+                filename = f"{output_dir}/{timestamp}_{safe_title}_{suffix}.md"
+
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(content_to_save)
+    except Exception as e:
+        return None, f"保存文章失败：{str(e)}"
+
+    # 文件已写入，索引更新失败只记录下来，不算保存失败；启动或刷新文章列表时的对账会补上
+    try:
+        # 增量更新文章清单，并建立分块检索索引
+        article = get_library().record(filename, content_to_save, source_url=source_url or None)
+        get_retrieval_index().index_document(content_to_save, extract_title(content_to_save))
+        get_search_index().index_article(filename, article["title"], content_to_save, article["content_hash"])
+        get_duplicate_index().add(filename, content_to_save, article["content_hash"])
+        get_related_index().add(filename, content_to_save, article["content_hash"])
+        # 在后台预计算要点，之后打开这篇文章不再调用 LLM（摘要和默认笔记由要点直接生成）
+        get_precompute_scheduler().enqueue(filename, article["content_hash"])
+    except Exception as e:
+        record_error("save_article_index")
+        print(f"文章已保存到 {filename}，但更新索引时出错: {str(e)}")
+    return filename, None
+
+# 查找与文章内容近似重复的已保存文章，返回 (清单条目, 相似度)，没有时返回 (None, 0.0)
+def find_duplicate_article(article_text):
+    try:
+        for match in get_duplicate_index().find_duplicates(article_text):
+            article = get_library().get_by_path(match["path"])
+            if article is not None:
+                return article, match["similarity"]
+    except Exception as e:
+        print(f"检查重复文章时出错: {str(e)}")
+    return None, 0.0
+
+def describe_duplicate(article, similarity):
+    return f"发现相似度 {similarity:.0%} 的已保存文章《{article['title']}》，请选择关联到该文章、替换它或仍然另存"
+
+# 保存文章并按 on_duplicate 处理近似重复的已有文章：
+# ask 只提示不保存，link 关联到已有文章，replace 用当前内容替换已有文章，keep 仍然另存一篇
+# 返回 {"status": saved / replaced / linked / skipped / duplicate / error, "path", "duplicate", "similarity", "error"}
+# skipped 表示要求关联但当前文章没有来源链接，既没有保存也没有关联
+def save_with_dedup(article_content, base_article_title, user_custom_title=None, source_url=None, on_duplicate="ask"):
+    duplicate, similarity = (None, 0.0)
+    if article_content and on_duplicate != "keep":
+        duplicate, similarity = find_duplicate_article(article_content)
+    result = {"status": "saved", "path": None, "duplicate": duplicate, "similarity": similarity, "error": None}
+    if duplicate is not None and on_duplicate == "ask":
+        return dict(result, status="duplicate")
+    if duplicate is not None and on_duplicate == "link":
+        if not source_url:
+            return dict(result, status="skipped", path=duplicate["path"])
+        get_library().link_source(duplicate["path"], source_url)
+        return dict(result, status="linked", path=duplicate["path"])
+    replace_path = duplicate["path"] if duplicate is not None else None
+    filename, error = save_article(article_content, base_article_title, user_custom_title, source_url, replace_path=replace_path)
+    if error:
+        return dict(result, status="error", error=error)
+    return dict(result, status="replaced" if replace_path else "saved", path=filename)
+
+# 保存文章并返回状态信息（on_duplicate 同 save_with_dedup）
+def save_article_to_formatted(article_content, base_article_title, user_custom_title=None, source_url=None, on_duplicate="ask"):
+    result = save_with_dedup(article_content, base_article_title, user_custom_title, source_url, on_duplicate)
+    duplicate = result["duplicate"]
+    if result["status"] == "duplicate":
+        return describe_duplicate(duplicate, result["similarity"])
+    if result["status"] == "linked":
+        return f"与已保存的《{duplicate['title']}》重复（相似度 {result['similarity']:.0%}），已关联到该文章，未重复保存"
+    if result["status"] == "skipped":
+        return f"与已保存的《{duplicate['title']}》重复（相似度 {result['similarity']:.0%}），当前文章没有来源链接，无法关联，未重复保存"
+    if result["status"] == "error":
+        return result["error"]
+    if result["status"] == "replaced":
+        return f"已用当前内容替换《{duplicate['title']}》（{result['path']}）"
+    return f"文章已保存至 {result['path']}"
+
+# 批量导入：提取 -> 要点分析 -> 保存，提取和LLM调用分别限制并发
+# on_duplicate 为 link（默认，关联到已有文章并跳过分析）、replace（替换已有文章）或 keep（仍然另存）
+def run_batch_ingest(urls, fetch_concurrency=4, llm_concurrency=2, progress=print, on_duplicate="link"):
+    ingestor = BatchIngestor(
+        extract_fn=extract_article,
+        # 每篇文章的分块串行分析，LLM 并发只由 llm_concurrency 决定
+        analyze_fn=lambda text: analyze_article_points(text, concurrency=1),
+        save_fn=lambda text, title, url, replace_path=None: save_article(text, title, source_url=url, replace_path=replace_path),
+        title_fn=extract_title,
+        is_known_fn=get_library().has_source_url,
+        find_duplicate_fn=lambda text: (find_duplicate_article(text)[0] or {}).get("path"),
+        link_fn=get_library().link_source,
+        on_duplicate=on_duplicate,
+        fetch_concurrency=fetch_concurrency,
+        llm_concurrency=llm_concurrency,
+    )
+    return ingestor.run(urls, progress=progress)
+
+# 后台预计算的线程数，即后台分析同时占用的 LLM 调用数（0 表示关闭预计算）
+PRECOMPUTE_WORKERS = int(os.getenv("PRECOMPUTE_WORKERS", "1"))
+# 启动时最多为多少篇最近的文章补算（0 表示全部）
+PRECOMPUTE_STARTUP_LIMIT = int(os.getenv("PRECOMPUTE_STARTUP_LIMIT", "500"))
+
+# 预计算一篇已保存文章的要点（同时写入要点缓存）；摘要和默认笔记依赖会话中的标题，打开文章时由要点生成，不另外保存
+def precompute_article(path, content_hash):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return None, f"读取文章失败：{str(e)}"
+    if hashlib.sha256(data).hexdigest() != content_hash:
+        # 文章已被修改，下次与清单对账时会按新内容重新排队
+        return None, "文章内容已变化"
+    article_text = data.decode("utf-8", errors="replace")
+    with track_stage("precompute_article"):
+        # 分段分析也不并行，后台占用的 LLM 调用数不超过预计算的线程数
+        points, error = analyze_article_points(article_text, concurrency=1)
+    if error:
+        return None, error
+    return {"title": extract_title(article_text), "points": points}, None
+
+# 预计算任务队列：任务和结果持久化在 output/jobs.sqlite 中，按文章修改时间从新到旧处理
+@lazy_resource
+def get_precompute_scheduler():
+    from jobs import JobScheduler
+    return JobScheduler(precompute_article, workers=PRECOMPUTE_WORKERS)
+
+# 已预计算的派生内容（文章内容未变化时才有效），没有时返回 None
+def get_article_artifacts(file_info):
+    return get_precompute_scheduler().result(file_info["path"], file_info["content_hash"])
+
+def _sync_and_start_precompute():
+    llm, error = get_llm()
+    if llm is None:
+        print(f"[预计算] 未启动：{error}")
+        return
+    scheduler = get_precompute_scheduler()
+    added, removed = scheduler.sync(get_library().list_articles(), limit=PRECOMPUTE_STARTUP_LIMIT or None)
+    if added or removed:
+        print(f"[预计算] 新排队 {added} 篇文章，清理 {removed} 个已删除文章的任务")
+    scheduler.start()
+
+_precompute = None
+_precompute_lock = threading.Lock()
+
+# 在后台启动预计算：为最近的新文章和内容有变化的文章排队，再启动工作线程（重复调用只启动一次）
+def start_precompute():
+    global _precompute
+    with _precompute_lock:
+        if _precompute is None and PRECOMPUTE_WORKERS > 0:
+            _precompute = threading.Thread(target=_sync_and_start_precompute, name="precompute-sync", daemon=True)
+            _precompute.start()
+        return _precompute
+
+# Flomo 发件箱：笔记先写入本地队列，由后台线程带重试地投递（首次使用时启动）
+@lazy_resource
+def get_flomo_outbox():
+    from outbox import FlomoOutbox
+    flomo_outbox = FlomoOutbox()
+    flomo_outbox.start()
+    atexit.register(flomo_outbox.close)
+    return flomo_outbox
+
+# 发件箱状态摘要
+def get_flomo_outbox_status():
+    stats = get_flomo_outbox().stats()
+    status = f"Flomo 发件箱：待发送 {stats['pending']}，已发送 {stats['sent']}，失败 {stats['failed']}"
+    last_error = get_flomo_outbox().last_error()
+    if last_error and (stats["pending"] or stats["failed"]):
+        status += f"（最近错误：{last_error}）"
+    return status
+
+# 发送笔记到Flomo（加入发件箱后立即返回）
+def send_to_flomo(note_content, session):
+    if not session.article_text:
+        return "请先加载文章内容", get_flomo_outbox_status()
+    
+    if not note_content:
+        return "笔记内容为空，未发送", get_flomo_outbox_status()
+    
+    with track_stage("send_to_flomo"):
+        try:
+            # 添加文章标题作为标签
+            title_tag = session.article_title.replace(" ", "_")
+            get_flomo_outbox().enqueue(f"{note_content}\n\n#AI阅读助手 #{title_tag}")
+            return "笔记已加入发送队列，将在后台发送到Flomo", get_flomo_outbox_status()
+        except Exception as e:
+            record_error("send_to_flomo")
+            return f"加入Flomo发送队列失败：{str(e)}", get_flomo_outbox_status()
+
+# 重试发送失败的笔记
+def retry_failed_flomo_notes():
+    count = get_flomo_outbox().retry_failed()
+    return f"已重新加入发送队列 {count} 条笔记", get_flomo_outbox_status()
+
+# 运行指标：由其他模块自己维护的计数，在导出时读取（还没创建的资源不导出，也不会因此被创建）
+def _cache_counts(points_attr, fetch_kinds):
+    counts = {}
+    if get_points_cache.created():
+        points_cache = get_points_cache()
+        counts[(points_cache.namespace,)] = getattr(points_cache, points_attr)
+    if get_fetch_cache.created():
+        counts[("fetch",)] = sum(getattr(get_fetch_cache(), kind) for kind in fetch_kinds)
+    return counts
+
+registry.callback(
+    "reading_assistant_cache_hits_total", "结果缓存命中次数",
+    lambda: _cache_counts("hits", ("hits", "revalidated")), ("cache",), metric_type="counter",
+)
+registry.callback(
+    "reading_assistant_cache_misses_total", "结果缓存未命中次数",
+    lambda: _cache_counts("misses", ("misses",)), ("cache",), metric_type="counter",
+)
+registry.callback(
+    "reading_assistant_fetch_cache_requests_total", "抓取缓存各结果的次数（revalidated 为条件请求确认未变化）",
+    lambda: {
+        (kind,): getattr(get_fetch_cache(), kind) for kind in ("hits", "revalidated", "misses", "deduplicated")
+    } if get_fetch_cache.created() else {},
+    ("result",), metric_type="counter",
+)
+registry.callback(
+    "reading_assistant_fetch_cache_bytes", "抓取缓存占用的字节数",
+    lambda: get_fetch_cache().stats()["bytes"] if get_fetch_cache.created() else {},
+)
+registry.callback(
+    "reading_assistant_library_articles", "文章库中的文章数",
+    lambda: len(get_library()) if get_library.created() else {},
+)
+registry.callback(
+    "reading_assistant_precompute_jobs", "预计算任务表中各状态的任务数",
+    lambda: {
+        (status,): count for status, count in get_precompute_scheduler().stats().items()
+    } if get_precompute_scheduler.created() else {},
+    ("status",),
+)
+registry.callback(
+    "reading_assistant_flomo_outbox_notes", "Flomo 发件箱中各状态的笔记数",
+    lambda: {
+        (status,): count for status, count in get_flomo_outbox().stats().items()
+    } if get_flomo_outbox.created() else {},
+    ("status",),
+)
+
+# 管理页上的指标摘要
+def build_metrics_report():
+    lines = ["| 阶段 | 次数 | 平均耗时 | 错误 |", "| --- | ---: | ---: | ---: |"]
+    for stage, count, average, errors in stage_summary():
+        lines.append(f"| {stage} | {count} | {average * 1000:.1f} ms | {errors} |")
+    lines += ["", "| LLM 调用 | 次数 | 平均首token | 平均总耗时 | 提示词token | 回复token |", "| --- | ---: | ---: | ---: | ---: | ---: |"]
+    by_label = {}
+    for timing in list(llm_timings):
+        stats = by_label.setdefault(timing["label"], [0, 0.0, 0.0, 0, 0])
+        stats[0] += 1
+        stats[1] += timing["ttft"]
+        stats[2] += timing["total"]
+        stats[3] += timing["prompt_tokens"]
+        stats[4] += timing["completion_tokens"]
+    for label, (count, ttft, total, prompt_tokens, completion_tokens) in sorted(by_label.items()):
+        lines.append(f"| {label} | {count} | {ttft / count:.2f} s | {total / count:.2f} s | {prompt_tokens} | {completion_tokens} |")
+    answers = llm_answer_summary()
+    if answers:
+        lines += ["", "| LLM 调用 | 回答模型 | 请求角色 | 次数 | 对冲节省 |", "| --- | --- | --- | ---: | ---: |"]
+        for label, model, role, count, saved in answers:
+            lines.append(f"| {label} | {model} | {role} | {count} | {saved:.2f} s |" if role == "hedge" else f"| {label} | {model} | {role} | {count} | |")
+    cache_stats = get_points_cache().stats()
+    lines += ["", f"要点缓存：命中 {cache_stats['hits']}，未命中 {cache_stats['misses']}，命中率 {cache_stats['hit_rate']:.0%}，条目 {cache_stats['entries']}"]
+    fetch_stats = get_fetch_cache().stats()
+    lines.append(
+        f"抓取缓存：命中 {fetch_stats['hits']}，条件请求确认未变化 {fetch_stats['revalidated']}，未命中 {fetch_stats['misses']}，"
+        f"合并的并发请求 {fetch_stats['deduplicated']}，{fetch_stats['entries']} 个页面，{fetch_stats['bytes'] / 1024 / 1024:.1f} MB"
+    )
+    lines.append("LLM 调用统计基于最近 200 次调用；完整的直方图见下方 Prometheus 文本或指标端口的 /metrics。")
+    return "\n".join(lines), registry.render()
+
+# 运行时开关采样分析器
+def toggle_profiler():
+    if profiler.running:
+        profiler.stop()
+        return "开始采样", profiler.report()
+    profiler.start()
+    return "停止采样并查看结果", "采样中……再次点击按钮停止并查看结果"
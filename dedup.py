@@ -0,0 +1,203 @@
+import os
+import re
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+# 近似重复检测的 MinHash 签名和 LSH 分桶索引，与文章清单放在一起
+DEDUP_DB = "output/dedup.sqlite"
+# 估计的 Jaccard 相似度达到该值时视为重复文章
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+# 签名长度 = 分段数 × 每段行数；16×8 时相似度约 0.7 以上的文章大概率落入同一个桶
+LSH_BANDS = 16
+LSH_ROWS = 8
+# 按字符切分的 shingle 长度（去掉空白和标点后，中英文统一处理）
+SHINGLE_SIZE = 5
+# 对账时每批写入的文章数
+RECONCILE_BATCH = 200
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _shingle_hashes(text, size=SHINGLE_SIZE):
+    """去掉空白、标点并转小写后按字符切分 shingle，返回去重后的 32 位哈希"""
+    normalized = _NON_WORD.sub("", text.lower())
+    if len(normalized) <= size:
+        shingles = {normalized} if normalized else set()
+    else:
+        shingles = {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+class DuplicateIndex:
+    """基于 MinHash/LSH 的近似重复文章检测
+
+    每篇文章计算 LSH_BANDS × LSH_ROWS 个 MinHash 值，按段取哈希写入分桶表。
+    查重时只取与新文章至少有一个桶相同的候选文章，再用签名估计相似度，
+    查询次数与文章库大小无关。签名和分桶持久化在 SQLite 中，按内容哈希增量更新。
+    """
+
+    def __init__(self, db_path=DEDUP_DB, threshold=DEDUP_THRESHOLD, bands=LSH_BANDS, rows=LSH_ROWS, seed=1):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        num_perm = bands * rows
+        # 随机哈希函数 (a·x + b) mod p，固定种子保证签名在重启后一致
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                content_hash TEXT NOT NULL,
+                signature BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                doc_id INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, bucket)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_doc ON buckets (doc_id)")
+        self._conn.commit()
+
+    def signature(self, text):
+        """计算文章的 MinHash 签名（uint64 数组）"""
+        hashes = _shingle_hashes(text)
+        if hashes.size == 0:
+            return np.zeros(self.bands * self.rows, dtype=np.uint64)
+        # a、x 都小于 2^32，乘积不会溢出 uint64
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            keys.append((band, int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "big", signed=True)))
+        return keys
+
+    def _write(self, path, content_hash, signature):
+        self._delete(path)
+        doc_id = self._conn.execute(
+            "INSERT INTO signatures (path, content_hash, signature) VALUES (?, ?, ?)",
+            (path, content_hash, signature.tobytes()),
+        ).lastrowid
+        self._conn.executemany(
+            "INSERT INTO buckets (band, bucket, doc_id) VALUES (?, ?, ?)",
+            [(band, bucket, doc_id) for band, bucket in self._band_keys(signature)],
+        )
+
+    def _delete(self, path):
+        row = self._conn.execute("SELECT id FROM signatures WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return False
+        self._conn.execute("DELETE FROM buckets WHERE doc_id = ?", (row[0],))
+        self._conn.execute("DELETE FROM signatures WHERE id = ?", (row[0],))
+        return True
+
+    def add(self, path, text, content_hash):
+        """写入或更新一篇文章的签名"""
+        signature = self.signature(text)
+        with self._lock:
+            self._write(path, content_hash, signature)
+            self._conn.commit()
+
+    def remove(self, path):
+        with self._lock:
+            if self._delete(path):
+                self._conn.commit()
+
+    def find_duplicates(self, text, limit=5, exclude_path=None):
+        """返回与 text 近似重复的已保存文章 [{"path", "similarity"}, ...]，按相似度降序"""
+        signature = self.signature(text)
+        keys = self._band_keys(signature)
+        with self._lock:
+            candidates = {}
+            for band, bucket in keys:
+                for doc_id, path, blob in self._conn.execute(
+                    """
+                    SELECT s.id, s.path, s.signature FROM buckets b JOIN signatures s ON s.id = b.doc_id
+                    WHERE b.band = ? AND b.bucket = ?
+                    """,
+                    (band, bucket),
+                ):
+                    candidates[doc_id] = (path, blob)
+        matches = []
+        for path, blob in candidates.values():
+            if path == exclude_path:
+                continue
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == signature))
+            if similarity >= self.threshold:
+                matches.append({"path": path, "similarity": similarity})
+        matches.sort(key=lambda m: m["similarity"], reverse=True)
+        return matches[:limit]
+
+    def reconcile(self, articles, is_live=None):
+        """与文章清单对账：articles 为带 path/content_hash 的条目，只为哈希变化的文章重算签名
+
+        签名在锁外计算、分批写入，后台对账时不会长时间阻塞查重。
+        articles 是调用前取的快照，之后新保存的文章不在其中；is_live(path) 不为空时，
+        删除签名前再向文章库确认文章确实已不存在，避免误删对账期间刚保存的文章。
+        """
+        with self._lock:
+            known = dict(self._conn.execute("SELECT path, content_hash FROM signatures"))
+        current = set()
+        pending = []
+        changed = 0
+        for article in articles:
+            path = article["path"]
+            current.add(path)
+            if known.get(path) == article["content_hash"]:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"计算文章签名 {path} 失败: {str(e)}")
+                continue
+            pending.append((path, article["content_hash"], self.signature(text)))
+            if len(pending) >= RECONCILE_BATCH:
+                changed += self._write_batch(pending)
+                pending = []
+        changed += self._write_batch(pending)
+        with self._lock:
+            removed = [
+                path for path in known if path not in current and (is_live is None or not is_live(path))
+            ]
+            for path in removed:
+                self._delete(path)
+            if removed:
+                self._conn.commit()
+        return changed, len(removed)
+
+    def _write_batch(self, entries):
+        if not entries:
+            return 0
+        with self._lock:
+            for path, content_hash, signature in entries:
+                self._write(path, content_hash, signature)
+            self._conn.commit()
+        return len(entries)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
@@ -0,0 +1,122 @@
+import os
+import json
+import uuid
+import atexit
+import threading
+import subprocess
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "worker.js")
+# 单篇文章提取的超时时间（秒），与 Puppeteer 的导航超时保持一致并留出余量
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "240"))
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class ExtractionWorker:
+    """常驻的 Node 提取进程（src/worker.js）的客户端
+
+    通过 stdin/stdout 逐行收发 JSON-RPC 消息，每个请求带唯一 id，
+    多个线程可以同时提交请求，响应按 id 分发，互不干扰。进程意外退出时在下次请求时自动重启；
+    每个进程各自记录发给它的请求，进程退出时只让这些请求失败，不影响已发给新进程的请求。
+    """
+
+    def __init__(self, script=WORKER_SCRIPT, node="node"):
+        self.script = script
+        self.node = node
+        self._proc = None
+        # 当前进程的未完成请求 {id: Future}，重启时换成新的字典
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        """返回 (进程, 该进程的未完成请求字典)，进程不存在或已退出时启动新进程"""
+        if self._proc is not None and self._proc.poll() is None:
+            return self._proc, self._pending
+        self._pending = {}
+        self._proc = subprocess.Popen(
+            [self.node, self.script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        threading.Thread(target=self._read_responses, args=(self._proc, self._pending), daemon=True).start()
+        return self._proc, self._pending
+
+    def _read_responses(self, proc, pending):
+        for line in proc.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            with self._lock:
+                future = pending.pop(message.get("id"), None)
+            if future is None:
+                continue
+            if "error" in message:
+                future.set_exception(ExtractionError(message["error"].get("message", "未知错误")))
+            else:
+                future.set_result(message.get("result"))
+
+        # 进程已退出，让发给这个进程的未完成请求失败
+        with self._lock:
+            failed = list(pending.values())
+            pending.clear()
+        for future in failed:
+            future.set_exception(ExtractionError("提取进程意外退出"))
+
+    def call(self, method, params=None, timeout=EXTRACT_TIMEOUT):
+        request_id = uuid.uuid4().hex
+        future = Future()
+        with self._lock:
+            proc, pending = self._ensure_started()
+            pending[request_id] = future
+            try:
+                proc.stdin.write(json.dumps({"id": request_id, "method": method, "params": params or {}}) + "\n")
+                proc.stdin.flush()
+            except OSError as e:
+                pending.pop(request_id, None)
+                raise ExtractionError(f"无法连接提取进程：{str(e)}")
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                pending.pop(request_id, None)
+            raise ExtractionError(f"提取超时（{timeout:.0f} 秒）")
+
+    def extract(self, url, timeout=EXTRACT_TIMEOUT, etag=None, last_modified=None):
+        """提取文章，返回 {"text": 文章文本, "filePath": 保存的 .txt 路径, "timings": 各步骤耗时（毫秒）,
+        "html": 原始 HTML, "etag": ..., "lastModified": ...}
+
+        传入 etag / last_modified 时先发条件请求，页面未变化则只返回 {"notModified": True, "timings": ...}
+        """
+        params = {"url": url}
+        if etag:
+            params["etag"] = etag
+        if last_modified:
+            params["lastModified"] = last_modified
+        return self.call("extract", params, timeout=timeout)
+
+    def stats(self):
+        """各抓取方式（static / wechat / browser）胜出的次数，以及升级到浏览器、失败的次数"""
+        return self.call("stats", timeout=10)
+
+    def close(self):
+        with self._lock:
+            proc = self._proc
+            self._proc = None
+        if proc is None or proc.poll() is not None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=10)
+        except Exception:
+            proc.kill()
+
+
+extraction_worker = ExtractionWorker()
+atexit.register(extraction_worker.close)
@@ -0,0 +1,178 @@
+import os
+import time
+import zlib
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+from ingest import normalize_url
+
+# 按链接缓存的网页抓取结果：原始 HTML、提取的正文和缓存校验头
+FETCH_CACHE_DB = "output/fetch_cache.sqlite"
+# 缓存有效期（小时），期内再次打开同一链接不访问网络；过期后发条件请求校验
+FETCH_CACHE_TTL_HOURS = float(os.getenv("FETCH_CACHE_TTL_HOURS", "24"))
+# 缓存总大小上限（MB），超出后按最近访问时间淘汰
+FETCH_CACHE_MAX_MB = float(os.getenv("FETCH_CACHE_MAX_MB", "500"))
+
+
+class FetchCache:
+    """以规范化链接为键的抓取缓存
+
+    extract_fn(url, etag=..., last_modified=...) 为实际的提取函数（常驻提取进程），返回
+    {"text", "filePath", "html", "etag", "lastModified", "timings"}，页面未变化时返回 {"notModified": True}。
+    同一链接的并发请求共享一次提取。
+    """
+
+    def __init__(self, extract_fn, db_path=FETCH_CACHE_DB, ttl=FETCH_CACHE_TTL_HOURS * 3600,
+                 max_bytes=int(FETCH_CACHE_MAX_MB * 1024 * 1024)):
+        self.extract_fn = extract_fn
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                html BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                file_name TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                validated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_accessed ON pages (accessed_at)")
+        self._conn.commit()
+
+    def _get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, etag, last_modified, file_name, validated_at FROM pages WHERE url = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        text, etag, last_modified, file_name, validated_at = row
+        return {"text": text, "etag": etag, "last_modified": last_modified,
+                "file_name": file_name, "validated_at": validated_at}
+
+    def get_html(self, url):
+        """返回缓存的原始 HTML（没有时返回 None）"""
+        with self._lock:
+            row = self._conn.execute("SELECT html FROM pages WHERE url = ?", (normalize_url(url),)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def _touch(self, key, validated=False):
+        now = time.time()
+        with self._lock:
+            if validated:
+                self._conn.execute("UPDATE pages SET accessed_at = ?, validated_at = ? WHERE url = ?", (now, now, key))
+            else:
+                self._conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, key))
+            self._conn.commit()
+
+    def _put(self, key, result):
+        text = result["text"]
+        html = zlib.compress(result["html"].encode("utf-8")) if result.get("html") else None
+        size = len(text.encode("utf-8")) + (len(html) if html else 0)
+        file_name = os.path.basename(result["filePath"]) if result.get("filePath") else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO pages (url, text, html, etag, last_modified, file_name, size, fetched_at, validated_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    text = excluded.text, html = excluded.html, etag = excluded.etag,
+                    last_modified = excluded.last_modified, file_name = excluded.file_name, size = excluded.size,
+                    fetched_at = excluded.fetched_at, validated_at = excluded.validated_at, accessed_at = excluded.accessed_at
+                """,
+                (key, text, html, result.get("etag"), result.get("lastModified"), file_name, size, now, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 从最久未访问的页面开始淘汰，直到总大小回到上限以内
+        for url, size in self._conn.execute("SELECT url, size FROM pages ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total -= size
+
+    def _fetch(self, key, url):
+        cached = self._get(key)
+        if cached is not None and time.time() - cached["validated_at"] < self.ttl:
+            self.hits += 1
+            self._touch(key)
+            return {"text": cached["text"], "file_name": cached["file_name"], "cache": "hit"}
+
+        if cached is not None and (cached["etag"] or cached["last_modified"]):
+            try:
+                result = self.extract_fn(url, etag=cached["etag"], last_modified=cached["last_modified"])
+            except Exception as e:
+                # 校验失败时先用旧内容，下次再试
+                print(f"校验缓存的页面失败，使用缓存内容 ({url}): {str(e)}")
+                self.hits += 1
+                self._touch(key)
+                return {"text": cached["text"], "file_name": cached["file_name"], "cache": "stale"}
+            if result.get("notModified"):
+                self.revalidated += 1
+                self._touch(key, validated=True)
+                return {"text": cached["text"], "file_name": cached["file_name"], "cache": "revalidated",
+                        "timings": result.get("timings")}
+        else:
+            result = self.extract_fn(url)
+
+        self.misses += 1
+        self._put(key, result)
+        return {"text": result["text"], "file_name": os.path.basename(result["filePath"]), "cache": "miss",
+                "timings": result.get("timings")}
+
+    def extract(self, url):
+        """返回 {"text", "file_name", "cache": hit / stale / revalidated / miss, "timings"}"""
+        key = normalize_url(url)
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            # 同一链接正在提取中，等待并共享结果
+            self.deduplicated += 1
+            return dict(future.result())
+        try:
+            result = self._fetch(key, url)
+            future.set_result(result)
+            return dict(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses,
+                "deduplicated": self.deduplicated, "entries": entries, "bytes": size}
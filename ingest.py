@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# 批量导入的进度日志，每行一条 JSON 记录，中断后重新运行会跳过已成功的链接
+INGEST_LOG = "output/ingest_log.jsonl"
+
+
+def normalize_url(url):
+    """去掉首尾空白和锚点，统一协议与域名的大小写，用于去重"""
+    url = url.strip()
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+
+def read_url_list(source):
+    """从文件（"-" 表示标准输入）或多行文本中读取链接，忽略空行和 # 开头的注释，保持顺序去重"""
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    elif "\n" not in source and os.path.isfile(source):
+        with open(source, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    else:
+        lines = source.splitlines()
+
+    urls = []
+    seen = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        url = normalize_url(line)
+        if url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+class IngestLog:
+    """追加写入的导入日志，记录每个链接最近一次的处理结果"""
+
+    def __init__(self, path=INGEST_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+        self._latest = {}
+        log_dir = os.path.dirname(path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._latest[record.get("url")] = record
+
+    def is_done(self, url):
+        record = self._latest.get(url)
+        return record is not None and record.get("status") in ("ok", "duplicate")
+
+    def append(self, record):
+        record.setdefault("time", datetime.now().isoformat(timespec="seconds"))
+        with self._lock:
+            self._latest[record["url"]] = record
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class BatchIngestor:
+    """批量导入流水线：提取 -> 要点分析 -> 保存
+
+    提取和 LLM 调用分别使用独立的线程池限制并发，提取完成的文章立即进入分析阶段。
+    extract_fn(url) -> (文本, 错误信息)；analyze_fn(文本) -> (要点, 错误信息)；
+    save_fn(文本, 标题, url, replace_path) -> (保存路径, 错误信息)，replace_path 不为空时覆盖该文章；
+    title_fn(文本) -> 标题；is_known_fn(url) -> 该链接是否已在文章库中；
+    find_duplicate_fn(文本) -> 近似重复的已有文章路径或 None；link_fn(已有文章路径, url) 关联来源链接。
+    on_duplicate 为 link 时重复的文章在分析前就关联到已有文章并跳过，replace 时替换已有文章，keep 时仍然另存。
+    """
+
+    def __init__(self, extract_fn, analyze_fn, save_fn, title_fn, is_known_fn=None,
+                 find_duplicate_fn=None, link_fn=None, on_duplicate="link",
+                 fetch_concurrency=4, llm_concurrency=2, log_path=INGEST_LOG):
+        self.extract_fn = extract_fn
+        self.analyze_fn = analyze_fn
+        self.save_fn = save_fn
+        self.title_fn = title_fn
+        self.is_known_fn = is_known_fn
+        self.find_duplicate_fn = find_duplicate_fn
+        self.link_fn = link_fn
+        self.on_duplicate = on_duplicate
+        self.fetch_concurrency = max(1, int(fetch_concurrency))
+        self.llm_concurrency = max(1, int(llm_concurrency))
+        self.log = IngestLog(log_path)
+
+    def run(self, urls, progress=print):
+        """处理一批链接，返回统计信息；progress 用于接收每条进度消息"""
+        start = time.perf_counter()
+        stats = {"total": len(urls), "succeeded": 0, "failed": 0, "skipped": 0, "duplicates": 0}
+        stats_lock = threading.Lock()
+
+        def finish(url, status, **fields):
+            self.log.append({"url": url, "status": status, **fields})
+            with stats_lock:
+                stats[{"ok": "succeeded", "duplicate": "duplicates"}.get(status, "failed")] += 1
+                done = stats["succeeded"] + stats["failed"] + stats["skipped"] + stats["duplicates"]
+            if status == "ok":
+                progress(f"[{done}/{stats['total']}] 已导入 {url} -> {fields.get('path')}")
+            elif status == "duplicate":
+                progress(f"[{done}/{stats['total']}] 与已有文章重复，已关联 {url} -> {fields.get('path')}")
+            else:
+                progress(f"[{done}/{stats['total']}] 导入失败 {url}（{fields.get('stage')}）：{fields.get('error')}")
+
+        def analyze_and_save(url, article_text):
+            try:
+                title = self.title_fn(article_text)
+                duplicate = None
+                if self.find_duplicate_fn and self.on_duplicate != "keep":
+                    duplicate = self.find_duplicate_fn(article_text)
+                if duplicate and self.on_duplicate == "link":
+                    # 重复的文章不再分析和保存，只把链接关联到已有文章
+                    if self.link_fn:
+                        self.link_fn(duplicate, url)
+                    finish(url, "duplicate", path=duplicate, title=title)
+                    return
+                _, error = self.analyze_fn(article_text)
+                if error:
+                    finish(url, "failed", stage="analyze", error=error)
+                    return
+                path, error = self.save_fn(article_text, title, url, duplicate)
+                if error:
+                    finish(url, "failed", stage="save", error=error)
+                    return
+                finish(url, "ok", path=path, title=title)
+            except Exception as e:
+                finish(url, "failed", stage="analyze", error=str(e))
+
+        pending = []
+        for url in urls:
+            if self.log.is_done(url) or (self.is_known_fn and self.is_known_fn(url)):
+                stats["skipped"] += 1
+                continue
+            pending.append(url)
+        if stats["skipped"]:
+            progress(f"跳过 {stats['skipped']} 个已导入的链接")
+
+        with ThreadPoolExecutor(max_workers=self.llm_concurrency) as llm_pool:
+            llm_futures = []
+            llm_futures_lock = threading.Lock()
+
+            def fetch(url):
+                try:
+                    article_text, error = self.extract_fn(url)
+                except Exception as e:
+                    article_text, error = None, str(e)
+                if article_text is None:
+                    finish(url, "failed", stage="extract", error=error)
+                    return
+                # 提取完成后立即交给分析线程池，不等待整批提取结束
+                with llm_futures_lock:
+                    llm_futures.append(llm_pool.submit(analyze_and_save, url, article_text))
+
+            with ThreadPoolExecutor(max_workers=self.fetch_concurrency) as fetch_pool:
+                list(fetch_pool.map(fetch, pending))
+            for future in llm_futures:
+                future.result()
+
+        elapsed = time.perf_counter() - start
+        stats["elapsed"] = elapsed
+        stats["articles_per_min"] = stats["succeeded"] / elapsed * 60 if elapsed > 0 else 0.0
+        progress(
+            f"导入完成：成功 {stats['succeeded']}，失败 {stats['failed']}，跳过 {stats['skipped']}，重复 {stats['duplicates']}，"
+            f"耗时 {elapsed:.1f}s，吞吐 {stats['articles_per_min']:.1f} 篇/分钟"
+        )
+        return stats
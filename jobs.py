@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+
+# 后台预计算任务表，与文章清单放在一起
+JOBS_DB = "output/jobs.sqlite"
+# 每篇文章最多尝试的次数，超过后标记为失败，下次启动时不再重试
+JOB_MAX_ATTEMPTS = 3
+# 失败后重试的退避时长（秒）：按尝试次数指数增长，带随机抖动
+JOB_BACKOFF_BASE = 30.0
+JOB_BACKOFF_MAX = 3600.0
+
+
+class JobScheduler:
+    """持久化的后台任务队列：每篇文章一行，按内容哈希判断结果是否仍然有效
+
+    handler(path, content_hash) -> (结果字典, 错误信息)，由 workers 个后台线程调用，
+    同一时刻最多有 workers 个任务在运行（也就是后台占用的 LLM 并发数）。
+    优先级高的先做（调用方传入文章的修改时间，越新越先）；结果以 JSON 存在任务表中，
+    重启后依然有效。文章内容变化后重新排队，旧内容的结果在写回时丢弃。
+    任务失败时在调度器内按指数退避重新排队，达到 max_attempts 次后标记为失败。
+    """
+
+    def __init__(self, handler, db_path=JOBS_DB, workers=1, max_attempts=JOB_MAX_ATTEMPTS):
+        self.handler = handler
+        self.db_path = db_path
+        self.workers = max(0, int(workers))
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._running = 0
+        self._stopped = False
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                path TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                priority REAL NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                updated_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "next_attempt_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (status, priority)")
+        # 上次退出时还在运行的任务重新排队
+        self._conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+        self._conn.commit()
+
+    def _upsert(self, path, content_hash, priority, now):
+        # 同一内容已完成、已排队或已放弃的任务保持不变；内容变化时重置为待处理
+        cursor = self._conn.execute(
+            """
+            INSERT INTO jobs (path, content_hash, priority, status, attempts, updated_at)
+            VALUES (?, ?, ?, 'pending', 0, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                priority = excluded.priority,
+                status = 'pending',
+                attempts = 0,
+                error = NULL,
+                result = NULL,
+                updated_at = excluded.updated_at,
+                next_attempt_at = 0
+            WHERE jobs.content_hash != excluded.content_hash
+            """,
+            (path, content_hash, priority, now),
+        )
+        return cursor.rowcount > 0
+
+    def enqueue(self, path, content_hash, priority=None):
+        """为一篇文章排队，返回是否新增了任务（相同内容的任务已存在时不重复排队）"""
+        with self._wakeup:
+            added = self._upsert(path, content_hash, time.time() if priority is None else priority, time.time())
+            self._conn.commit()
+            if added:
+                self._wakeup.notify()
+        return added
+
+    def sync(self, articles, limit=None):
+        """与文章清单对账：articles 为带 path/content_hash/mtime 的条目
+
+        删除已不存在的文章的任务，为新文章和内容变化的文章排队（limit 不为空时只排最近的 limit 篇），
+        失败次数未达上限的任务重新排队。返回 (新增的任务数, 删除的任务数)。
+        """
+        now = time.time()
+        with self._wakeup:
+            current = {article["path"] for article in articles}
+            removed = [
+                (path,) for (path,) in self._conn.execute("SELECT path FROM jobs") if path not in current
+            ]
+            self._conn.executemany("DELETE FROM jobs WHERE path = ?", removed)
+            added = 0
+            for article in sorted(articles, key=lambda a: a["mtime"], reverse=True):
+                if limit is not None and added >= limit:
+                    break
+                added += self._upsert(article["path"], article["content_hash"], article["mtime"], now)
+            # 旧版本留下的、失败次数未达上限的任务重新排队
+            self._conn.execute(
+                "UPDATE jobs SET status = 'pending', next_attempt_at = 0 WHERE status = 'failed' AND attempts < ?",
+                (self.max_attempts,),
+            )
+            self._conn.commit()
+            self._wakeup.notify_all()
+        return added, len(removed)
+
+    def result(self, path, content_hash):
+        """已完成且内容未变化的任务结果，没有时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM jobs WHERE path = ? AND content_hash = ? AND status = 'done'", (path, content_hash)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def remove(self, path):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def _claim(self):
+        row = self._conn.execute(
+            """
+            SELECT path, content_hash FROM jobs WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY priority DESC LIMIT 1
+            """,
+            (time.time(),),
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE jobs SET status = 'running', updated_at = ? WHERE path = ?", (time.time(), row[0])
+        )
+        self._conn.commit()
+        return row
+
+    def _next_due_in(self):
+        # 下一个退避中的任务还要等多久；没有时返回 None（一直等到有新任务）
+        row = self._conn.execute("SELECT MIN(next_attempt_at) FROM jobs WHERE status = 'pending'").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _finish(self, path, content_hash, result, error):
+        # 只写回与当前内容哈希一致的结果；运行期间文章被重新保存时，任务已重置为待处理
+        with self._wakeup:
+            if error is None:
+                self._conn.execute(
+                    """
+                    UPDATE jobs SET status = 'done', result = ?, error = NULL, attempts = attempts + 1, updated_at = ?
+                    WHERE path = ? AND content_hash = ? AND status = 'running'
+                    """,
+                    (json.dumps(result, ensure_ascii=False), time.time(), path, content_hash),
+                )
+            else:
+                row = self._conn.execute(
+                    "SELECT attempts FROM jobs WHERE path = ? AND content_hash = ? AND status = 'running'",
+                    (path, content_hash),
+                ).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                if attempts < self.max_attempts:
+                    delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * (2 ** (attempts - 1))) * random.uniform(0.5, 1.5)
+                    status, next_attempt_at = "pending", time.time() + delay
+                else:
+                    print(f"[预计算] {path} 已失败 {attempts} 次，不再重试")
+                    status, next_attempt_at = "failed", 0
+                self._conn.execute(
+                    """
+                    UPDATE jobs SET status = ?, error = ?, attempts = ?, next_attempt_at = ?, updated_at = ?
+                    WHERE path = ? AND content_hash = ? AND status = 'running'
+                    """,
+                    (status, error, attempts, next_attempt_at, time.time(), path, content_hash),
+                )
+            self._conn.commit()
+            self._running -= 1
+            self._wakeup.notify_all()
+
+    def _work(self):
+        while True:
+            with self._wakeup:
+                job = None
+                while not self._stopped:
+                    job = self._claim()
+                    if job is not None:
+                        break
+                    # 没有到期的任务时，睡到下一个退避中的任务到期或有新任务加入
+                    self._wakeup.wait(self._next_due_in())
+                if job is None:
+                    return
+                self._running += 1
+            path, content_hash = job
+            try:
+                result, error = self.handler(path, content_hash)
+            except Exception as e:
+                result, error = None, f"{type(e).__name__}: {str(e)}"
+            if error:
+                print(f"[预计算] {path} 失败: {error}")
+            self._finish(path, content_hash, result, error)
+
+    def start(self):
+        """启动后台线程（重复调用只启动一次）"""
+        with self._lock:
+            if self._threads or self.workers == 0:
+                return
+            self._stopped = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"precompute-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """等待队列中没有待处理和运行中的任务，返回是否在超时前完成（后台线程未启动时不等待）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._wakeup:
+            while self._running or self._conn.execute(
+                "SELECT 1 FROM jobs WHERE status = 'pending' LIMIT 1"
+            ).fetchone():
+                if not self._threads or self._stopped:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wakeup.wait(remaining)
+        return True
+
+    def stats(self):
+        """各状态的任务数"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
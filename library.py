@@ -0,0 +1,241 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+# 已保存文章所在目录，以及持久化的文章清单（manifest）
+LIBRARY_DIR = "output/formatted"
+LIBRARY_DB = "output/library.sqlite"
+
+
+def _content_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _title_from_text(text, title_fn):
+    # 与原 get_saved_articles 一致：优先取第一行，第一行为空时取前1000个字符
+    first_line = text.split("\n", 1)[0].strip()
+    if first_line:
+        return title_fn(first_line)
+    return title_fn(text[:1000])
+
+
+class ArticleLibrary:
+    """已保存文章的持久化清单
+
+    清单保存在 SQLite 中，记录标题、路径、大小、修改时间、内容哈希和创建时间。
+    启动时按 (size, mtime) 与磁盘对账，只重新读取发生变化的文件；保存文章时增量更新。
+    列表、排序结果常驻内存，按 id/路径查找都是 O(1)，界面按页取用。
+    """
+
+    def __init__(self, library_dir=LIBRARY_DIR, db_path=LIBRARY_DB, title_fn=None):
+        self.library_dir = library_dir
+        self.db_path = db_path
+        self.title_fn = title_fn or (lambda text: text.strip()[:50] or "无标题文章")
+        self._lock = threading.RLock()
+        self._articles = []
+        self._by_path = {}
+        self._by_id = {}
+
+        os.makedirs(library_dir, exist_ok=True)
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                source_url TEXT
+            )
+            """
+        )
+        # 兼容早期版本的清单：补充来源链接列
+        columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(articles)")]
+        if "source_url" not in columns:
+            self._conn.execute("ALTER TABLE articles ADD COLUMN source_url TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_source_url ON articles (source_url)")
+        # 内容与已有文章重复、关联到该文章的其他来源链接
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS source_links (
+                source_url TEXT PRIMARY KEY,
+                path TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._reload()
+
+    # 从数据库重建内存中的排序列表（写时复制，已返回给调用方的列表不受影响）
+    def _reload(self):
+        rows = self._conn.execute("SELECT * FROM articles").fetchall()
+        articles = [self._row_to_article(row) for row in rows]
+        self._publish(articles)
+
+    def _publish(self, articles):
+        # 按文件名（通常包含日期）降序排序，最新的在前面
+        articles.sort(key=lambda a: os.path.basename(a["path"]), reverse=True)
+        self._articles = articles
+        self._by_path = {a["path"]: a for a in articles}
+        self._by_id = {a["id"]: a for a in articles}
+
+    @staticmethod
+    def _row_to_article(row):
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "path": row["path"],
+            "size": row["size"],
+            "mtime": row["mtime_ns"] / 1e9,
+            "content_hash": row["content_hash"],
+            "created_at": row["created_at"],
+            "source_url": row["source_url"],
+        }
+
+    def _read_entry(self, path, content=None):
+        if content is None:
+            with open(path, "rb") as f:
+                data = f.read()
+            content_hash = _content_hash(data)
+            try:
+                title = _title_from_text(data.decode("utf-8"), self.title_fn)
+            except UnicodeDecodeError:
+                title = os.path.basename(path)
+        else:
+            content_hash = _content_hash(content)
+            title = _title_from_text(content, self.title_fn)
+        return title, content_hash
+
+    def _upsert(self, path, st, title, content_hash, created_at, source_url=None):
+        self._conn.execute(
+            """
+            INSERT INTO articles (path, title, size, mtime_ns, content_hash, created_at, source_url)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                title = excluded.title,
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                content_hash = excluded.content_hash,
+                source_url = COALESCE(excluded.source_url, articles.source_url)
+            """,
+            (path, title, st.st_size, st.st_mtime_ns, content_hash, created_at, source_url),
+        )
+
+    def reconcile(self):
+        """按 mtime/size 与磁盘对账，返回 (新增或更新数, 删除数)"""
+        with self._lock:
+            known = {
+                row["path"]: (row["size"], row["mtime_ns"])
+                for row in self._conn.execute("SELECT path, size, mtime_ns FROM articles")
+            }
+            seen = set()
+            changed = 0
+            with os.scandir(self.library_dir) as it:
+                for entry in it:
+                    if entry.name.startswith(".") or not entry.name.endswith(".md") or not entry.is_file():
+                        continue
+                    path = os.path.join(self.library_dir, entry.name)
+                    seen.add(path)
+                    st = entry.stat()
+                    if known.get(path) == (st.st_size, st.st_mtime_ns):
+                        continue
+                    try:
+                        title, content_hash = self._read_entry(path)
+                    except OSError as e:
+                        print(f"读取文章 {path} 时出错: {str(e)}")
+                        continue
+                    created_at = datetime.fromtimestamp(st.st_mtime).isoformat(timespec="seconds")
+                    self._upsert(path, st, title, content_hash, created_at)
+                    changed += 1
+
+            removed = [path for path in known if path not in seen]
+            if removed:
+                self._conn.executemany("DELETE FROM articles WHERE path = ?", [(p,) for p in removed])
+            if changed or removed:
+                self._conn.commit()
+                self._reload()
+            return changed, len(removed)
+
+    def record(self, path, content=None, source_url=None):
+        """保存文章后增量登记到清单中，返回清单条目"""
+        with self._lock:
+            st = os.stat(path)
+            title, content_hash = self._read_entry(path, content)
+            created_at = datetime.now().isoformat(timespec="seconds")
+            self._upsert(path, st, title, content_hash, created_at, source_url)
+            self._conn.commit()
+            row = self._conn.execute("SELECT * FROM articles WHERE path = ?", (path,)).fetchone()
+            article = self._row_to_article(row)
+            articles = [a for a in self._articles if a["path"] != path]
+            articles.append(article)
+            self._publish(articles)
+            return article
+
+    def remove(self, path):
+        with self._lock:
+            self._conn.execute("DELETE FROM articles WHERE path = ?", (path,))
+            self._conn.commit()
+            if path in self._by_path:
+                self._publish([a for a in self._articles if a["path"] != path])
+
+    def list_articles(self):
+        """返回按时间降序排列的文章列表（只读，勿修改）"""
+        return self._articles
+
+    def page(self, page=0, page_size=50, title_filter=""):
+        """按时间降序分页，title_filter 按标题子串筛选（不区分大小写）
+
+        返回 (本页文章, 实际页码, 符合条件的文章数)；页码超出范围时取最后一页。
+        """
+        articles = self._articles
+        needle = (title_filter or "").strip().lower()
+        if needle:
+            articles = [a for a in articles if needle in a["title"].lower()]
+        total = len(articles)
+        last_page = max(0, (total - 1) // page_size)
+        page = min(max(0, page), last_page)
+        return articles[page * page_size:(page + 1) * page_size], page, total
+
+    def get_by_path(self, path):
+        return self._by_path.get(path)
+
+    def get_by_id(self, article_id):
+        return self._by_id.get(article_id)
+
+    def has_source_url(self, url):
+        """是否已有来自该链接的文章（包括关联到已有文章的链接）"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM articles WHERE source_url = ? LIMIT 1", (url,)).fetchone()
+            if row is None:
+                row = self._conn.execute("SELECT 1 FROM source_links WHERE source_url = ?", (url,)).fetchone()
+        return row is not None
+
+    def link_source(self, path, url):
+        """把重复内容的来源链接关联到已有文章：文章还没有来源时直接记为它的来源"""
+        with self._lock:
+            article = self._by_path.get(path)
+            if article is None or not url or article["source_url"] == url:
+                return
+            if article["source_url"] is None:
+                self._conn.execute("UPDATE articles SET source_url = ? WHERE path = ?", (url, path))
+                self._publish([dict(a, source_url=url) if a["path"] == path else a for a in self._articles])
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO source_links (source_url, path) VALUES (?, ?)", (url, path)
+                )
+            self._conn.commit()
+
+    def __len__(self):
+        return len(self._articles)
@@ -0,0 +1,404 @@
+import os
+import time
+import queue
+import random
+import threading
+from collections import deque
+
+from budget import token_counter
+from metrics import record_llm_answer, record_llm_deadline, record_hedge_saving
+
+# 共享的LLM客户端层：进程内复用连接池，统一重试、退避、限流和超时
+LLM_API_BASE = os.getenv("LLM_API_BASE", "https://ark.cn-beijing.volces.com/api/v3")
+# 单次请求超时（秒）
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+# 遇到 429/5xx/网络错误时的最大重试次数
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# 退避的基础时长和上限（秒），实际等待时间带随机抖动
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# 客户端限流：每分钟请求数、每分钟token数（0 表示不限制）
+LLM_RPM = float(os.getenv("LLM_RPM", "60"))
+LLM_TPM = float(os.getenv("LLM_TPM", "300000"))
+# 连接池大小
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# 流式调用的截止时间（秒）：在此时间内没有收到首个分块即放弃
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+# 非流式调用的截止时间（秒）：要等完整回复，长文章的分段概括等正常调用也可能需要几十秒，因此单独设置且更长
+LLM_COMPLETION_DEADLINE = float(os.getenv("LLM_COMPLETION_DEADLINE", "300"))
+# 对冲请求的延迟：auto 为同类调用最近耗时的 p95，也可以填固定秒数，off 关闭对冲（仍保留失败切换和截止时间）
+LLM_HEDGE_DELAY = os.getenv("LLM_HEDGE_DELAY", "auto")
+# auto 模式下样本不足时使用的延迟，以及 p95 的下限（秒）
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "10"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+# 计算 p95 的滑动窗口大小和最少样本数
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+# 备用模型（推理接入点），按顺序尝试，逗号分隔；写成 模型@接口地址 可以指向其他接口
+LLM_FALLBACK_MODELS = os.getenv("LLM_FALLBACK_MODELS", "")
+
+
+class TokenBucket:
+    """令牌桶限流器，按每分钟的速率匀速补充，桶容量为一分钟的配额"""
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self._tokens = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """阻塞直到取得 amount 个令牌，返回等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+_request_bucket = TokenBucket(LLM_RPM)
+_token_bucket = TokenBucket(LLM_TPM)
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def _is_retryable(exc):
+    try:
+        import openai
+        if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+            return True
+    except ImportError:
+        pass
+    try:
+        import httpx
+        if isinstance(exc, (httpx.TimeoutException, httpx.NetworkError)):
+            return True
+    except ImportError:
+        pass
+    status = _status_code(exc)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _retry_delay(exc, attempt):
+    # 服务端给出 Retry-After 时优先遵循
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.5)
+
+
+class ResilientLLM:
+    """包装 ChatOpenAI：调用前经过令牌桶限流，失败时按抖动的指数退避重试
+
+    对外提供与 ChatOpenAI 相同的 invoke(messages) 和 stream(messages)。
+    流式调用只在收到第一个分块之前重试，已输出内容后出错直接抛出。
+    """
+
+    def __init__(self, llm, max_retries=LLM_MAX_RETRIES):
+        self._llm = llm
+        self.max_retries = max_retries
+        self.model_name = getattr(llm, "model_name", "")
+
+    def _throttle(self, messages):
+        _request_bucket.acquire(1)
+        _token_bucket.acquire(token_counter.count_messages(messages))
+
+    def _call_kwargs(self, timeout):
+        return {"timeout": timeout} if timeout else {}
+
+    def invoke(self, messages, timeout=None):
+        attempt = 0
+        while True:
+            self._throttle(messages)
+            try:
+                return self._llm.invoke(messages, **self._call_kwargs(timeout))
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"[LLM] 调用失败（{type(e).__name__}: {str(e)[:100]}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+                attempt += 1
+
+    def stream(self, messages, timeout=None):
+        attempt = 0
+        while True:
+            self._throttle(messages)
+            started = False
+            try:
+                for chunk in self._llm.stream(messages, **self._call_kwargs(timeout)):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"[LLM] 流式调用失败（{type(e).__name__}: {str(e)[:100]}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+                attempt += 1
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """在截止时间内没有任何模型给出回复"""
+
+
+class HedgedLLM:
+    """在多个 ResilientLLM 之上控制尾延迟：截止时间、对冲请求和按顺序的备用模型
+
+    首个请求发给第一个模型；超过对冲延迟仍没有结果（流式为首个分块）时，再向下一个模型
+    （只有一个模型时向同一个模型）发出一份相同的请求，先返回的胜出，其余请求在下一次返回时关闭并丢弃。
+    某个请求失败时立即改用下一个模型。截止时间内都没有结果时抛出 LLMDeadlineExceeded：
+    流式调用为 deadline（等到首个分块），非流式调用为 completion_deadline（等到完整回复）。
+    非流式请求无法中途取消，落败的请求会在底层超时内自行结束；为避免对正常的长回复也发出对冲，
+    非流式调用在积累到足够的耗时样本之前不对冲。
+
+    invoke / stream 与 ResilientLLM 相同，另外接受 label（用于统计）和 call_info：
+    传入的字典会填上回答的模型、角色（primary / hedge / fallback）和发出的请求数。
+    被对冲的主请求结束后，记录它比胜出的请求慢了多久，即对冲节省的时间。
+    """
+
+    def __init__(self, clients, deadline=LLM_DEADLINE, hedge_delay=LLM_HEDGE_DELAY,
+                 completion_deadline=LLM_COMPLETION_DEADLINE):
+        self.clients = list(clients)
+        self.deadline = deadline
+        self.completion_deadline = completion_deadline
+        self.hedge_delay = hedge_delay
+        self.model_name = getattr(self.clients[0], "model_name", "")
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def _current_hedge_delay(self, key):
+        if str(self.hedge_delay).lower() == "off":
+            return None
+        if str(self.hedge_delay).lower() != "auto":
+            return float(self.hedge_delay)
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            # 完整回复的耗时随输出长度变化很大，没有样本时不猜测，非流式调用暂不对冲
+            return LLM_HEDGE_DEFAULT_DELAY if key[1] else None
+        return max(LLM_HEDGE_MIN_DELAY, samples[int(len(samples) * 0.95) - 1])
+
+    def _observe(self, key, seconds):
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=HEDGE_WINDOW)).append(seconds)
+
+    def _targets(self):
+        # 只有一个模型时，对冲请求发给同一个模型（通常会落到另一个副本上）
+        return self.clients if len(self.clients) > 1 else self.clients * 2
+
+    def _run(self, messages, timeout, label, call_info, streaming):
+        """发出请求并产出胜出请求的结果：流式时逐个产出分块，非流式时产出一次完整回复"""
+        key = (label, streaming)
+        targets = self._targets()
+        events = queue.Queue()
+        # cancelled：已有请求胜出，其余请求停止；closed：调用方已不再读取，所有请求停止
+        cancelled = threading.Event()
+        closed = threading.Event()
+        start = time.monotonic()
+        deadline = self.deadline if streaming else self.completion_deadline
+        deadline_at = start + deadline
+        state = {"winner": None, "won_at": None}
+        state_lock = threading.Lock()
+
+        def settle(attempt, ok):
+            # 主请求在别的请求胜出后才结束：它多花的时间就是对冲节省的时间，它的耗时也计入对冲延迟的统计
+            with state_lock:
+                winner, won_at = state["winner"], state["won_at"]
+            if attempt != 0 or winner in (None, 0):
+                return
+            elapsed = time.monotonic() - start
+            record_hedge_saving(label, elapsed - won_at)
+            if ok:
+                self._observe(key, elapsed)
+
+        def attempt_worker(attempt, client, role):
+            model = getattr(client, "model_name", "")
+            call_timeout = max(0.1, min(timeout or deadline, deadline_at - time.monotonic()))
+            ok = False
+            try:
+                if streaming:
+                    stream = client.stream(messages, timeout=call_timeout)
+                    try:
+                        for chunk in stream:
+                            if closed.is_set() or (cancelled.is_set() and state["winner"] != attempt):
+                                break
+                            events.put((attempt, role, model, "chunk", chunk))
+                    finally:
+                        stream.close()
+                else:
+                    events.put((attempt, role, model, "chunk", client.invoke(messages, timeout=call_timeout)))
+                ok = True
+                events.put((attempt, role, model, "done", None))
+            except Exception as e:
+                events.put((attempt, role, model, "error", e))
+            finally:
+                settle(attempt, ok)
+
+        launched = []
+        running = set()
+
+        def launch(role):
+            attempt = len(launched)
+            if attempt >= len(targets):
+                return False
+            launched.append(role)
+            running.add(attempt)
+            threading.Thread(target=attempt_worker, args=(attempt, targets[attempt], role), daemon=True).start()
+            return True
+
+        launch("primary")
+        hedge_delay = self._current_hedge_delay(key)
+        hedge_at = start + hedge_delay if hedge_delay is not None else None
+        last_error = None
+        winner = None
+        try:
+            while True:
+                now = time.monotonic()
+                if winner is None:
+                    if hedge_at is not None and now >= hedge_at:
+                        hedge_at = None
+                        launch("hedge")
+                    wait_until = deadline_at if hedge_at is None else min(deadline_at, hedge_at)
+                    if now >= deadline_at:
+                        record_llm_deadline(label)
+                        raise LLMDeadlineExceeded(f"{label} 在 {deadline:g}s 内没有得到回复（已发出 {len(launched)} 个请求）")
+                    wait = wait_until - now
+                else:
+                    # 已经开始输出：后续分块的间隔由底层客户端的读取超时控制
+                    wait = None
+                try:
+                    attempt, role, model, kind, payload = events.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                if winner is not None and attempt != winner:
+                    continue
+                if kind == "error":
+                    running.discard(attempt)
+                    if winner is not None:
+                        raise payload
+                    last_error = payload
+                    print(f"[LLM] {label}: {model}（{role}）调用失败（{type(payload).__name__}: {str(payload)[:100]}）")
+                    # 失败后立即改用下一个模型；没有可用的模型且没有进行中的请求时放弃
+                    if not launch("fallback") and not running:
+                        raise last_error
+                    continue
+                if kind == "done":
+                    return
+                if winner is None:
+                    winner = attempt
+                    elapsed = time.monotonic() - start
+                    with state_lock:
+                        state["winner"], state["won_at"] = attempt, elapsed
+                    cancelled.set()
+                    if attempt == 0:
+                        self._observe(key, elapsed)
+                    record_llm_answer(label, model, role)
+                    if call_info is not None:
+                        call_info.update(model=model, role=role, attempts=len(launched))
+                yield payload
+                if not streaming:
+                    return
+        finally:
+            cancelled.set()
+            closed.set()
+
+    def invoke(self, messages, timeout=None, label="llm", call_info=None):
+        responses = self._run(messages, timeout, label, call_info, streaming=False)
+        try:
+            return next(responses)
+        finally:
+            responses.close()
+
+    def stream(self, messages, timeout=None, label="llm", call_info=None):
+        yield from self._run(messages, timeout, label, call_info, streaming=True)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_shared_llm(api_key, model_name, api_base=LLM_API_BASE, temperature=0):
+    """返回进程内共享的LLM客户端，相同配置只创建一次，底层 HTTP 连接保持复用"""
+    key = (api_key, model_name, api_base, temperature)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            import httpx
+            from langchain_openai import ChatOpenAI
+
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+                timeout=httpx.Timeout(LLM_TIMEOUT, connect=10),
+            )
+            llm = ChatOpenAI(
+                openai_api_key=api_key,
+                openai_api_base=api_base,
+                model_name=model_name,
+                temperature=temperature,
+                http_client=http_client,
+                timeout=LLM_TIMEOUT,
+                # 重试由 ResilientLLM 统一处理
+                max_retries=0,
+            )
+            client = ResilientLLM(llm)
+            _clients[key] = client
+        return client
+
+
+def parse_fallback_models(value=LLM_FALLBACK_MODELS, api_base=LLM_API_BASE):
+    """解析备用模型配置，返回 [(模型, 接口地址), ...]"""
+    models = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model_name, _, base = item.partition("@")
+        models.append((model_name.strip(), base.strip() or api_base))
+    return models
+
+
+_hedged = {}
+
+
+def get_hedged_llm(api_key, models, temperature=0):
+    """返回进程内共享的 HedgedLLM；models 为按顺序尝试的 [(模型, 接口地址), ...]
+
+    同一组模型只创建一次，对冲延迟所需的耗时统计在多次调用之间累积。
+    """
+    key = (api_key, tuple(models), temperature)
+    clients = [get_shared_llm(api_key, model_name, api_base, temperature) for model_name, api_base in models]
+    with _clients_lock:
+        client = _hedged.get(key)
+        if client is None:
+            client = HedgedLLM(clients)
+            _hedged[key] = client
+        return client
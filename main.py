@@ -1,405 +1,171 @@
 import gradio as gr
 import os
-import requests
-import glob
-import shutil
-from datetime import datetime
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+import sys
+import queue
+import argparse
+import threading
+import time
 
-# 加载环境变量
-load_dotenv()
+# 界面入口：业务逻辑都在无界面的 core 模块中，这里只负责 Gradio 布局和事件绑定
+from core import (
+    State, get_library, get_search_index, get_saved_articles, get_library_page, search_articles,
+    stream_article_points, apply_article_points, load_url, load_saved, get_related_articles, get_comparison_paths,
+    start_index_reconcile, start_precompute, get_article_artifacts, chatbot_stream, schedule_history_compaction, reset_history_memo,
+    find_duplicate_article, describe_duplicate, save_article_to_formatted, run_batch_ingest,
+    get_flomo_outbox_status, send_to_flomo, retry_failed_flomo_notes, build_metrics_report, toggle_profiler,
+)
+from ingest import read_url_list
+from metrics import start_metrics_server
 
-# 创建使用火山方舟API的LLM
-def get_llm():
-    """创建使用火山方舟API的LLM"""
-    try:
-        # 检查API密钥
-        api_key = os.getenv("ARK_API_KEY")
-        if not api_key:
-            return None, "错误：未找到 ARK_API_KEY 环境变量，请检查 .env 文件"
-        
-        # 检查模型名称环境变量
-        model_name = os.getenv("deepseek0324")
-        if not model_name:
-            model_name = "deepseek0324"  # 使用默认模型名称
-        
-        return ChatOpenAI(
-            # 从.env文件加载的环境变量中获取API Key
-            openai_api_key=api_key, 
-            # 火山方舟的API基础URL
-            openai_api_base="https://ark.cn-beijing.volces.com/api/v3",
-            # 火山方舟的推理接入点ID
-            model_name=model_name,
-            temperature=0
-        ), None
-    except Exception as e:
-        return None, f"创建 LLM 实例时出错：{str(e)}"
-
-# 提取文章内容
-def extract_article(link):
-    try:
-        # 调用 Node.js 提取脚本
-        os.system(f"node src/index.js {link}")
-        
-        # 直接从output目录获取最新的文件
-        output_files = glob.glob("output/*.txt")
-        if not output_files:
-            return None, "未找到提取的文章文件"
-            
-        # 按修改时间排序，获取最新的文件
-        latest_file = max(output_files, key=os.path.getmtime)
-        
-        # 读取文件内容
-        with open(latest_file, "r", encoding="utf-8") as f:
-            content = f.read()
-            return content, os.path.basename(latest_file)
-    except Exception as e:
-        return None, f"文章提取失败：{str(e)}"
-
-# 从文章内容中提取标题
-def extract_title(article_text):
-    # 简单方法：取第一行作为标题
-    lines = article_text.strip().split('\n')
-    if lines:
-        title = lines[0].strip()
-        # 如果标题太长，截断它
-        if len(title) > 50:
-            title = title[:47] + "..."
-        return title
-    return "无标题文章"
-
-# 获取已保存的文章列表
-def get_saved_articles():
-    try:
-        output_dir = "output/formatted"  # 修改路径
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)  # 确保目录存在，并允许父目录已存在
-            
-        # 获取所有md文件
-        article_files = glob.glob(f"{output_dir}/*.md")  # 修改为查找 .md 文件
-        articles = []
-        
-        for file_path in article_files:
-            try:
-                # 读取文件的前几行来提取标题
-                with open(file_path, "r", encoding="utf-8") as f:
-                    # 优化标题提取，尝试读取完整的第一行
-                    first_line = f.readline().strip()
-                    if not first_line: # 如果第一行是空的，尝试读取整个文件获取标题
-                        content_for_title = f.read(1000)
-                        title = extract_title(content_for_title)
-                    else:
-                        title = extract_title(first_line)
-
-                articles.append({"title": title, "path": file_path})
-            except Exception as e:
-                # 如果无法读取文件，使用文件名作为标题
-                filename = os.path.basename(file_path)
-                articles.append({"title": filename, "path": file_path})
-                
-        # 按文件名（通常包含日期）降序排序，最新的在前面
-        articles.sort(key=lambda x: os.path.basename(x['path']), reverse=True)
-        return articles
-    except Exception as e:
-        print(f"获取已保存文章列表时出错: {str(e)}")
-        return []
-
-# 加载已保存的文章
-def load_saved_article(file_path):
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        return content, extract_title(content), file_path
-    except Exception as e:
-        print(f"加载文章时出错: {str(e)}")
-        return None, None, None
-
-# 分析文章要点
-def analyze_article_points(article_text):
-    try:
-        llm, error = get_llm()
-        if llm is None:
-            return [], error
-        
-        messages = [
-            {"role": "system", "content": "你是一个擅长分析文章的AI助手。请提取文章的3个主要观点，并以简洁的方式呈现。"},
-            {"role": "user", "content": f"请分析以下文章，提取3-5个主要观点，每个观点用一句话概括：\n\n{article_text}"}
-        ]
-        response = llm.invoke(messages)
-        
-        # 处理响应，提取要点列表
-        points_text = response.content
-        points = []
-        
-        # 简单处理，按行分割并清理
-        for line in points_text.split('\n'):
-            line = line.strip()
-            if line and (line.startswith('- ') or line.startswith('• ') or 
-                        line.startswith('1.') or line.startswith('2.') or 
-                        line.startswith('3.') or line.startswith('4.') or 
-                        line.startswith('5.')):
-                # 移除前缀符号
-                clean_line = line.lstrip('- •').lstrip('1234567890.').strip()
-                if clean_line:
-                    points.append(clean_line)
-        
-        # 如果没有正确解析出要点，则使用整个响应
-        if not points:
-            points = [points_text]
-            
-        return points, None
-    except Exception as e:
-        return [], f"分析文章要点失败：{str(e)}"
-
-# 全局状态
-class State:
-    def __init__(self):
-        self.article_text = ""
-        self.article_title = ""
-        self.current_file = ""
-        self.article_points = []
-        self.link = ""
-        self.note_content = ""
-        self.chat_history = []
+# 运行指标管理页：只有设置 ADMIN_TAB=1 时才创建标签页并绑定事件，
+# 否则通过分享链接调用 Gradio 接口也无法读取指标或开关采样分析器
+ADMIN_TAB = os.getenv("ADMIN_TAB", "0") == "1"
 
-state = State()
-
-# 处理URL提交
-def process_url(url):
-    state.link = url
-    article_text, file_name = extract_article(url)
-    if article_text is None:
-        # 返回错误信息给summary_output，其他输出保持不变或设为None/默认值
-        return f"错误: {file_name}", None, "", [], "", [], gr.update(choices=[(a["title"], a["path"]) for a in get_saved_articles()])
-    
-    state.article_text = article_text
-    state.article_title = extract_title(article_text)
-    state.current_file = file_name
+# 分析已载入会话的文章要点，并逐步产出界面各输出项（摘要面板随LLM输出逐步填充）
+def stream_article_outputs(session, article_text, error_prefix):
+    title = session.article_title
+    points, error = [], None
+    for partial_text, points, error in stream_article_points(article_text):
+        if error or points:
+            break
+        # 流式过程中先展示LLM的原始输出
+        yield f"## 《{title}》\n\n### 主要观点:\n{partial_text}", article_text, title, [], "", [], gr.update()
     
-    # 分析文章要点
-    points, error = analyze_article_points(article_text)
     if error:
-        return f"文章已提取，但分析要点时出错: {error}", article_text, state.article_title, [], "", [], gr.update(choices=[(a["title"], a["path"]) for a in get_saved_articles()])
-    
-    state.article_points = points
-    
-    # 构建摘要信息
-    summary = f"## 《{state.article_title}》\n\n### 主要观点:\n"
-    for i, point in enumerate(points):
-        summary += f"{i+1}. {point}\n"
-    
-    # 重置聊天历史
-    state.chat_history = []
+        yield f"{error_prefix}: {error}", article_text, title, [], "", [], gr.update()
+        return
     
-    # 初始化笔记内容
-    default_note = f"# {state.article_title}\n\n## 要点摘要\n\n"
-    for i, point in enumerate(points):
-        default_note += f"{i+1}. {point}\n"
-    default_note += "\n## 我的笔记\n\n"
-    state.note_content = default_note
+    # 重置聊天历史和对比文章的选择，生成默认笔记
+    summary, default_note = apply_article_points(session, points)
     
-    # 更新对比文章选择器的选项
-    comparison_choices = [(a["title"], a["path"]) for a in get_saved_articles()]
-    
-    return summary, article_text, state.article_title, points, default_note, [], gr.update(choices=comparison_choices, value=[])
+    yield summary, article_text, title, points, default_note, [], gr.update(value=[], label=comparison_label(session))
 
-# 处理文件选择
-def handle_file_selection(selected_value):
-    if selected_value is None:
+# 处理URL提交
+def process_url(url, session):
+    error = load_url(url, session)
+    if error:
         # 返回错误信息给summary_output，其他输出保持不变或设为None/默认值
-        return "请选择一个文件", None, "", [], "", [], gr.update(choices=[(a["title"], a["path"]) for a in get_saved_articles()])
+        yield f"错误: {error}", None, "", [], "", [], gr.update()
+        return
     
-    # 获取已保存的文章列表
-    articles = get_saved_articles()
-    
-    # 检查selected_value是否为字典类型
-    if isinstance(selected_value, dict) and "value" in selected_value:
-        idx = selected_value["value"]
-    else:
-        # 尝试将selected_value转换为整数
-        try:
-            idx = int(selected_value)
-        except (ValueError, TypeError):
-            return f"无效的文件选择: {selected_value}", None, "", [], "", [], gr.update(choices=[(a["title"], a["path"]) for a in get_saved_articles()])
-    
-    # 检查索引是否有效
-    if idx < 0 or idx >= len(articles):
+    # 分析文章要点
+    yield from stream_article_outputs(session, session.article_text, "文章已提取，但分析要点时出错")
+
+# 处理文件选择（值为文章 id，文章库增删后依然指向同一篇文章）
+def handle_file_selection(selected_value, session):
+    if selected_value is None:
         # 返回错误信息给summary_output，其他输出保持不变或设为None/默认值
-        return f"无效的文件索引: {idx}", None, "", [], "", [], gr.update(choices=[(a["title"], a["path"]) for a in get_saved_articles()])
-    
-    # 获取选中的文章信息
-    file_info = articles[idx]
+        yield "请选择一个文件", None, "", [], "", [], gr.update()
+        return
     
-    # 加载选中的文章
-    article_text, title, file_path = load_saved_article(file_info["path"])
-    if article_text is None:
+    try:
+        article_id = int(selected_value)
+    except (ValueError, TypeError):
+        yield f"无效的文件选择: {selected_value}", None, "", [], "", [], gr.update()
+        return
+    
+    # 按 id 从清单中获取选中的文章信息，正文在打开时才读取
+    file_info = get_library().get_by_id(article_id)
+    if file_info is None:
+        yield f"文章不存在或已被删除，请刷新文章列表: {article_id}", None, "", [], "", [], gr.update()
+        return
+    
+    yield from open_saved_article(file_info, session)
+
+# 处理搜索结果的选择（值为文章路径）
+def handle_search_selection(selected_path, session):
+    if not selected_path:
+        yield gr.update(), gr.update(), gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    
+    file_info = get_library().get_by_path(selected_path)
+    if file_info is None:
+        yield f"文章不存在或已被删除: {selected_path}", None, "", [], "", [], gr.update()
+        return
+    
+    yield from open_saved_article(file_info, session)
+
+# 打开清单中的一篇文章并分析要点（后台已预计算过的文章直接展示，不调用 LLM）
+def open_saved_article(file_info, session):
+    if load_saved(file_info, session):
         # 返回错误信息给summary_output，其他输出保持不变或设为None/默认值
-        return f"加载文章失败", None, "", [], "", [], gr.update(choices=[(a["title"], a["path"]) for a in get_saved_articles()])
-    
-    state.article_text = article_text
-    state.article_title = title
-    state.current_file = os.path.basename(file_path)
+        yield f"加载文章失败", None, "", [], "", [], gr.update()
+        return
+    
+    artifacts = get_article_artifacts(file_info)
+    if artifacts is not None:
+        summary, default_note = apply_article_points(session, artifacts["points"])
+        yield (
+            summary, session.article_text, session.article_title, artifacts["points"], default_note, [],
+            gr.update(value=[], label=comparison_label(session)),
+        )
+        return
     
     # 分析文章要点
-    points, error = analyze_article_points(article_text)
-    if error:
-        return f"文章已加载，但分析要点时出错: {error}", article_text, title, [], "", [], gr.update(choices=[(a["title"], a["path"]) for a in get_saved_articles()])
-    
-    state.article_points = points
-    
-    # 构建摘要信息
-    summary = f"## 《{state.article_title}》\n\n### 主要观点:\n"
-    for i, point in enumerate(points):
-        summary += f"{i+1}. {point}\n"
-    
-    # 重置聊天历史
-    state.chat_history = []
-    
-    # 初始化笔记内容
-    default_note = f"# {state.article_title}\n\n## 要点摘要\n\n"
-    for i, point in enumerate(points):
-        default_note += f"{i+1}. {point}\n"
-    default_note += "\n## 我的笔记\n\n"
-    state.note_content = default_note
-    
-    # 更新对比文章选择器的选项
-    comparison_choices = [(a["title"], a["path"]) for a in get_saved_articles()]
-    
-    return summary, article_text, title, points, default_note, [], gr.update(choices=comparison_choices, value=[])
-
-# 聊天机器人处理函数
-def chatbot(message, history, comparison_article_paths=None):
-    if not state.article_text:
-        return "请先加载或提取主文章内容。您可以在'文章来源'部分提供URL或选择已保存的文章。"
-    
-    llm, error = get_llm()
-    if llm is None:
-        return error
-
-    # 构建基础上下文和系统提示
-    # 考虑LLM的总上下文窗口，例如 deepseek-chat 通常有 32k tokens
-    # 假设平均一个中文字符约等于2个token，一个英文字符约等于1个token
-    # 主文章内容限制，例如 8000 字符 (约 16k tokens，留足空间给其他内容和回复)
-    main_article_char_limit = 8000
-    # 每篇对比文章内容限制，例如 4000 字符 (约 8k tokens)
-    comparison_article_char_limit = 4000
+    yield from stream_article_outputs(session, session.article_text, "文章已加载，但分析要点时出错")
 
-    system_prompt = "你是一个AI伴读助手，帮助用户理解文章。你的回答应该简洁明了，并且在回答后提出一个相关的问题，引导用户继续思考。"
-    current_article_context = f"主文章《{state.article_title}》内容摘要：\n{state.article_text[:main_article_char_limit]}...\n\n"
-
-    if comparison_article_paths:
-        system_prompt = (
-            "你是一位专业的AI研究助手，擅长深度对比和分析多篇文章。\n"
-            "请仔细阅读以下所有提供的文章材料。\n"
-            "针对用户的问题，你需要：\n"
-            "1. 明确指出信息来源于哪篇文章（例如，'根据《文章A》...' 或 '《文章B》则认为...'）。\n"
-            "2. 深入比较这些文章在相关观点上的异同点、各自的侧重点和论证方式。\n"
-            "3. 如果适用，整合不同文章的观点，形成一个更全面的看法。\n"
-            "4. 避免简单罗列，要进行有深度的分析和综合。\n"
-            "5. 在回答后，可以提出一个引导用户进一步思考这些文章间联系或差异的问题。"
-        )
-        current_article_context += "以下是用于对比分析的其他文章材料：\n"
-        for i, path in enumerate(comparison_article_paths):
-            try:
-                comp_content, comp_title, _ = load_saved_article(path)
-                if comp_content:
-                    current_article_context += f"\n--- 对比文章 {i+1}: 《{comp_title}》内容摘要 ---\n{comp_content[:comparison_article_char_limit]}...\n"
-            except Exception as e:
-                current_article_context += f"\n--- 无法加载对比文章 {i+1} ({os.path.basename(path)}): {e} ---\n"
-        current_article_context += "\n请基于以上所有文章材料进行回答。\n"
+# 翻页或筛选已保存的文章列表（下拉框的值为文章 id）
+def browse_library(session, page, title_filter):
+    articles, session.library_page, info = get_library_page(page, title_filter)
+    session.library_filter = title_filter or ""
+    return gr.update(choices=[(a["title"], a["id"]) for a in articles], value=None), info
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"请分析以下文本：\n{current_article_context}\n\n现在，针对以上内容，回答我的问题。"} # 更明确地指示LLM基于提供的上下文
-    ]
-    
-    # 添加对话历史
-    for h_user, h_assistant in history:
-        messages.append({"role": "user", "content": h_user})
-        if h_assistant:
-            messages.append({"role": "assistant", "content": h_assistant})
-    
-    # 添加当前问题
-    messages.append({"role": "user", "content": message})
-    
-    try:
-        # 调用LLM
-        response = llm.invoke(messages)
-        return response.content
-    except Exception as e:
-        return f"生成回复时出错：{str(e)}"
+# 对比选择器的标题，显示跨页已选的文章数
+def comparison_label(session):
+    label = "选择其他已保存的文章加入对比 (可选)"
+    if session.comparison_ids:
+        label += f"，已选 {len(session.comparison_ids)} 篇"
+    return label
 
-# 新增：保存当前文章到 formatted 文件夹
-def save_article_to_formatted(article_content, base_article_title, user_custom_title=None):
-    if not article_content:
-        return "文章内容为空，未保存"
-    
-    effective_title = base_article_title
-    content_to_save = article_content
+# 翻页或筛选对比文章，勾选状态按 id 跨页保留
+def browse_comparison(session, page, title_filter):
+    articles, session.comparison_page, info = get_library_page(page, title_filter)
+    session.comparison_filter = title_filter or ""
+    session.comparison_page_ids = [a["id"] for a in articles]
+    selected = [article_id for article_id in session.comparison_page_ids if article_id in session.comparison_ids]
+    return gr.update(
+        choices=[(a["title"], a["id"]) for a in articles], value=selected, label=comparison_label(session)
+    ), info
 
-    if user_custom_title and user_custom_title.strip():
-        effective_title = user_custom_title.strip()
-        content_to_save = f"{effective_title}\n\n{article_content}"
-    
-    if not effective_title: # Fallback if all titles are empty
-        effective_title = "无标题文章"
+# 用户勾选或取消对比文章：只替换当前页的部分，其他页的选择不变
+def update_comparison_selection(selected_ids, session):
+    page_ids = set(session.comparison_page_ids)
+    kept = [article_id for article_id in session.comparison_ids if article_id not in page_ids]
+    session.comparison_ids = kept + [article_id for article_id in selected_ids or [] if article_id not in kept]
+    return gr.update(label=comparison_label(session)), gr.update(value=selected_related_ids(session))
 
-    try:
-        output_dir = "output/formatted"
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # 清理标题以用作文件名，并限制长度
-        safe_title = "".join(c if c.isalnum() or c in " _-" else "_" for c in effective_title)[:50]
-        filename = f"{output_dir}/{timestamp}_{safe_title}.md"
+def selected_related_ids(session):
+    return [article_id for article_id in session.related_ids if article_id in session.comparison_ids]
 
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(content_to_save)
+# 载入文章后展示推荐的相关文章，勾选即加入对比
+def show_related_articles(session):
+    related = get_related_articles(session)
+    session.related_ids = [article["id"] for article, _ in related]
+    return gr.update(
+        choices=[(f"{article['title']}（相似度 {similarity:.0%}）", article["id"]) for article, similarity in related],
+        value=selected_related_ids(session)
+    )
 
-        return f"文章已保存至 {filename}"
-    except Exception as e:
-        return f"保存文章失败：{str(e)}"
+# 勾选或取消推荐的相关文章，与对比选择器共用会话中的已选文章
+def update_related_selection(selected_ids, session):
+    related = set(session.related_ids)
+    kept = [article_id for article_id in session.comparison_ids if article_id not in related]
+    session.comparison_ids = kept + [article_id for article_id in selected_ids or [] if article_id not in kept]
+    page_selected = [article_id for article_id in session.comparison_page_ids if article_id in session.comparison_ids]
+    return gr.update(value=page_selected, label=comparison_label(session))
 
-# 发送笔记到Flomo
-def send_to_flomo(note_content):
-    if not state.article_text:
-        return "请先加载文章内容"
-    
-    if not note_content:
-        return "笔记内容为空，未发送"
-    
-    try:
-        # Flomo API地址
-        flomo_api_url = "https://flomoapp.com/iwh/NDIwOTAx/c62bd115ef72eb46a2289296744fe0dc/"
-        
-        # 准备发送的数据
-        # 添加文章标题作为标签
-        title_tag = state.article_title.replace(" ", "_")
-        data = {
-            "content": f"{note_content}\n\n#AI阅读助手 #{title_tag}"
-        }
-        
-        # 发送请求
-        headers = {"Content-Type": "application/json"}
-        response = requests.post(flomo_api_url, json=data, headers=headers)
-        
-        # 检查响应
-        if response.status_code == 200:
-            return "笔记已成功发送到Flomo"
-        else:
-            return f"发送到Flomo失败：HTTP状态码 {response.status_code}"
-    except Exception as e:
-        return f"发送到Flomo失败：{str(e)}"
 
 # 更新笔记内容
-def update_note_content(note):
-    state.note_content = note
+def update_note_content(note, session):
+    session.note_content = note
     return note
 
 # 构建界面
 with gr.Blocks(title="AI阅读助手", theme=gr.themes.Base()) as demo:
+    # 每个浏览器会话独立的状态（文章、要点、笔记等）
+    session_state = gr.State(State())
+    
     gr.Markdown("# 📚 AI阅读助手")
     gr.Markdown("这个工具可以帮助你提取网页文章内容，分析要点，并与AI交互讨论文章内容。")
     
@@ -418,12 +184,23 @@ with gr.Blocks(title="AI阅读助手", theme=gr.themes.Base()) as demo:
             # 刷新按钮
             refresh_btn = gr.Button("刷新文章列表")
             
-            # 历史文章列表（使用下拉列表展示）
+            # 历史文章列表（分页的下拉列表，值为文章 id；页面加载后再填充）
+            library_filter = gr.Textbox(label="按标题筛选", placeholder="输入关键词后回车")
             saved_articles = gr.Dropdown(
                 label="选择已保存的文章",
-                choices=[{"title": article["title"], "value": i} for i, article in enumerate(get_saved_articles())], # value is index
+                choices=[],
                 interactive=True
             )
+            with gr.Row():
+                library_prev_btn = gr.Button("上一页", size="sm", min_width=60)
+                library_next_btn = gr.Button("下一页", size="sm", min_width=60)
+            library_page_info = gr.Markdown()
+            
+            # 全文检索
+            gr.Markdown("### 🔍 搜索文章")
+            search_input = gr.Textbox(label="搜索全文", placeholder="输入关键词后回车")
+            search_results = gr.Dropdown(label="搜索结果", choices=[], interactive=True)
+            search_snippets = gr.Markdown()
             
         with gr.Column(scale=4, min_width=400):
             # 中间面板 - 标签页
@@ -446,6 +223,11 @@ with gr.Blocks(title="AI阅读助手", theme=gr.themes.Base()) as demo:
                     with gr.Row():
                         save_article_btn = gr.Button("保存当前文章到 formatted 文件夹", variant="primary")
                     save_article_status_output = gr.Textbox(label="保存状态", interactive=False, visible=True)
+                    # 发现近似重复的已保存文章时，让用户选择处理方式
+                    with gr.Row(visible=False) as duplicate_actions:
+                        duplicate_link_btn = gr.Button("关联到已有文章")
+                        duplicate_replace_btn = gr.Button("替换已有文章")
+                        duplicate_keep_btn = gr.Button("仍然另存")
                 
                 # 阅读与笔记标签页
                 with gr.TabItem("💬 阅读与笔记") as tab_chat:
@@ -453,12 +235,23 @@ with gr.Blocks(title="AI阅读助手", theme=gr.themes.Base()) as demo:
                         # 聊天区域
                         with gr.Column(scale=3):
                             gr.Markdown("#### 多文章对比选择")
+                            related_articles = gr.CheckboxGroup(
+                                label="推荐的相关文章（勾选即加入对比）",
+                                choices=[], # 载入文章后按相似度填充，值为文章 id
+                                value=[],
+                                interactive=True
+                            )
+                            comparison_filter = gr.Textbox(label="按标题筛选", placeholder="输入关键词后回车")
                             comparison_article_selector = gr.CheckboxGroup(
-                                label="选择其他已保存的文章加入对比 (可选):",
-                                choices=[(article["title"], article["path"]) for article in get_saved_articles()], # value is path
+                                label="选择其他已保存的文章加入对比 (可选)",
+                                choices=[], # 分页显示，值为文章 id
                                 value=[],
                                 interactive=True
                             )
+                            with gr.Row():
+                                comparison_prev_btn = gr.Button("上一页", size="sm", min_width=60)
+                                comparison_page_info = gr.Markdown()
+                                comparison_next_btn = gr.Button("下一页", size="sm", min_width=60)
                             gr.Markdown("---") # 分隔线
                             
                             chat_interface = gr.Chatbot(
@@ -487,103 +280,308 @@ with gr.Blocks(title="AI阅读助手", theme=gr.themes.Base()) as demo:
                                 label="我的笔记",
                                 lines=20,
                                 placeholder="在这里记录你的想法...",
-                                value=state.note_content
+                                value=""
                             )
                             with gr.Row():   # 发送到Flomo按钮
                                 flomo_btn = gr.Button("发送到Flomo", variant="primary", scale=1)
                                 # 移除了 save_note_btn
                             save_status = gr.Textbox(label="操作状态", visible=True) # 此状态框现在主要由Flomo使用
+                            flomo_outbox_status = gr.Markdown() # 页面加载后再读取发件箱状态
+                            with gr.Row():
+                                flomo_refresh_btn = gr.Button("刷新发送状态", scale=1)
+                                flomo_retry_btn = gr.Button("重试失败的笔记", scale=1)
+                
+                # 批量导入标签页
+                with gr.TabItem("📥 批量导入") as tab_ingest:
+                    ingest_urls_input = gr.Textbox(
+                        label="文章URL列表（每行一个，# 开头的行会被忽略）",
+                        lines=10,
+                        placeholder="https://example.com/article-1\nhttps://example.com/article-2"
+                    )
+                    with gr.Row():
+                        ingest_fetch_concurrency = gr.Slider(1, 16, value=4, step=1, label="提取并发数")
+                        ingest_llm_concurrency = gr.Slider(1, 8, value=2, step=1, label="LLM并发数")
+                    ingest_on_duplicate = gr.Radio(
+                        [("关联到已有文章", "link"), ("替换已有文章", "replace"), ("仍然另存", "keep")],
+                        value="link",
+                        label="遇到与已保存文章重复的内容时"
+                    )
+                    ingest_btn = gr.Button("开始导入", variant="primary")
+                    ingest_log_output = gr.Textbox(label="导入进度", lines=15, max_lines=30, interactive=False)
+                
+                # 运行指标标签页（默认不创建，设置 ADMIN_TAB=1 时才有）
+                if ADMIN_TAB:
+                    with gr.TabItem("📈 运行指标") as tab_metrics:
+                        metrics_refresh_btn = gr.Button("刷新指标")
+                        metrics_summary = gr.Markdown()
+                        with gr.Accordion("Prometheus 文本", open=False):
+                            metrics_text = gr.Textbox(show_label=False, lines=20, max_lines=40, interactive=False)
+                        gr.Markdown("#### 采样分析器")
+                        profiler_btn = gr.Button("开始采样")
+                        profiler_output = gr.Textbox(label="采样结果（按函数统计的采样次数）", lines=20, max_lines=40, interactive=False)
     
     # 事件处理
     # 提取文章
     extract_btn.click(
         fn=process_url,
-        inputs=[url_input],
+        inputs=[url_input, session_state],
         outputs=[summary_output, article_output, custom_title_input, gr.JSON(visible=False), note_input, chat_interface, comparison_article_selector]
-    ).then(lambda: gr.Tabs(selected=0), None, tabs)
+    ).then(show_related_articles, [session_state], [related_articles]).then(lambda: gr.Tabs(selected=0), None, tabs)
     
     # 刷新文章列表
-    def update_all_article_lists():
-        articles = get_saved_articles()
-        dropdown_choices = [{"title": article["title"], "value": i} for i, article in enumerate(articles)]
-        checkbox_choices = [(article["title"], article["path"]) for article in articles]
-        return gr.update(choices=dropdown_choices), gr.update(choices=checkbox_choices, value=[])
-    
-    refresh_btn.click(
-        fn=update_all_article_lists,
-        inputs=[],
-        outputs=[saved_articles, comparison_article_selector]
+    def update_all_article_lists(session):
+        # 刷新时与磁盘对账，只重新读取有变化的文件；查重签名和推荐向量在后台线程中补算，不阻塞界面
+        get_library().reconcile()
+        get_search_index().reconcile(get_saved_articles())
+        start_index_reconcile(again=True)
+        return (
+            *browse_library(session, session.library_page, session.library_filter),
+            *browse_comparison(session, session.comparison_page, session.comparison_filter),
+        )
+    
+    library_list_outputs = [saved_articles, library_page_info, comparison_article_selector, comparison_page_info]
+    refresh_btn.click(fn=update_all_article_lists, inputs=[session_state], outputs=library_list_outputs)
+    # 首屏不内嵌文章列表，页面加载后再从内存中的清单取第一页；与磁盘对账只在启动时的后台线程和手动刷新时进行
+    demo.load(
+        fn=lambda session: (
+            *browse_library(session, session.library_page, session.library_filter),
+            *browse_comparison(session, session.comparison_page, session.comparison_filter),
+        ),
+        inputs=[session_state], outputs=library_list_outputs
     )
     
-    saved_articles.change(
+    library_filter.submit(
+        fn=lambda title_filter, session: browse_library(session, 0, title_filter),
+        inputs=[library_filter, session_state],
+        outputs=[saved_articles, library_page_info]
+    )
+    library_prev_btn.click(
+        fn=lambda session: browse_library(session, session.library_page - 1, session.library_filter),
+        inputs=[session_state],
+        outputs=[saved_articles, library_page_info]
+    )
+    library_next_btn.click(
+        fn=lambda session: browse_library(session, session.library_page + 1, session.library_filter),
+        inputs=[session_state],
+        outputs=[saved_articles, library_page_info]
+    )
+    
+    # 只响应用户的选择；翻页时重置下拉框不会触发打开文章
+    saved_articles.select(
         fn=handle_file_selection,
-        inputs=[saved_articles],
+        inputs=[saved_articles, session_state],
+        outputs=[summary_output, article_output, custom_title_input, gr.JSON(visible=False), note_input, chat_interface, comparison_article_selector]
+    ).then(show_related_articles, [session_state], [related_articles]).then(lambda: gr.Tabs(selected=0), None, tabs)
+    
+    # 对比文章的筛选、翻页和勾选
+    comparison_filter.submit(
+        fn=lambda title_filter, session: browse_comparison(session, 0, title_filter),
+        inputs=[comparison_filter, session_state],
+        outputs=[comparison_article_selector, comparison_page_info]
+    )
+    comparison_prev_btn.click(
+        fn=lambda session: browse_comparison(session, session.comparison_page - 1, session.comparison_filter),
+        inputs=[session_state],
+        outputs=[comparison_article_selector, comparison_page_info]
+    )
+    comparison_next_btn.click(
+        fn=lambda session: browse_comparison(session, session.comparison_page + 1, session.comparison_filter),
+        inputs=[session_state],
+        outputs=[comparison_article_selector, comparison_page_info]
+    )
+    comparison_article_selector.input(
+        fn=update_comparison_selection,
+        inputs=[comparison_article_selector, session_state],
+        outputs=[comparison_article_selector, related_articles]
+    )
+    related_articles.input(
+        fn=update_related_selection,
+        inputs=[related_articles, session_state],
+        outputs=[comparison_article_selector]
+    )
+    
+    # 全文检索
+    def handle_search(query):
+        if not query or not query.strip():
+            return gr.update(choices=[], value=None), ""
+        start = time.perf_counter()
+        hits = search_articles(query)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if not hits:
+            return gr.update(choices=[], value=None), f"没有找到与「{query.strip()}」相关的文章"
+        snippets = [f"共 {len(hits)} 条结果（{elapsed_ms:.1f} ms）"]
+        for i, hit in enumerate(hits, start=1):
+            snippets.append(f"{i}. **{hit['title']}**\n\n   {hit['snippet']}")
+        return gr.update(choices=[(hit["title"], hit["path"]) for hit in hits], value=None), "\n\n".join(snippets)
+    
+    search_input.submit(
+        fn=handle_search,
+        inputs=[search_input],
+        outputs=[search_results, search_snippets]
+    )
+    
+    search_results.select(
+        fn=handle_search_selection,
+        inputs=[search_results, session_state],
         outputs=[summary_output, article_output, custom_title_input, gr.JSON(visible=False), note_input, chat_interface, comparison_article_selector]
-    ).then(lambda: gr.Tabs(selected=0), None, tabs)
+    ).then(show_related_articles, [session_state], [related_articles]).then(lambda: gr.Tabs(selected=0), None, tabs)
     
     # 新增：处理保存文章按钮点击事件
-    def handle_save_article_click(custom_title_from_input): # 接收自定义标题
-        if not state.article_text:
-            return "没有文章内容可保存。"
-        # 将 state.article_title 作为基础标题，custom_title_from_input 作为用户自定义标题传入
-        return save_article_to_formatted(state.article_text, state.article_title, custom_title_from_input)
+    def handle_save_article_click(custom_title_from_input, session, on_duplicate="ask"): # 接收自定义标题
+        if not session.article_text:
+            return "没有文章内容可保存。", gr.update(visible=False)
+        if on_duplicate == "ask":
+            # 先查重：有近似重复的文章时显示处理方式的按钮，否则直接保存
+            duplicate, similarity = find_duplicate_article(session.article_text)
+            if duplicate is not None:
+                return describe_duplicate(duplicate, similarity), gr.update(visible=True)
+            on_duplicate = "keep"
+        # 将 session.article_title 作为基础标题，custom_title_from_input 作为用户自定义标题传入
+        status = save_article_to_formatted(
+            session.article_text, session.article_title, custom_title_from_input, session.link, on_duplicate
+        )
+        return status, gr.update(visible=False)
 
     save_article_btn.click(
         fn=handle_save_article_click,
-        inputs=[custom_title_input], # 从自定义标题输入框获取输入
-        outputs=[save_article_status_output]
+        inputs=[custom_title_input, session_state], # 从自定义标题输入框获取输入
+        outputs=[save_article_status_output, duplicate_actions]
     )
+    for button, policy in ((duplicate_link_btn, "link"), (duplicate_replace_btn, "replace"), (duplicate_keep_btn, "keep")):
+        button.click(
+            fn=lambda custom_title, session, policy=policy: handle_save_article_click(custom_title, session, policy),
+            inputs=[custom_title_input, session_state],
+            outputs=[save_article_status_output, duplicate_actions]
+        )
     
-    # 聊天功能
-    def chat_respond(message, history, comparison_paths): # Added comparison_paths
+    # 聊天功能（流式输出，逐步更新最后一条回复）
+    def chat_respond(message, history, session):
         if not message:
             # Return current history and empty input string if message is empty
-            return history, "" 
+            yield history, ""
+            return
         
         # 添加用户消息到历史
         history.append([message, None])
+        yield history, ""
         
-        # 生成回复
-        response_text = chatbot(message, history[:-1], comparison_paths) # Pass comparison_paths
-        
-        # 更新最后一条消息的回复
-        history[-1][1] = response_text
+        # 生成回复（对比文章按会话中跨页保留的选择）
+        for response_text in chatbot_stream(session, message, history[:-1], get_comparison_paths(session)):
+            # 更新最后一条消息的回复
+            history[-1][1] = response_text
+            yield history, "" # Return updated history and clear input
         
-        return history, "" # Return updated history and clear input
+        # 回复已发送，需要时在后台压缩较早的对话
+        schedule_history_compaction(session, history)
     
     chat_send_btn.click(
         fn=chat_respond,
-        inputs=[chat_input, chat_interface, comparison_article_selector], # Added comparison_article_selector
+        inputs=[chat_input, chat_interface, session_state],
         outputs=[chat_interface, chat_input], # chat_input to clear it
         queue=True
     ) # .then(lambda: "", None, chat_input) # This is now handled by chat_respond returning "" for chat_input
     
     chat_input.submit(
         fn=chat_respond,
-        inputs=[chat_input, chat_interface, comparison_article_selector], # Added comparison_article_selector
+        inputs=[chat_input, chat_interface, session_state],
         outputs=[chat_interface, chat_input], # chat_input to clear it
         queue=True
     ) # .then(lambda: "", None, chat_input) # This is now handled by chat_respond returning "" for chat_input
     
     # 清除笔记输入框内容
+    def clear_chat(session):
+        reset_history_memo(session)
+        return []
+    
     chat_clear_btn.click(
-        fn=lambda: [],
-        inputs=[],
+        fn=clear_chat,
+        inputs=[session_state],
         outputs=[chat_interface]
     )# 如果有清除笔记按钮，可以保留
     
+    # 批量导入：在后台线程中运行流水线，逐条输出进度
+    def handle_batch_ingest(urls_text, fetch_concurrency, llm_concurrency, on_duplicate):
+        urls = read_url_list(urls_text or "")
+        if not urls:
+            yield "请输入至少一个URL"
+            return
+        
+        messages = queue.Queue()
+
+        def run_ingest():
+            # 无论导入是否出错都要放入结束标记，否则下面的循环会一直等待并占住 Gradio 的并发槽位
+            try:
+                run_batch_ingest(urls, fetch_concurrency, llm_concurrency, progress=messages.put, on_duplicate=on_duplicate)
+            except Exception as e:
+                messages.put(f"批量导入出错：{type(e).__name__}: {str(e)}")
+            finally:
+                messages.put(None)
+
+        worker = threading.Thread(target=run_ingest, daemon=True)
+        worker.start()
+        
+        lines = [f"共 {len(urls)} 个链接，开始导入……"]
+        yield "\n".join(lines)
+        while True:
+            message = messages.get()
+            if message is None:
+                break
+            lines.append(message)
+            yield "\n".join(lines)
+    
+    ingest_btn.click(
+        fn=handle_batch_ingest,
+        inputs=[ingest_urls_input, ingest_fetch_concurrency, ingest_llm_concurrency, ingest_on_duplicate],
+        outputs=[ingest_log_output]
+    )
+    
     # 发送到Flomo
     flomo_btn.click(
         fn=send_to_flomo,
-        inputs=[note_input],
-        outputs=[save_status] # Flomo 操作状态会更新到笔记区的 save_status
+        inputs=[note_input, session_state],
+        outputs=[save_status, flomo_outbox_status] # Flomo 操作状态会更新到笔记区的 save_status
     )
     
-    # 实时更新笔记内容到state
+    if ADMIN_TAB:
+        metrics_refresh_btn.click(fn=build_metrics_report, inputs=[], outputs=[metrics_summary, metrics_text])
+        tab_metrics.select(fn=build_metrics_report, inputs=[], outputs=[metrics_summary, metrics_text])
+        profiler_btn.click(fn=toggle_profiler, inputs=[], outputs=[profiler_btn, profiler_output])
+    
+    flomo_refresh_btn.click(fn=get_flomo_outbox_status, inputs=[], outputs=[flomo_outbox_status])
+    flomo_retry_btn.click(fn=retry_failed_flomo_notes, inputs=[], outputs=[save_status, flomo_outbox_status])
+    demo.load(fn=get_flomo_outbox_status, inputs=[], outputs=[flomo_outbox_status])
+    
+    # 实时更新笔记内容到会话状态
     note_input.change(
         fn=update_note_content,
-        inputs=[note_input],
-        outputs=[] # 不需要直接输出，只更新state
+        inputs=[note_input, session_state],
+        outputs=[] # 不需要直接输出，只更新会话状态
     )
 
-demo.launch(share=True, server_name="0.0.0.0", server_port=7860)
\ No newline at end of file
+# 状态已按会话隔离，处理函数可重入，队列可以真正并发处理多个用户的请求
+demo.queue(default_concurrency_limit=int(os.getenv("GRADIO_CONCURRENCY", "8")))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI阅读助手")
+    subparsers = parser.add_subparsers(dest="command")
+    ingest_parser = subparsers.add_parser("ingest", help="批量导入文章（不启动界面）")
+    ingest_parser.add_argument("source", help="URL列表文件，每行一个；- 表示从标准输入读取")
+    ingest_parser.add_argument("--fetch-concurrency", type=int, default=4, help="提取并发数")
+    ingest_parser.add_argument("--llm-concurrency", type=int, default=2, help="LLM并发数")
+    ingest_parser.add_argument(
+        "--on-duplicate", choices=["link", "replace", "keep"], default="link",
+        help="遇到与已保存文章近似重复的内容时：关联到已有文章（默认）、替换已有文章或仍然另存"
+    )
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        stats = run_batch_ingest(
+            read_url_list(args.source), args.fetch_concurrency, args.llm_concurrency, on_duplicate=args.on_duplicate
+        )
+        sys.exit(1 if stats["failed"] else 0)
+    else:
+        # 启动时在后台对账查重签名和推荐向量、预计算最近文章的要点；Prometheus 指标端点与 Gradio 服务并列运行
+        start_index_reconcile()
+        start_precompute()
+        start_metrics_server()
+        demo.launch(share=True, server_name="0.0.0.0", server_port=7860)
\ No newline at end of file
@@ -0,0 +1,413 @@
+import os
+import sys
+import hmac
+import time
+import threading
+import traceback
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qs
+
+# Prometheus 文本格式的指标端口（0 表示不启动），与 Gradio 服务并列运行
+METRICS_PORT = int(os.getenv("METRICS_PORT", "7861"))
+# 默认只监听本机；需要被其他机器抓取时显式设置 METRICS_HOST
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# /debug/profile 的访问令牌；为空时该端点关闭（采样会拖慢整个进程，不能匿名开启）
+METRICS_PROFILE_TOKEN = os.getenv("METRICS_PROFILE_TOKEN", "")
+# 采样分析器的采样间隔（秒）
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.01"))
+
+# 耗时直方图的默认分桶（秒），覆盖从文件列表的毫秒级到网页提取的分钟级
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, key, (), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """{标签值: (次数, 总和)}，供管理页汇总"""
+        with self._lock:
+            return {key: (state["count"], state["sum"]) for key, state in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state["counts"]), state["sum"], state["count"]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((self.name + "_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append((self.name + "_bucket", key, (("le", "+Inf"),), count))
+            samples.append((self.name + "_sum", key, (), total))
+            samples.append((self.name + "_count", key, (), count))
+        return samples
+
+
+class CallbackMetric(_Metric):
+    """取值时调用 fn()，返回数值或 {标签值元组: 数值}；用于导出其他模块自己维护的计数"""
+
+    def __init__(self, name, documentation, fn, labelnames=(), metric_type="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+        self.type = metric_type
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"读取指标 {self.name} 失败: {str(e)}")
+            return []
+        if isinstance(value, dict):
+            return [(self.name, tuple(str(v) for v in key), (), val) for key, val in value.items()]
+        return [(self.name, (), (), value)]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, fn, labelnames=(), metric_type="gauge"):
+        return self._register(CallbackMetric(name, documentation, fn, labelnames, metric_type))
+
+    def render(self):
+        """按 Prometheus 文本格式输出全部指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "reading_assistant_stage_duration_seconds", "各处理阶段的耗时", ("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "reading_assistant_stage_errors_total", "各处理阶段的错误次数", ("stage",)
+)
+LLM_SECONDS = registry.histogram("reading_assistant_llm_duration_seconds", "LLM 调用的总耗时", ("label",))
+LLM_TTFT_SECONDS = registry.histogram("reading_assistant_llm_ttft_seconds", "LLM 调用的首个token耗时", ("label",))
+# counting 为 tokenizer（分词器计数）或 estimate（分词器不可用，按字符估算）
+LLM_PROMPT_TOKENS = registry.counter(
+    "reading_assistant_llm_prompt_tokens_total", "发送给 LLM 的提示词token数", ("label", "counting")
+)
+LLM_COMPLETION_TOKENS = registry.counter(
+    "reading_assistant_llm_completion_tokens_total", "LLM 回复的token数", ("label", "counting")
+)
+LLM_ERRORS = registry.counter("reading_assistant_llm_errors_total", "LLM 调用失败的次数", ("label",))
+LLM_ANSWERS = registry.counter(
+    "reading_assistant_llm_answers_total", "LLM 调用由哪个模型、哪类请求（primary/hedge/fallback）给出回复", ("label", "model", "role")
+)
+LLM_DEADLINE_EXCEEDED = registry.counter(
+    "reading_assistant_llm_deadline_exceeded_total", "LLM 调用在截止时间内没有得到回复的次数", ("label",)
+)
+LLM_HEDGE_SAVED_SECONDS = registry.histogram(
+    "reading_assistant_llm_hedge_saved_seconds", "对冲请求胜出时，比被对冲的主请求提前的时间", ("label",)
+)
+EXTRACT_STEP_SECONDS = registry.histogram(
+    "reading_assistant_extract_step_duration_seconds", "文章提取中各步骤的耗时（静态抓取、浏览器、进程通信等）", ("step",)
+)
+EXTRACT_TIER = registry.counter("reading_assistant_extract_tier_total", "文章最终由哪种抓取方式提取成功", ("tier",))
+
+
+@contextmanager
+def track_stage(stage):
+    """统计一个阶段的耗时，抛出异常时计入错误次数"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_error(stage):
+    """以返回值报告错误（而不是抛出异常）的阶段，出错时调用"""
+    STAGE_ERRORS.inc(stage=stage)
+
+
+def record_llm_call(label, duration, ttft, prompt_tokens, completion_tokens, failed=False, estimated=False):
+    if failed:
+        LLM_ERRORS.inc(label=label)
+    LLM_SECONDS.observe(duration, label=label)
+    LLM_TTFT_SECONDS.observe(ttft, label=label)
+    counting = "estimate" if estimated else "tokenizer"
+    LLM_PROMPT_TOKENS.inc(prompt_tokens, label=label, counting=counting)
+    LLM_COMPLETION_TOKENS.inc(completion_tokens, label=label, counting=counting)
+
+
+def record_llm_answer(label, model, role):
+    LLM_ANSWERS.inc(label=label, model=model, role=role)
+
+
+def record_llm_deadline(label):
+    LLM_DEADLINE_EXCEEDED.inc(label=label)
+
+
+def record_hedge_saving(label, seconds):
+    LLM_HEDGE_SAVED_SECONDS.observe(max(seconds, 0.0), label=label)
+
+
+def record_extract_timings(timings, wall_seconds):
+    """记录提取进程返回的各步骤耗时（毫秒）；总耗时中未被覆盖的部分记为进程通信与排队"""
+    timings = timings or {}
+    covered = 0.0
+    for step in ("revalidate", "static", "wechat", "browser", "save"):
+        if step in timings:
+            seconds = timings[step] / 1000
+            covered += seconds
+            EXTRACT_STEP_SECONDS.observe(seconds, step=step)
+    EXTRACT_STEP_SECONDS.observe(max(wall_seconds - covered, 0.0), step="worker_overhead")
+    if timings.get("tier"):
+        EXTRACT_TIER.inc(tier=timings["tier"])
+
+
+def stage_summary():
+    """各阶段的 (阶段, 次数, 平均耗时秒, 错误次数)，供管理页展示"""
+    errors = {key[0]: value for _, key, _, value in STAGE_ERRORS.samples()}
+    summary = []
+    for key, (count, total) in sorted(STAGE_SECONDS.snapshot().items()):
+        summary.append((key[0], count, total / count if count else 0.0, errors.get(key[0], 0)))
+    return summary
+
+
+def llm_answer_summary():
+    """(调用类别, 模型, 请求角色, 次数, 对冲节省的总秒数)，供管理页展示；节省时间按调用类别汇总在 hedge 行上"""
+    saved = LLM_HEDGE_SAVED_SECONDS.snapshot()
+    summary = []
+    for _, (label, model, role), _, value in sorted(LLM_ANSWERS.samples(), key=lambda sample: sample[1]):
+        summary.append((label, model, role, value, saved.get((label,), (0, 0.0))[1] if role == "hedge" else 0.0))
+    return summary
+
+
+class SamplingProfiler:
+    """采样分析器：后台线程定期抓取所有线程的调用栈，按折叠栈（flamegraph 格式）计数
+
+    可在运行时开启和关闭，关闭时几乎没有开销。
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL):
+        self.interval = interval
+        self._stacks = _StackCounter()
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = _StackCounter()
+            self._samples = 0
+            self._stop.clear()
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        thread = self._thread
+        if thread is None:
+            return False
+        self._stop.set()
+        thread.join()
+        return True
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            collected = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                stack = [f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})"
+                         for entry in traceback.extract_stack(frame)]
+                collected.append(";".join(stack))
+            with self._lock:
+                self._stacks.update(collected)
+                self._samples += 1
+
+    def collapsed(self):
+        """折叠栈文本，每行 "栈;帧 次数"，可直接交给 flamegraph.pl / speedscope"""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def report(self, top=30):
+        """按函数统计的自身采样数（栈顶帧）和包含采样数，便于在管理页直接阅读"""
+        with self._lock:
+            stacks = list(self._stacks.items())
+            samples = self._samples
+        own = _StackCounter()
+        inclusive = _StackCounter()
+        for stack, count in stacks:
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        lines = [f"采样 {samples} 次（间隔 {self.interval * 1000:.0f} ms）", "", "自身耗时最多的函数："]
+        lines += [f"{count:>8}  {frame}" for frame, count in own.most_common(top)]
+        lines += ["", "包含子调用耗时最多的函数："]
+        lines += [f"{count:>8}  {frame}" for frame, count in inclusive.most_common(top)]
+        return "\n".join(lines)
+
+
+profiler = SamplingProfiler()
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """在后台线程中启动指标服务：
+
+    GET /metrics                          Prometheus 文本格式的指标
+    GET /debug/profile?seconds=N&token=T  采样 N 秒（默认 10）后返回折叠栈，
+                                          需要设置 METRICS_PROFILE_TOKEN 并带上相同的令牌
+    """
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type="text/plain; version=0.0.4; charset=utf-8"):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == "/metrics":
+                self._send(200, registry.render())
+            elif parts.path == "/debug/profile":
+                query = parse_qs(parts.query)
+                if not METRICS_PROFILE_TOKEN:
+                    self._send(403, "采样分析端点未开启（设置 METRICS_PROFILE_TOKEN 后可用）\n")
+                    return
+                if not hmac.compare_digest(query.get("token", [""])[0].encode("utf-8"), METRICS_PROFILE_TOKEN.encode("utf-8")):
+                    self._send(403, "令牌无效\n")
+                    return
+                try:
+                    seconds = float(query.get("seconds", ["10"])[0])
+                except ValueError:
+                    self._send(400, "seconds 参数无效\n")
+                    return
+                if not profiler.start():
+                    self._send(409, "采样分析器正在运行\n")
+                    return
+                time.sleep(min(max(seconds, 0.1), 300))
+                profiler.stop()
+                self._send(200, profiler.collapsed() + "\n")
+            else:
+                self._send(404, "not found\n")
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"指标服务已启动: http://{host}:{port}/metrics")
+    return server
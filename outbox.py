@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from datetime import datetime
+
+from llm_client import TokenBucket
+from metrics import registry
+
+# Flomo 笔记发件箱：笔记先写入本地 SQLite 队列，由后台线程负责投递
+FLOMO_API_URL = os.getenv("FLOMO_API_URL", "https://flomoapp.com/iwh/NDIwOTAx/c62bd115ef72eb46a2289296744fe0dc/")
+OUTBOX_DB = "output/outbox.sqlite"
+# 单次请求超时（秒）
+FLOMO_TIMEOUT = float(os.getenv("FLOMO_TIMEOUT", "10"))
+# 最多尝试次数，超过后标记为失败，可在界面上手动重试
+FLOMO_MAX_ATTEMPTS = int(os.getenv("FLOMO_MAX_ATTEMPTS", "8"))
+# 退避的基础时长和上限（秒），实际等待时间带随机抖动
+FLOMO_BACKOFF_BASE = float(os.getenv("FLOMO_BACKOFF_BASE", "2"))
+FLOMO_BACKOFF_MAX = float(os.getenv("FLOMO_BACKOFF_MAX", "600"))
+# 每分钟最多发送的笔记数
+FLOMO_RPM = float(os.getenv("FLOMO_RPM", "20"))
+# 每次从队列中取出的笔记数
+OUTBOX_BATCH_SIZE = 20
+
+DELIVERY_SECONDS = registry.histogram(
+    "reading_assistant_flomo_delivery_seconds", "每次投递 Flomo 笔记的耗时", ("result",)
+)
+
+
+class DeliveryError(Exception):
+    """投递失败；retryable 表示稍后重试可能成功"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class FlomoOutbox:
+    """持久化的 Flomo 发件箱
+
+    enqueue() 只写本地队列并立即返回；后台线程按到期时间批量取出待发送的笔记，
+    通过复用连接的 requests.Session 逐条投递，经过令牌桶限流，失败时按抖动的指数退避重试。
+    队列保存在 SQLite 中，进程重启后未发送的笔记会继续投递。
+    """
+
+    def __init__(self, api_url=FLOMO_API_URL, db_path=OUTBOX_DB, timeout=FLOMO_TIMEOUT,
+                 max_attempts=FLOMO_MAX_ATTEMPTS, rate_per_minute=FLOMO_RPM):
+        self.api_url = api_url
+        self.db_path = db_path
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._bucket = TokenBucket(rate_per_minute)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._thread = None
+        self._session = None
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                sent_at TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+        self._conn.commit()
+
+    def enqueue(self, content):
+        """把一条笔记加入队列，返回队列中的 id"""
+        payload = json.dumps({"content": content}, ensure_ascii=False)
+        created_at = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            item_id = self._conn.execute(
+                "INSERT INTO outbox (payload, created_at) VALUES (?, ?)", (payload, created_at)
+            ).lastrowid
+            self._conn.commit()
+            self._wakeup.notify()
+        return item_id
+
+    def retry_failed(self):
+        """把失败的笔记重新放回队列，返回重试的条数"""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = 0 WHERE status = 'failed'"
+            ).rowcount
+            self._conn.commit()
+            self._wakeup.notify()
+        return count
+
+    def stats(self):
+        """各状态的笔记数：{"pending": ..., "sent": ..., "failed": ...}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        stats = {"pending": 0, "sent": 0, "failed": 0}
+        stats.update(dict(rows))
+        return stats
+
+    def last_error(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_error FROM outbox WHERE last_error IS NOT NULL AND status != 'sent' ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    def start(self):
+        """启动后台投递线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="flomo-outbox", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=5):
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        if self._session is not None:
+            self._session.close()
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.headers.update({"Content-Type": "application/json"})
+            # 重试由发件箱统一处理
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+            self._session = session
+        return self._session
+
+    def _deliver(self, payload):
+        import requests
+
+        try:
+            response = self._get_session().post(self.api_url, data=payload.encode("utf-8"), timeout=self.timeout)
+        except requests.RequestException as e:
+            raise DeliveryError(f"{type(e).__name__}: {str(e)[:200]}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise DeliveryError(f"HTTP状态码 {response.status_code}")
+        if response.status_code != 200:
+            raise DeliveryError(f"HTTP状态码 {response.status_code}", retryable=False)
+        # Flomo 出错时也可能返回 200，错误信息在 code/message 中
+        try:
+            body = response.json()
+        except ValueError:
+            return
+        if isinstance(body, dict) and body.get("code", 0) != 0:
+            raise DeliveryError(f"Flomo返回错误：{body.get('message', body.get('code'))}")
+
+    def _due_items(self):
+        return self._conn.execute(
+            """
+            SELECT id, payload, attempts FROM outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY id LIMIT ?
+            """,
+            (time.time(), OUTBOX_BATCH_SIZE),
+        ).fetchall()
+
+    def _next_due_in(self):
+        row = self._conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._stopping:
+                    items = self._due_items()
+                    if items:
+                        break
+                    # 没有到期的笔记时，睡到下一条到期或有新笔记加入
+                    self._wakeup.wait(self._next_due_in())
+                if self._stopping:
+                    return
+            for item_id, payload, attempts in items:
+                if self._stopping:
+                    return
+                self._bucket.acquire(1)
+                start = time.perf_counter()
+                try:
+                    self._deliver(payload)
+                except DeliveryError as e:
+                    DELIVERY_SECONDS.observe(time.perf_counter() - start, result="retry" if e.retryable else "rejected")
+                    self._record_failure(item_id, attempts + 1, str(e), e.retryable)
+                except Exception as e:
+                    DELIVERY_SECONDS.observe(time.perf_counter() - start, result="retry")
+                    self._record_failure(item_id, attempts + 1, str(e), True)
+                else:
+                    DELIVERY_SECONDS.observe(time.perf_counter() - start, result="sent")
+                    with self._lock:
+                        self._conn.execute(
+                            "UPDATE outbox SET status = 'sent', attempts = ?, last_error = NULL, sent_at = ? WHERE id = ?",
+                            (attempts + 1, datetime.now().isoformat(timespec="seconds"), item_id),
+                        )
+                        self._conn.commit()
+
+    def _record_failure(self, item_id, attempts, error, retryable):
+        if retryable and attempts < self.max_attempts:
+            delay = min(FLOMO_BACKOFF_MAX, FLOMO_BACKOFF_BASE * (2 ** (attempts - 1))) * random.uniform(0.5, 1.5)
+            print(f"[Flomo] 笔记 {item_id} 第 {attempts} 次发送失败（{error}），{delay:.1f}s 后重试")
+            status, next_attempt_at = "pending", time.time() + delay
+        else:
+            print(f"[Flomo] 笔记 {item_id} 发送失败，已放弃（{error}）")
+            status, next_attempt_at = "failed", 0
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, error, item_id),
+            )
+            self._conn.commit()
@@ -0,0 +1,300 @@
+import os
+import zlib
+import threading
+
+import numpy as np
+
+from retrieval import tokenize
+
+# 相关文章推荐的向量矩阵（哈希 TF-IDF），保存在 output 下，启动时加载后按内容哈希对账
+RELATED_INDEX = "output/related.npz"
+# 向量维数：词语按哈希映射到固定维数，矩阵大小为 文章数 × 维数（float32）
+RELATED_DIM = int(os.getenv("RELATED_DIM", "256"))
+# 文档频率统计的哈希桶数
+DF_BUCKETS = 1 << 20
+# 索引文件格式的版本，词语到维度的映射方式变化后旧文件需要重新构建
+INDEX_VERSION = 2
+# 乘法散列的常数（2^64 / 黄金比例），把 32 位的词语哈希打散到 64 位
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+# 文章数比上次全量构建时增长到该倍数后，重新统计 IDF 并重算所有向量
+REBUILD_GROWTH = 2.0
+
+
+def _token_hashes(text):
+    """返回 (去重后的词语哈希, 对应的词频)"""
+    tokens = tokenize(text)
+    if not tokens:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    unique, counts = np.unique(
+        np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.int64, count=len(tokens)),
+        return_counts=True,
+    )
+    return unique, counts.astype(np.float32)
+
+
+def _df_buckets(hashes):
+    """词语哈希对应的文档频率桶（去重），每行保存一份，文章更新或删除时从文档频率中减去"""
+    return np.unique(hashes & (DF_BUCKETS - 1)).astype(np.uint32)
+
+
+def _positions(hashes, dim):
+    """返回 (维度下标, 符号)：打散后的第 63 位决定符号，第 32～62 位取模得到下标，两者互不重叠"""
+    mixed = hashes.astype(np.uint64) * _MIX
+    index = ((mixed >> np.uint64(32)) & np.uint64(0x7FFFFFFF)) % np.uint64(dim)
+    signs = np.where(mixed >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+    return index.astype(np.int64), signs
+
+
+class RelatedIndex:
+    """基于哈希 TF-IDF 向量的相关文章推荐
+
+    每篇文章的词语（CJK 二元组和英文单词）按哈希映射到 RELATED_DIM 维并带随机符号，
+    权重为 (1 + log tf) × idf，归一化后按行存入一个 float32 矩阵。推荐时对整个矩阵做一次矩阵-向量乘法，
+    5 万篇文章也只需几毫秒。保存文章时增量追加一行（使用当时的 IDF）；
+    文章数翻倍后在下次对账时全量重算，避免早期向量的 IDF 过于陈旧。
+    """
+
+    def __init__(self, path=RELATED_INDEX, dim=RELATED_DIM):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._count = 0
+        self._paths = []
+        self._hashes = []
+        self._buckets = []
+        self._rows = {}
+        self._df = np.zeros(DF_BUCKETS, dtype=np.int32)
+        self._docs_seen = 0
+        self._built_docs = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                if "version" not in data.files or int(data["version"]) != INDEX_VERSION:
+                    print("相关文章索引的格式已变化，将重新构建")
+                    return
+                if data["vectors"].shape[1] != self.dim:
+                    return
+                self._vectors = data["vectors"].astype(np.float32)
+                self._paths = [str(p) for p in data["paths"]]
+                self._hashes = [str(h) for h in data["hashes"]]
+                bucket_counts = data["bucket_counts"]
+                self._buckets = np.split(data["buckets"].astype(np.uint32), np.cumsum(bucket_counts)[:-1]) if len(bucket_counts) else []
+                self._df = data["df"].astype(np.int32)
+                self._docs_seen, self._built_docs = (int(x) for x in data["counters"])
+        except Exception as e:
+            print(f"加载相关文章索引失败，将重新构建: {str(e)}")
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._paths, self._hashes, self._buckets = [], [], []
+            return
+        self._count = len(self._paths)
+        self._rows = {path: row for row, path in enumerate(self._paths)}
+
+    def save(self):
+        """把向量矩阵写入磁盘（没有变化时跳过）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            vectors = self._vectors[:self._count].copy()
+            paths = np.array(self._paths, dtype=str)
+            hashes = np.array(self._hashes, dtype=str)
+            buckets = np.concatenate(self._buckets) if self._buckets else np.zeros(0, dtype=np.uint32)
+            bucket_counts = np.array([len(b) for b in self._buckets], dtype=np.int64)
+            df = self._df.copy()
+            counters = np.array([self._docs_seen, self._built_docs], dtype=np.int64)
+            self._dirty = False
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(
+            tmp_path, version=np.int64(INDEX_VERSION), vectors=vectors, paths=paths, hashes=hashes,
+            buckets=buckets, bucket_counts=bucket_counts, df=df, counters=counters,
+        )
+        os.replace(tmp_path, self.path)
+
+    def _vectorize(self, hashes, counts):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if hashes.size == 0:
+            return vector
+        idf = np.log((1.0 + self._docs_seen) / (1.0 + self._df[hashes & (DF_BUCKETS - 1)])) + 1.0
+        weights = (1.0 + np.log(counts)) * idf.astype(np.float32)
+        index, signs = _positions(hashes, self.dim)
+        np.add.at(vector, index, signs * weights)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _count_df(self, buckets):
+        self._df[buckets] += 1
+        self._docs_seen += 1
+
+    def _uncount_df(self, buckets):
+        # 全量重算时读取失败的文章不在新的统计中，减到 0 为止
+        self._df[buckets] = np.maximum(self._df[buckets] - 1, 0)
+        self._docs_seen = max(0, self._docs_seen - 1)
+
+    def _update_df(self, path, buckets):
+        """增量更新文档频率：已有的文章先减去旧内容的统计，再计入新内容"""
+        row = self._rows.get(path)
+        if row is not None:
+            self._uncount_df(self._buckets[row])
+        self._count_df(buckets)
+
+    def _put_row(self, path, content_hash, vector, buckets):
+        row = self._rows.get(path)
+        if row is None:
+            if self._count == len(self._vectors):
+                # 按倍数扩容，追加一行是均摊 O(维数)
+                grown = np.zeros((max(64, len(self._vectors) * 2), self.dim), dtype=np.float32)
+                grown[:self._count] = self._vectors[:self._count]
+                self._vectors = grown
+            row = self._count
+            self._count += 1
+            self._paths.append(path)
+            self._hashes.append(content_hash)
+            self._buckets.append(buckets)
+            self._rows[path] = row
+        else:
+            self._hashes[row] = content_hash
+            self._buckets[row] = buckets
+        self._vectors[row] = vector
+        self._dirty = True
+
+    def _delete_row(self, path):
+        row = self._rows.pop(path, None)
+        if row is None:
+            return False
+        self._uncount_df(self._buckets[row])
+        # 用最后一行填补空位，保持矩阵紧凑
+        last = self._count - 1
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._paths[row] = self._paths[last]
+            self._hashes[row] = self._hashes[last]
+            self._buckets[row] = self._buckets[last]
+            self._rows[self._paths[row]] = row
+        self._paths.pop()
+        self._hashes.pop()
+        self._buckets.pop()
+        self._count -= 1
+        self._dirty = True
+        return True
+
+    def add(self, path, text, content_hash):
+        """写入或更新一篇文章的向量"""
+        hashes, counts = _token_hashes(text)
+        buckets = _df_buckets(hashes)
+        with self._lock:
+            self._update_df(path, buckets)
+            self._put_row(path, content_hash, self._vectorize(hashes, counts), buckets)
+
+    def remove(self, path):
+        with self._lock:
+            self._delete_row(path)
+
+    def related(self, text, top_k=5, path=None, max_similarity=0.98):
+        """返回与 text 最相似的文章 [{"path", "similarity"}, ...]
+
+        path 为已保存文章的路径时直接用矩阵中的向量查询，并把它自身排除在外；
+        相似度达到 max_similarity 的视为同一篇文章（如重新提取已保存的文章），不作推荐。
+        """
+        with self._lock:
+            row = self._rows.get(path)
+        hashes, counts = _token_hashes(text) if row is None else (None, None)
+        with self._lock:
+            row = self._rows.get(path)
+            if row is not None:
+                query = self._vectors[row].copy()
+            elif hashes is not None:
+                query = self._vectorize(hashes, counts)
+            else:
+                return []
+            if self._count == 0 or not query.any():
+                return []
+            scores = self._vectors[:self._count] @ query
+            paths = list(self._paths)
+        if row is not None:
+            scores[row] = -np.inf
+        scores[scores >= max_similarity] = -np.inf
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"path": paths[row], "similarity": float(scores[row])}
+            for row in top if np.isfinite(scores[row]) and scores[row] > 0
+        ]
+
+    def _recount_df(self):
+        # 按每行保存的文档频率桶重新统计：只包含矩阵中实际存在的文章，也包括全量重算期间 add() 写入的文章
+        df = np.zeros(DF_BUCKETS, dtype=np.int32)
+        if self._buckets:
+            df += np.bincount(np.concatenate(self._buckets), minlength=DF_BUCKETS).astype(np.int32)
+        self._df = df
+        self._docs_seen = self._count
+        self._built_docs = self._count
+
+    def reconcile(self, articles, is_live=None):
+        """与文章清单对账：articles 为带 path/content_hash 的条目，返回 (新增或更新数, 删除数)
+
+        文章数比上次全量构建时翻倍（包括首次构建）时，先统计所有文章的文档频率，再重算全部向量。
+        articles 是调用前取的快照，is_live(path) 不为空时，删除向量前再向文章库确认文章确实已不存在。
+        """
+        articles = list(articles)
+        with self._lock:
+            current = {article["path"] for article in articles}
+            removed = [
+                path for path in self._paths if path not in current and (is_live is None or not is_live(path))
+            ]
+            for path in removed:
+                self._delete_row(path)
+            rebuild = len(articles) > 0 and len(articles) >= max(1, self._built_docs) * REBUILD_GROWTH
+            known = {} if rebuild else dict(zip(self._paths, self._hashes))
+        pending = [a for a in articles if known.get(a["path"]) != a["content_hash"]]
+
+        if rebuild:
+            # 先统计文档频率供重算向量使用（读取失败的文章不计入）；统计期间 add() 的更新在重算结束后一并补上
+            df = np.zeros(DF_BUCKETS, dtype=np.int32)
+            docs = 0
+            for article in pending:
+                text = self._read(article["path"])
+                if text is not None:
+                    df[_df_buckets(_token_hashes(text)[0])] += 1
+                    docs += 1
+            with self._lock:
+                self._df = df
+                self._docs_seen = docs
+
+        changed = 0
+        for article in pending:
+            text = self._read(article["path"])
+            if text is None:
+                continue
+            hashes, counts = _token_hashes(text)
+            buckets = _df_buckets(hashes)
+            with self._lock:
+                if not rebuild:
+                    self._update_df(article["path"], buckets)
+                self._put_row(article["path"], article["content_hash"], self._vectorize(hashes, counts), buckets)
+            changed += 1
+        if rebuild:
+            with self._lock:
+                self._recount_df()
+        self.save()
+        return changed, len(removed)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"计算相关文章向量 {path} 失败: {str(e)}")
+            return None
+
+    def __len__(self):
+        return self._count
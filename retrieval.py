@@ -0,0 +1,283 @@
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+# 分块索引的存放目录（与 output/formatted 并列）
+RETRIEVAL_DIR = "output/retrieval"
+# 每个分块的目标字符数
+CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "600"))
+# 可选：本地向量模型（sentence-transformers 模型名或路径），为空时只用 BM25
+EMBEDDING_MODEL = os.getenv("RETRIEVAL_EMBEDDING_MODEL", "")
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 索引格式版本，分块或分词规则变化时递增，旧索引会被重建
+INDEX_VERSION = 1
+
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？!?；;])|(?<=\.)\s")
+
+
+def tokenize(text):
+    """CJK 文本切成字符二元组（单字成词时保留单字），英文和数字按单词切分"""
+    text = text.lower()
+    tokens = []
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD_RE.findall(text))
+    return tokens
+
+
+def _split_long(paragraph, max_chars):
+    # 过长的段落先按句子切分，仍然过长的句子直接截断
+    pieces = []
+    for sentence in _SENTENCE_END_RE.split(paragraph):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_chunks(text, max_chars=CHUNK_CHARS):
+    """按段落切分文章，相邻的短段落合并到不超过 max_chars 的分块中"""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > max_chars:
+            pieces.extend(_split_long(paragraph, max_chars))
+        else:
+            pieces.append(paragraph)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DocumentIndex:
+    """单篇文章的分块倒排索引"""
+
+    def __init__(self, content_hash, title, chunks, postings, lengths, embeddings=None):
+        self.content_hash = content_hash
+        self.title = title
+        self.chunks = chunks
+        # term -> [[chunk_idx, tf], ...]
+        self.postings = postings
+        self.lengths = lengths
+        self.embeddings = embeddings
+
+    @classmethod
+    def build(cls, text, title=""):
+        chunks = split_chunks(text)
+        postings = {}
+        lengths = []
+        for idx, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([idx, tf])
+        return cls(_text_hash(text), title, chunks, postings, lengths)
+
+    def to_dict(self):
+        return {
+            "version": INDEX_VERSION,
+            "content_hash": self.content_hash,
+            "title": self.title,
+            "chunks": self.chunks,
+            "postings": self.postings,
+            "lengths": self.lengths,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["content_hash"], data["title"], data["chunks"], data["postings"], data["lengths"])
+
+
+class _Embedder:
+    """可选的本地向量模型，未安装 sentence-transformers 或未配置模型时不启用"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return bool(self.model_name) and not self._failed
+
+    def encode(self, texts):
+        with self._lock:
+            if self._model is None and not self._failed:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                except Exception as e:
+                    print(f"加载向量模型 {self.model_name} 失败，仅使用 BM25 检索: {str(e)}")
+                    self._failed = True
+            if self._model is None:
+                return None
+        return self._model.encode(texts, normalize_embeddings=True)
+
+
+class RetrievalIndex:
+    """文章分块检索：每篇文章只建一次索引并持久化，聊天时按问题选取最相关的分块"""
+
+    def __init__(self, index_dir=RETRIEVAL_DIR, cache_size=64, embedding_model=EMBEDDING_MODEL):
+        self.index_dir = index_dir
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._embedder = _Embedder(embedding_model)
+        os.makedirs(index_dir, exist_ok=True)
+
+    def _path(self, content_hash, suffix=".json"):
+        return os.path.join(self.index_dir, f"{content_hash}{suffix}")
+
+    def get_document(self, text, title=""):
+        """获取文章的索引，依次查找内存缓存、磁盘，都没有时构建并持久化"""
+        content_hash = _text_hash(text)
+        with self._lock:
+            doc = self._cache.get(content_hash)
+            if doc is not None:
+                self._cache.move_to_end(content_hash)
+                return doc
+
+        doc = None
+        path = self._path(content_hash)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION:
+                    doc = DocumentIndex.from_dict(data)
+            except (OSError, ValueError) as e:
+                print(f"读取检索索引 {path} 失败，将重建: {str(e)}")
+
+        if doc is None:
+            doc = DocumentIndex.build(text, title)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(doc.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+        if title:
+            doc.title = title
+        self._load_embeddings(doc)
+
+        with self._lock:
+            self._cache[content_hash] = doc
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return doc
+
+    # 索引文章（保存或提取文章时调用）
+    def index_document(self, text, title=""):
+        return self.get_document(text, title)
+
+    def _load_embeddings(self, doc):
+        if not self._embedder.available or doc.embeddings is not None:
+            return
+        try:
+            import numpy as np
+            path = self._path(doc.content_hash, ".npy")
+            if os.path.exists(path):
+                doc.embeddings = np.load(path)
+                return
+            embeddings = self._embedder.encode(doc.chunks)
+            if embeddings is not None:
+                doc.embeddings = np.asarray(embeddings, dtype="float32")
+                np.save(path, doc.embeddings)
+        except Exception as e:
+            print(f"计算分块向量失败: {str(e)}")
+
+    def search(self, query, docs, top_k=8, min_per_doc=0):
+        """在多篇文章的分块中检索与 query 最相关的 top_k 个分块
+
+        返回 [(doc, chunk_idx, score), ...]，按得分降序。min_per_doc 保证每篇文章至少入选的分块数。
+        """
+        query_terms = set(tokenize(query))
+        total_chunks = sum(len(doc.chunks) for doc in docs)
+        if total_chunks == 0:
+            return []
+        avg_len = sum(sum(doc.lengths) for doc in docs) / total_chunks or 1.0
+
+        # 在本次参与检索的所有分块上计算 IDF
+        df = Counter()
+        for doc in docs:
+            for term in query_terms:
+                postings = doc.postings.get(term)
+                if postings:
+                    df[term] += len(postings)
+
+        scores = {}
+        for doc_idx, doc in enumerate(docs):
+            for term in query_terms:
+                postings = doc.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_chunks - df[term] + 0.5) / (df[term] + 0.5))
+                for chunk_idx, tf in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc.lengths[chunk_idx] / avg_len)
+                    key = (doc_idx, chunk_idx)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        scores = self._blend_embedding_scores(query, docs, scores)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        selected = ranked[:top_k]
+        if min_per_doc:
+            chosen = set(key for key, _ in selected)
+            for doc_idx, doc in enumerate(docs):
+                have = sum(1 for key in chosen if key[0] == doc_idx)
+                # 没有命中任何词的文章，至少带上开头的分块
+                candidates = [key for key, _ in ranked if key[0] == doc_idx and key not in chosen]
+                candidates += [(doc_idx, i) for i in range(len(doc.chunks)) if (doc_idx, i) not in chosen and (doc_idx, i) not in scores]
+                for key in candidates[:max(0, min_per_doc - have)]:
+                    chosen.add(key)
+                    selected.append((key, scores.get(key, 0.0)))
+        return [(docs[doc_idx], chunk_idx, score) for (doc_idx, chunk_idx), score in selected]
+
+    def _blend_embedding_scores(self, query, docs, scores):
+        # 启用向量模型时，BM25 得分归一化后与余弦相似度各占一半
+        if not self._embedder.available or not all(doc.embeddings is not None for doc in docs):
+            return scores
+        query_vec = self._embedder.encode([query])
+        if query_vec is None:
+            return scores
+        query_vec = query_vec[0]
+        max_bm25 = max(scores.values()) if scores else 0.0
+        blended = {}
+        for doc_idx, doc in enumerate(docs):
+            similarities = doc.embeddings @ query_vec
+            for chunk_idx, similarity in enumerate(similarities):
+                bm25 = scores.get((doc_idx, chunk_idx), 0.0)
+                bm25 = bm25 / max_bm25 if max_bm25 else 0.0
+                blended[(doc_idx, chunk_idx)] = 0.5 * bm25 + 0.5 * float(similarity)
+        return blended
@@ -0,0 +1,205 @@
+import os
+import re
+import sqlite3
+import threading
+
+from retrieval import tokenize
+
+# 全文检索的倒排索引（SQLite FTS5，存放分好词的 CJK 二元组、单字和英文单词）
+SEARCH_DB = "output/search.sqlite"
+# 索引内容的格式版本（PRAGMA user_version），分词方式变化后清空索引，由对账重新写入
+SCHEMA_VERSION = 2
+# 摘要片段前后各保留的字符数
+SNIPPET_CONTEXT = 60
+# 标题命中的得分权重（相对正文）
+TITLE_WEIGHT = 3.0
+
+_CJK_RUN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+
+
+def _to_fts_text(text):
+    # 除二元组外再收录每个单字，单字查询（如“理”）也能命中；tokenize 对单字成词的片段已保留单字
+    tokens = tokenize(text)
+    tokens.extend(char for run in _CJK_RUN_RE.findall(text) if len(run) > 1 for char in run)
+    return " ".join(tokens)
+
+
+def _make_snippet(text, terms, context=SNIPPET_CONTEXT):
+    """在原文中找到第一个命中的词，截取前后文并加粗命中的词"""
+    lowered = text.lower()
+    best = -1
+    best_term = ""
+    # 优先匹配更长的词，其次是更靠前的位置
+    for term in sorted(set(terms), key=len, reverse=True):
+        # 英文词按整词匹配，避免 ai 命中 fair
+        pattern = rf"(?<![a-z0-9]){re.escape(term)}(?![a-z0-9])" if term.isascii() else re.escape(term)
+        match = re.search(pattern, lowered)
+        pos = match.start() if match else -1
+        if pos != -1 and (best == -1 or len(term) > len(best_term) or (len(term) == len(best_term) and pos < best)):
+            best, best_term = pos, term
+    if best == -1:
+        snippet = text[:context * 2].replace("\n", " ")
+        return snippet + ("…" if len(text) > context * 2 else "")
+    start = max(0, best - context)
+    end = min(len(text), best + len(best_term) + context)
+    snippet = (
+        text[start:best] + "**" + text[best:best + len(best_term)] + "**" + text[best + len(best_term):end]
+    ).replace("\n", " ")
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+class SearchIndex:
+    """已保存文章的全文检索
+
+    文章按 CJK 字符二元组、单字和英文单词分词后写入 FTS5 倒排索引，按 BM25 排序。
+    标题单独建索引并加权；正文和标题都由 FTS5 按 rank 取前 limit 篇，不会因为命中过多丢掉较早的文章。
+    按内容哈希增量更新：保存文章时写入一篇，启动时只重建内容有变化的文章。
+    """
+
+    def __init__(self, db_path=SEARCH_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                content_hash TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(body)")
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts USING fts5(title)")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # 旧格式的索引没有单字，清空后由启动时的对账全部重建
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM docs_fts")
+            self._conn.execute("DELETE FROM titles_fts")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.commit()
+
+    def _write(self, path, title, text, content_hash):
+        row = self._conn.execute("SELECT id FROM docs WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            self._conn.execute("UPDATE docs SET title = ?, content_hash = ? WHERE id = ?", (title, content_hash, row[0]))
+            self._delete_terms(row[0])
+            doc_id = row[0]
+        else:
+            doc_id = self._conn.execute(
+                "INSERT INTO docs (path, title, content_hash) VALUES (?, ?, ?)", (path, title, content_hash)
+            ).lastrowid
+        self._conn.execute("INSERT INTO docs_fts (rowid, body) VALUES (?, ?)", (doc_id, _to_fts_text(text)))
+        self._conn.execute("INSERT INTO titles_fts (rowid, title) VALUES (?, ?)", (doc_id, _to_fts_text(title)))
+
+    def _delete_terms(self, doc_id):
+        self._conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (doc_id,))
+        self._conn.execute("DELETE FROM titles_fts WHERE rowid = ?", (doc_id,))
+
+    def _delete(self, path):
+        row = self._conn.execute("SELECT id FROM docs WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return False
+        self._delete_terms(row[0])
+        self._conn.execute("DELETE FROM docs WHERE id = ?", (row[0],))
+        return True
+
+    def index_article(self, path, title, text, content_hash):
+        """写入或更新一篇文章"""
+        with self._lock:
+            self._write(path, title, text, content_hash)
+            self._conn.commit()
+
+    def remove(self, path):
+        with self._lock:
+            if self._delete(path):
+                self._conn.commit()
+
+    def reconcile(self, articles):
+        """与文章清单对账：articles 为带 path/title/content_hash 的条目，只重建哈希变化的文章"""
+        with self._lock:
+            known = dict(self._conn.execute("SELECT path, content_hash FROM docs"))
+            changed = 0
+            current = set()
+            for article in articles:
+                path = article["path"]
+                current.add(path)
+                if known.get(path) == article["content_hash"]:
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"索引文章 {path} 失败: {str(e)}")
+                    continue
+                self._write(path, article["title"], text, article["content_hash"])
+                changed += 1
+            removed = [path for path in known if path not in current]
+            for path in removed:
+                self._delete(path)
+            if changed or removed:
+                self._conn.commit()
+            return changed, len(removed)
+
+    def _query(self, match, limit):
+        """返回 {文章id: 得分}，得分越大越相关"""
+        # ORDER BY rank 即按 BM25 排序，FTS5 只保留前 limit 篇，不必把全部命中的文章排一遍
+        body = self._conn.execute(
+            "SELECT rowid, rank FROM docs_fts WHERE docs_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit)
+        ).fetchall()
+        titles = self._conn.execute(
+            "SELECT rowid, rank FROM titles_fts WHERE titles_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit)
+        ).fetchall()
+        # FTS5 的 bm25() 返回负数，取反后越大越相关
+        scores = {doc_id: -score for doc_id, score in body}
+        for doc_id, score in titles:
+            scores[doc_id] = scores.get(doc_id, 0.0) - TITLE_WEIGHT * score
+        return scores
+
+    def search(self, query, limit=20, with_snippets=True):
+        """全文检索，返回按相关度排序的 [{"path", "title", "score", "snippet"}, ...]"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        quoted = [f'"{term}"' for term in terms]
+        # 摘要中优先高亮用户输入的完整词语，找不到时再退回到二元组
+        phrases = [part.lower() for part in query.split()]
+        with self._lock:
+            # 先要求所有词都命中，没有结果时放宽为任意词命中
+            scores = self._query(" AND ".join(quoted), limit)
+            if not scores and len(quoted) > 1:
+                scores = self._query(" OR ".join(quoted), limit)
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            rows = {}
+            if ranked:
+                placeholders = ",".join("?" * len(ranked))
+                rows = {
+                    doc_id: (path, title)
+                    for doc_id, path, title in self._conn.execute(
+                        f"SELECT id, path, title FROM docs WHERE id IN ({placeholders})", [doc_id for doc_id, _ in ranked]
+                    )
+                }
+
+        results = []
+        for doc_id, score in ranked:
+            if doc_id not in rows:
+                continue
+            path, title = rows[doc_id]
+            result = {"path": path, "title": title, "score": score, "snippet": ""}
+            if with_snippets:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        result["snippet"] = _make_snippet(f.read(), phrases + terms)
+                except (OSError, UnicodeDecodeError):
+                    pass
+            results.append(result)
+        return results
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
@@ -69,119 +69,354 @@ const instance = axios.create({
     }
 });
 
+// Puppeteer 启动参数
+const BROWSER_LAUNCH_OPTIONS = {
+    headless: true,
+    args: ['--no-sandbox', '--disable-setuid-sandbox']
+};
+
 // console.log('使用本地代理配置:', JSON.stringify(instance.defaults.proxy, null, 2)); // 代理配置当前为null，此行可注释
 
-async function link2text(url, options = {}) {
-    // 验证URL格式
-    if (!url.startsWith('http://') && !url.startsWith('https://')) {
-        throw new Error('无效的URL格式，URL必须以http://或https://开头');
+// 分级抓取策略：
+//   auto    - 先静态抓取（HTTP + 正文提取），结果过短或需要执行脚本时再升级到浏览器（默认）
+//   static  - 只做静态抓取
+//   browser - 直接使用 Puppeteer
+//   wechat  - 微信公众号文章的专用静态解析
+// 可在 src/strategies.json（或 EXTRACT_STRATEGIES 指定的文件）中按域名覆盖，例如 {"dongchedi.com": "browser"}
+const DEFAULT_STRATEGIES = {
+    'mp.weixin.qq.com': 'wechat'
+};
+// 静态抓取结果少于该字符数时视为不完整
+const MIN_STATIC_CHARS = parseInt(process.env.EXTRACT_MIN_STATIC_CHARS || '200', 10);
+// 静态抓取的超时时间，比浏览器短得多，失败后尽快升级
+const STATIC_TIMEOUT = parseInt(process.env.EXTRACT_STATIC_TIMEOUT || '15000', 10);
+
+function loadStrategies() {
+    const configPath = process.env.EXTRACT_STRATEGIES || path.join(__dirname, 'strategies.json');
+    const strategies = { ...DEFAULT_STRATEGIES };
+    if (fs.existsSync(configPath)) {
+        try {
+            Object.assign(strategies, JSON.parse(fs.readFileSync(configPath, 'utf8')));
+        } catch (error) {
+            console.error(`读取抓取策略配置失败 (${configPath}): ${error.message}`);
+        }
     }
+    return strategies;
+}
 
-    let htmlContent;
-    let $;
-    let text = '';
+const strategies = loadStrategies();
 
-    if (url.includes('mp.weixin.qq.com')) {
-        console.log(`使用 Axios 抓取微信文章 URL: ${url}`);
-        try {
-            const response = await instance.get(url); // 使用全局配置的axios实例
-            console.log(`成功获取页面内容 (Axios)，状态码: ${response.status}`);
-            htmlContent = response.data;
-            $ = cheerio.load(htmlContent);
-
-            // 移除脚本和样式标签 (对 Axios 获取的静态内容同样有效)
-            $('script').remove();
-            $('style').remove();
-
-            // 针对微信公众号文章的特殊处理
-            const title = $('#activity-name').text().trim();
-            if (title) {
-                text += title + '\n\n';
-            }
-            
-            const author = $('#js_name').text().trim();
-            if (author) {
-                text += '作者：' + author + '\n\n';
-            }
-            
-            const contentElement = $('#js_content');
-            let content = '';
+// 各抓取方式最终胜出的次数，以及从静态抓取升级到浏览器的次数
+const tierStats = { static: 0, wechat: 0, browser: 0, escalated: 0, failed: 0 };
+
+function getTierStats() {
+    return { ...tierStats };
+}
+
+// 按域名（含上级域名）查找抓取策略
+function resolveStrategy(url) {
+    let hostname;
+    try {
+        hostname = new URL(url).hostname;
+    } catch (error) {
+        return 'auto';
+    }
+    const parts = hostname.split('.');
+    for (let i = 0; i < parts.length - 1; i++) {
+        const domain = parts.slice(i).join('.');
+        if (strategies[domain]) {
+            return strategies[domain];
+        }
+    }
+    return 'auto';
+}
 
-            if (contentElement.length > 0) {
-                content = contentElement.text().replace(/\s+/g, ' ').trim();
+// 类 readability 的正文提取：按段落文本长度给父节点打分，取得分最高的节点作为正文
+function extractMainContent($) {
+    $('script, style, noscript, iframe, svg, nav, header, footer, aside, form').remove();
+
+    const title = ($('meta[property="og:title"]').attr('content') || $('h1').first().text() || $('title').text() || '').trim();
+
+    let best = null;
+    let bestScore = 0;
+    const scores = new Map();
+    $('p, pre, blockquote, li').each((_, el) => {
+        const length = $(el).text().trim().length;
+        if (length < 25) {
+            return;
+        }
+        const parent = el.parent;
+        const grandparent = parent && parent.parent;
+        for (const [node, weight] of [[parent, 1], [grandparent, 0.5]]) {
+            if (!node || node.type !== 'tag') {
+                continue;
             }
-            
-            if (content) {
-                text += content;
-            } else {
-                // 如果无法通过特定ID获取内容，则回退到通用方法
-                text = $('body').text().replace(/\s+/g, ' ').trim();
+            const score = (scores.get(node) || 0) + length * weight;
+            scores.set(node, score);
+            if (score > bestScore) {
+                best = node;
+                bestScore = score;
             }
-        } catch (error) {
-            console.error(`Axios 抓取或解析URL失败 (${url}): ${error.message}`);
-            // 可以根据axios错误类型进行更细致处理
-            throw error; 
         }
-    } else { // 默认使用 Puppeteer (包括懂车帝等其他动态网站)
-        console.log(`使用 Puppeteer 抓取 URL: ${url}`);
-        let browser = null; 
-        try {
-            browser = await puppeteer.launch({
-                headless: true, 
-                args: ['--no-sandbox', '--disable-setuid-sandbox'] 
+    });
+
+    let container = best ? $(best) : $('article, main, [role="main"]').first();
+    if (!container || container.length === 0) {
+        container = $('body');
+    }
+
+    // 链接文字占比过高的节点多半是导航或推荐列表
+    const paragraphs = [];
+    container.find('h1, h2, h3, h4, p, pre, blockquote, li').each((_, el) => {
+        const node = $(el);
+        if (node.find('p, li').length > 0) {
+            return;
+        }
+        const text = node.text().replace(/\s+/g, ' ').trim();
+        const linkText = node.find('a').text().replace(/\s+/g, ' ').trim();
+        if (text && linkText.length / text.length < 0.5) {
+            paragraphs.push(text);
+        }
+    });
+
+    let content = paragraphs.join('\n');
+    if (!content) {
+        content = container.text().replace(/\s+/g, ' ').trim();
+    }
+    return { title, content };
+}
+
+// 判断静态抓取结果是否需要浏览器渲染
+function needsBrowser(html, content) {
+    if (content.length < MIN_STATIC_CHARS) {
+        return true;
+    }
+    return /enable javascript|请开启\s*javascript|需要启用\s*javascript|<div id="(root|app|__next)">\s*<\/div>/i.test(html);
+}
+
+async function fetchStatic(url) {
+    const response = await instance.get(url, { timeout: STATIC_TIMEOUT });
+    if (response.status >= 400) {
+        throw new Error(`HTTP 状态码 ${response.status}`);
+    }
+    return response;
+}
+
+// 记录原始 HTML 和缓存校验头，供调用方缓存并在之后发送条件请求
+function recordSource(source, html, headers = {}) {
+    if (!source) {
+        return;
+    }
+    source.html = html;
+    source.etag = headers.etag || null;
+    source.lastModified = headers['last-modified'] || null;
+}
+
+// 按缓存的 ETag / Last-Modified 发送条件请求，服务端返回 304 时说明页面未变化
+async function checkNotModified(url, validators = {}) {
+    const headers = {};
+    if (validators.etag) {
+        headers['If-None-Match'] = validators.etag;
+    }
+    if (validators.lastModified) {
+        headers['If-Modified-Since'] = validators.lastModified;
+    }
+    if (Object.keys(headers).length === 0) {
+        return false;
+    }
+    const response = await instance.get(url, {
+        timeout: STATIC_TIMEOUT,
+        headers: { ...headers, 'Cache-Control': 'max-age=0' }
+    });
+    return response.status === 304;
+}
+
+async function extractStatic(url, source) {
+    console.log(`使用静态抓取 URL: ${url}`);
+    const response = await fetchStatic(url);
+    const html = typeof response.data === 'string' ? response.data : String(response.data);
+    recordSource(source, html, response.headers);
+    const $ = cheerio.load(html);
+    const { title, content } = extractMainContent($);
+    let text = content;
+    if (title && !content.startsWith(title)) {
+        text = title + '\n\n' + content;
+    }
+    return { text, complete: !needsBrowser(html, content) };
+}
+
+async function extractWeChat(url, source) {
+    console.log(`使用 Axios 抓取微信文章 URL: ${url}`);
+    let text = '';
+    try {
+        const response = await instance.get(url); // 使用全局配置的axios实例
+        console.log(`成功获取页面内容 (Axios)，状态码: ${response.status}`);
+        const htmlContent = response.data;
+        recordSource(source, htmlContent, response.headers);
+        const $ = cheerio.load(htmlContent);
+
+        // 移除脚本和样式标签 (对 Axios 获取的静态内容同样有效)
+        $('script').remove();
+        $('style').remove();
+
+        // 针对微信公众号文章的特殊处理
+        const title = $('#activity-name').text().trim();
+        if (title) {
+            text += title + '\n\n';
+        }
+        
+        const author = $('#js_name').text().trim();
+        if (author) {
+            text += '作者：' + author + '\n\n';
+        }
+        
+        const contentElement = $('#js_content');
+        let content = '';
+
+        if (contentElement.length > 0) {
+            content = contentElement.text().replace(/\s+/g, ' ').trim();
+        }
+        
+        if (content) {
+            text += content;
+        } else {
+            // 如果无法通过特定ID获取内容，则回退到通用方法
+            text = $('body').text().replace(/\s+/g, ' ').trim();
+        }
+    } catch (error) {
+        console.error(`Axios 抓取或解析URL失败 (${url}): ${error.message}`);
+        // 可以根据axios错误类型进行更细致处理
+        throw error; 
+    }
+    return text;
+}
+
+async function extractWithBrowser(url, options = {}) {
+    console.log(`使用 Puppeteer 抓取 URL: ${url}`);
+    let text = '';
+    let browser = null; 
+    let page = null;
+    try {
+        if (options.acquirePage) {
+            // 由常驻的提取服务提供已预热的浏览器页面，用完归还而不是关闭浏览器
+            page = await options.acquirePage();
+        } else {
+            browser = await puppeteer.launch(BROWSER_LAUNCH_OPTIONS);
+            page = await browser.newPage();
+        }
+        
+        await page.setUserAgent('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36');
+        
+        const response = await page.goto(url, { waitUntil: 'networkidle0', timeout: 180000 });
+
+        const htmlContent = await page.content(); 
+        recordSource(options.source, htmlContent, response ? response.headers() : {});
+        console.log(`成功获取页面内容 (Puppeteer)，准备解析...`);
+        const $ = cheerio.load(htmlContent);
+        
+        $('script').remove();
+        $('style').remove();
+        
+        if (url.includes('dongchedi.com')) {
+            console.warn(`提示：对于懂车帝页面 (${url})，建议配置更精确的内容选择器以提升提取质量和准确性。目前使用通用提取方式。`);
+            // 示例：如果这是懂车帝的文章页，您可能需要找到文章主体内容的特定选择器
+            // const articleBody = $('.article-content-selector').text(); // 替换为真实的选择器
+            // if (articleBody) {
+            //     text = articleBody;
+            // } else {
+            //     text = $('body').text().replace(/\s+/g, ' ').trim();
+            // }
+            // 对于车型对比页，结构更复杂，可能需要提取多个部分或表格数据
+            // 您可以使用 page.evaluate() 配合浏览器 DOM API 进行更复杂的提取
+            /*
+            text = await page.evaluate(() => {
+                // 此处编写浏览器环境的JS代码来提取内容
+                // 例如：document.querySelector('.main-content-class')?.innerText
+                // 或更复杂的逻辑来组合多个元素的内容
+                const mainContent = document.querySelector('article') || document.body;
+                return mainContent.innerText.replace(/\s+/g, ' ').trim();
             });
-            const page = await browser.newPage();
-            
-            await page.setUserAgent('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36');
-            
-            await page.goto(url, { waitUntil: 'networkidle0', timeout: 180000 });
+            */
+            text = $('body').text().replace(/\s+/g, ' ').trim(); // 当前作为后备
+        } else {
+            // 其他类型的使用Puppeteer的页面，使用通用提取
+            text = $('body').text().replace(/\s+/g, ' ').trim();
+        }
 
-            htmlContent = await page.content(); 
-            console.log(`成功获取页面内容 (Puppeteer)，准备解析...`);
-            $ = cheerio.load(htmlContent);
-            
-            $('script').remove();
-            $('style').remove();
-            
-            if (url.includes('dongchedi.com')) {
-                console.warn(`提示：对于懂车帝页面 (${url})，建议配置更精确的内容选择器以提升提取质量和准确性。目前使用通用提取方式。`);
-                // 示例：如果这是懂车帝的文章页，您可能需要找到文章主体内容的特定选择器
-                // const articleBody = $('.article-content-selector').text(); // 替换为真实的选择器
-                // if (articleBody) {
-                //     text = articleBody;
-                // } else {
-                //     text = $('body').text().replace(/\s+/g, ' ').trim();
-                // }
-                // 对于车型对比页，结构更复杂，可能需要提取多个部分或表格数据
-                // 您可以使用 page.evaluate() 配合浏览器 DOM API 进行更复杂的提取
-                /*
-                text = await page.evaluate(() => {
-                    // 此处编写浏览器环境的JS代码来提取内容
-                    // 例如：document.querySelector('.main-content-class')?.innerText
-                    // 或更复杂的逻辑来组合多个元素的内容
-                    const mainContent = document.querySelector('article') || document.body;
-                    return mainContent.innerText.replace(/\s+/g, ' ').trim();
-                });
-                */
-                text = $('body').text().replace(/\s+/g, ' ').trim(); // 当前作为后备
-            } else {
-                // 其他类型的使用Puppeteer的页面，使用通用提取
-                text = $('body').text().replace(/\s+/g, ' ').trim();
-            }
+    } catch (error) {
+        console.error(`Puppeteer 抓取或解析URL失败 (${url}): ${error.message}`);
+        if (error.name === 'TimeoutError') {
+            console.error('Puppeteer 导航超时，页面可能过于复杂或网络问题。');
+        }
+        throw error;
+    } finally {
+        if (options.releasePage && page) {
+            await options.releasePage(page);
+        }
+        if (browser) {
+            await browser.close(); 
+            console.log('Puppeteer 浏览器已关闭');
+        }
+    }
+    return text;
+}
 
-        } catch (error) {
-            console.error(`Puppeteer 抓取或解析URL失败 (${url}): ${error.message}`);
-            if (error.name === 'TimeoutError') {
-                console.error('Puppeteer 导航超时，页面可能过于复杂或网络问题。');
-            }
-            throw error;
+async function link2text(url, options = {}) {
+    // 验证URL格式
+    if (!url.startsWith('http://') && !url.startsWith('https://')) {
+        throw new Error('无效的URL格式，URL必须以http://或https://开头');
+    }
+
+    const strategy = resolveStrategy(url);
+    let text = '';
+    let tier = null;
+    // 调用方可传入 options.timings，记录各抓取方式的耗时（毫秒）和最终使用的方式；
+    // 传入 options.source 时，记录最终采用的原始 HTML 和 ETag / Last-Modified
+    const timings = options.timings || {};
+    const timeStep = async (step, fn) => {
+        const start = Date.now();
+        try {
+            return await fn();
         } finally {
-            if (browser) {
-                await browser.close(); 
-                console.log('Puppeteer 浏览器已关闭');
+            timings[step] = (timings[step] || 0) + (Date.now() - start);
+        }
+    };
+
+    try {
+        if (strategy === 'wechat') {
+            text = await timeStep('wechat', () => extractWeChat(url, options.source));
+            tier = 'wechat';
+        } else {
+            if (strategy !== 'browser') {
+                try {
+                    const result = await timeStep('static', () => extractStatic(url, options.source));
+                    if (result.complete || strategy === 'static') {
+                        text = result.text;
+                        tier = 'static';
+                    } else {
+                        console.log(`静态抓取结果不完整，改用浏览器抓取: ${url}`);
+                    }
+                } catch (error) {
+                    if (strategy === 'static') {
+                        throw error;
+                    }
+                    console.log(`静态抓取失败，改用浏览器抓取 (${url}): ${error.message}`);
+                }
+                if (!tier) {
+                    tierStats.escalated++;
+                }
+            }
+            if (!tier) {
+                text = await timeStep('browser', () => extractWithBrowser(url, options));
+                tier = 'browser';
             }
         }
+    } catch (error) {
+        tierStats.failed++;
+        throw error;
     }
+    tierStats[tier]++;
+    timings.tier = tier;
             
     // 通用文本清理
     text = text
@@ -192,10 +427,8 @@ async function link2text(url, options = {}) {
     return text;
 }
 
-module.exports = link2text;
-
-// 保存提取的文本到文件
-async function saveTextToFile(text, outputDir) {
+// 保存提取的文本到文件，suffix 用于区分同一时刻并发保存的文件
+async function saveTextToFile(text, outputDir, suffix = '') {
     try {
         // 确保输出目录存在
         if (!fs.existsSync(outputDir)) {
@@ -204,7 +437,7 @@ async function saveTextToFile(text, outputDir) {
 
         // 使用ISO时间戳作为文件名
         const timestamp = new Date().toISOString().replace(/:/g, '');
-        const filePath = path.join(outputDir, `${timestamp}.txt`);
+        const filePath = path.join(outputDir, suffix ? `${timestamp}_${suffix}.txt` : `${timestamp}.txt`);
 
         // 写入文件
         await fs.promises.writeFile(filePath, text, 'utf8');
@@ -216,6 +449,14 @@ async function saveTextToFile(text, outputDir) {
     }
 }
 
+module.exports = link2text;
+module.exports.link2text = link2text;
+module.exports.saveTextToFile = saveTextToFile;
+module.exports.BROWSER_LAUNCH_OPTIONS = BROWSER_LAUNCH_OPTIONS;
+module.exports.extractMainContent = extractMainContent;
+module.exports.getTierStats = getTierStats;
+module.exports.checkNotModified = checkNotModified;
+
 // 如果直接运行此文件
 if (require.main === module) {
     const url = process.argv[2];
@@ -0,0 +1,200 @@
+// 常驻的文章提取服务
+// 通过 stdin/stdout 逐行收发 JSON-RPC 消息：
+//   请求: {"id": "...", "method": "extract", "params": {"url": "...", "etag": "...", "lastModified": "..."}}
+//   响应: {"id": "...", "result": {...}} 或 {"id": "...", "error": {"message": "..."}}
+// 浏览器只启动一次并复用页面，免去每篇文章的 Node 启动和 Chromium 冷启动开销。
+const path = require('path');
+const readline = require('readline');
+const puppeteer = require('puppeteer');
+const { link2text, saveTextToFile, getTierStats, checkNotModified, BROWSER_LAUNCH_OPTIONS } = require('./index');
+
+// stdout 专用于协议消息，日志统一输出到 stderr
+const writeMessage = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+console.log = (...args) => console.error(...args);
+console.warn = (...args) => console.error(...args);
+
+const outputDir = path.join(__dirname, '../output');
+// 同时打开的页面数上限
+const maxPages = parseInt(process.env.EXTRACT_MAX_PAGES || '4', 10);
+
+// 当前浏览器实例及其页面池；浏览器断开后整体作废，下次请求时重新启动
+// 每个页面记录所属的实例，旧实例上的页面归还时不再影响新实例的计数
+let pool = null;
+const pageOwners = new WeakMap();
+const waiters = [];
+
+function wakeWaiters() {
+    // 唤醒全部等待者，让它们重新检查（或改用新启动的浏览器）
+    for (const resolve of waiters.splice(0)) {
+        resolve();
+    }
+}
+
+function getPool() {
+    if (!pool) {
+        const current = { idlePages: [], openPages: 0, closed: false };
+        current.browserPromise = puppeteer.launch(BROWSER_LAUNCH_OPTIONS).then(browser => {
+            browser.on('disconnected', () => {
+                // 浏览器崩溃或被关闭后，下次请求时重新启动
+                console.error('Puppeteer 浏览器已断开，将在下次请求时重启');
+                current.closed = true;
+                current.idlePages.length = 0;
+                if (pool === current) {
+                    pool = null;
+                }
+                wakeWaiters();
+            });
+            return browser;
+        }).catch(error => {
+            current.closed = true;
+            if (pool === current) {
+                pool = null;
+            }
+            throw error;
+        });
+        pool = current;
+    }
+    return pool;
+}
+
+async function acquirePage() {
+    while (true) {
+        const current = getPool();
+        const page = current.idlePages.pop();
+        if (page) {
+            if (!page.isClosed()) {
+                return page;
+            }
+            current.openPages--;
+            continue;
+        }
+        if (current.openPages < maxPages) {
+            current.openPages++;
+            try {
+                const browser = await current.browserPromise;
+                const newPage = await browser.newPage();
+                pageOwners.set(newPage, current);
+                return newPage;
+            } catch (error) {
+                current.openPages--;
+                // 名额已让出，换下一个等待者尝试
+                const next = waiters.shift();
+                if (next) {
+                    next();
+                }
+                throw error;
+            }
+        }
+        await new Promise(resolve => waiters.push(resolve));
+    }
+}
+
+async function releasePage(page) {
+    const owner = pageOwners.get(page);
+    if (owner && !owner.closed) {
+        try {
+            // 清空页面状态后放回池中复用
+            await page.goto('about:blank');
+            if (owner.closed) {
+                // 清空期间浏览器已断开，该实例的计数已作废
+                await page.close().catch(() => {});
+            } else {
+                owner.idlePages.push(page);
+            }
+        } catch (error) {
+            if (!owner.closed) {
+                owner.openPages--;
+            }
+            await page.close().catch(() => {});
+        }
+    } else {
+        // 所属浏览器已断开，页面随之失效，不计入新实例
+        await page.close().catch(() => {});
+    }
+    const next = waiters.shift();
+    if (next) {
+        next();
+    }
+}
+
+const methods = {
+    async extract(params, id) {
+        if (!params || !params.url) {
+            throw new Error('缺少 url 参数');
+        }
+        // 各步骤耗时（毫秒），供 Python 端记录指标
+        const timings = {};
+        // 带有缓存校验头时先发条件请求，页面未变化则不再抓取和启动浏览器
+        if (params.etag || params.lastModified) {
+            const start = Date.now();
+            const notModified = await checkNotModified(params.url, params).catch(error => {
+                console.error(`条件请求失败，改为完整抓取 (${params.url}): ${error.message}`);
+                return false;
+            });
+            timings.revalidate = Date.now() - start;
+            if (notModified) {
+                return { notModified: true, timings };
+            }
+        }
+        const source = {};
+        const text = await link2text(params.url, { outputDir, acquirePage, releasePage, timings, source });
+        const saveStart = Date.now();
+        const filePath = await saveTextToFile(text, outputDir, id);
+        timings.save = Date.now() - saveStart;
+        return { text, filePath, timings, html: source.html || null, etag: source.etag || null, lastModified: source.lastModified || null };
+    },
+    async ping() {
+        return { pid: process.pid };
+    },
+    // 各抓取方式胜出的次数
+    async stats() {
+        return getTierStats();
+    },
+    async shutdown() {
+        setImmediate(shutdown);
+        return {};
+    }
+};
+
+async function handleLine(line) {
+    if (!line.trim()) {
+        return;
+    }
+    let request;
+    try {
+        request = JSON.parse(line);
+    } catch (error) {
+        writeMessage({ id: null, error: { message: `无法解析请求: ${error.message}` } });
+        return;
+    }
+    const { id, method, params } = request;
+    const handler = methods[method];
+    if (!handler) {
+        writeMessage({ id, error: { message: `未知方法: ${method}` } });
+        return;
+    }
+    try {
+        const result = await handler(params, id);
+        writeMessage({ id, result });
+    } catch (error) {
+        writeMessage({ id, error: { message: error.message } });
+    }
+}
+
+async function shutdown() {
+    if (pool) {
+        try {
+            const browser = await pool.browserPromise;
+            await browser.close();
+        } catch (error) {
+            // 浏览器可能已经退出
+        }
+    }
+    process.exit(0);
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+// 每个请求独立处理，互不阻塞
+rl.on('line', line => { handleLine(line); });
+// 父进程退出（stdin 关闭）时随之退出
+rl.on('close', shutdown);